@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import sys
+
+import logfire
+from benchmarks.load import run_load
+from benchmarks.micro import run_micro
+from benchmarks.router import run_router
+from benchmarks.report import compare_to_baseline, format_results, load_results, save_results
+
+
+def main() -> int:
+    """Runs the offline benchmarks, optionally failing when they regress against a saved baseline."""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Offline benchmarks of the ordering agent, driven by a scripted stub model with no network.",
+    )
+    parser.add_argument("--sessions", type=int, default=200, help="number of simulated conversations")
+    parser.add_argument("--concurrency", type=int, default=50, help="number of conversations running at once")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the scripted orders")
+    parser.add_argument("--micro-calls", type=int, default=2000, help="calls per micro-benchmark repeat")
+    parser.add_argument("--skip-load", action="store_true", help="only run the micro-benchmarks")
+    parser.add_argument("--skip-micro", action="store_true", help="only run the load benchmark")
+    parser.add_argument("--router-requests", type=int, default=1000, help="requests sent through the model router")
+    parser.add_argument("--skip-router", action="store_true", help="skip the model router benchmark")
+    parser.add_argument("--trace-allocations", action="store_true", help="trace Python allocations (slower)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results saved in this JSON file")
+    parser.add_argument(
+        "--max-regression", type=float, default=0.25, help="relative regression tolerated against the baseline"
+    )
+    args = parser.parse_args()
+
+    # Instrumentation stays on, as in production, but nothing is exported or written to the console
+    logfire.configure(send_to_logfire=False, console=False)
+
+    results = {}
+    if not args.skip_micro:
+        results.update(run_micro(args.micro_calls))
+    if not args.skip_load:
+        results.update(
+            asyncio.run(run_load(args.sessions, args.concurrency, args.seed, trace_allocations=args.trace_allocations))
+        )
+
+    if not args.skip_router:
+        results.update(asyncio.run(run_router(args.router_requests, args.concurrency, args.seed)))
+
+    print(format_results(results))
+    if args.output:
+        save_results(results, args.output)
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, load_results(args.baseline), args.max_regression)
+        for metric, baseline_value, value, change in regressions:
+            print(f"REGRESSION {metric}: {baseline_value:.3f} -> {value:.3f} ({change:+.0%})", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.max_regression:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import asyncio
+import random
+import resource
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List
+
+from benchmarks.report import summarize
+from benchmarks.scripted_model import current_script, generate_order_script, scripted_model
+from not_chipotle_service.agents.order_manager_agent import order_manager_agent
+from not_chipotle_service.order.menu_registry import MenuRegistry
+from not_chipotle_service.session.manager import SessionManager
+from not_chipotle_service.telemetry import observe_tool_durations
+
+
+async def _run_session(
+    session_manager: SessionManager, rng: random.Random, turn_latencies: List[float], max_entrees: int
+) -> int:
+    """Plays one scripted conversation, returning the number of tool calls it made."""
+    menu_index = await session_manager.menus.aget()
+    script = generate_order_script(menu_index, rng, max_entrees=max_entrees)
+    current_script.set({turn.user_prompt: turn for turn in script})
+
+    session = await session_manager.create_session()
+    for turn in script:
+        start = time.perf_counter()
+        await session_manager.send_message(session, turn.user_prompt)
+        turn_latencies.append((time.perf_counter() - start) * 1000)
+    await session_manager.close_session(session.session_id)
+    return sum(len(tool_calls) for turn in script for tool_calls in turn.tool_calls)
+
+
+async def run_load(
+    sessions: int, concurrency: int, seed: int, max_entrees: int = 3, trace_allocations: bool = False
+) -> Dict[str, float]:
+    """
+    Simulates many customers building orders at once against the scripted stub model.
+    Reports turn and per-tool latency percentiles in milliseconds, throughput, peak RSS and, when tracing
+    allocations, the peak of memory allocated by Python during the run. Tool latencies are those recorded by the
+    tools' instrumentation, so they are missing with telemetry off.
+    """
+    session_manager = SessionManager(MenuRegistry(poll_interval=None), fast_path=False)
+    await session_manager.menus.aget()
+
+    turn_latencies: List[float] = []
+    tool_latencies: Dict[str, List[float]] = defaultdict(list)
+    semaphore = asyncio.Semaphore(concurrency)
+    rngs = [random.Random(seed + number) for number in range(sessions)]
+
+    async def bounded_session(rng: random.Random) -> int:
+        async with semaphore:
+            return await _run_session(session_manager, rng, turn_latencies, max_entrees)
+
+    if trace_allocations:
+        tracemalloc.start()
+    try:
+        with (
+            order_manager_agent.override(model=scripted_model()),
+            observe_tool_durations(lambda tool_name, duration: tool_latencies[tool_name].append(duration)),
+        ):
+            start = time.perf_counter()
+            tool_calls = sum(await asyncio.gather(*(bounded_session(rng) for rng in rngs)))
+            elapsed = time.perf_counter() - start
+        if trace_allocations:
+            _, allocated_peak = tracemalloc.get_traced_memory()
+    finally:
+        if trace_allocations:
+            tracemalloc.stop()
+        await session_manager.close()
+
+    results = {
+        "load.sessions": float(sessions),
+        "load.concurrency": float(concurrency),
+        "load.elapsed_s": elapsed,
+        "load.throughput_turns_per_s": len(turn_latencies) / elapsed,
+        "load.throughput_tool_calls_per_s": tool_calls / elapsed,
+        # ru_maxrss is in kilobytes on Linux
+        "load.peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        **summarize("load.turn_latency_ms", turn_latencies),
+    }
+    for tool_name, latencies in sorted(tool_latencies.items()):
+        results.update(summarize(f"load.tool_latency_ms.{tool_name}", latencies))
+    if trace_allocations:
+        results["load.allocated_peak_mb"] = allocated_peak / (1024 * 1024)
+    return results
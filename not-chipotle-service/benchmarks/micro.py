@@ -0,0 +1,102 @@
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict
+
+import not_chipotle_service.order.cart_operations as cart_ops
+from not_chipotle_service.agents.fast_path import FastPathParser
+from not_chipotle_service.order.compact_cart import CompactCart
+from not_chipotle_service.order.inventory import StoreStock
+from not_chipotle_service.order.menu_index import MenuIndex
+from not_chipotle_service.order.menu_render import get_compact_menu, render_compact_menu
+from not_chipotle_service.order.models import AddEntreeOperation, AddItemOperation, EntreeSpec
+from not_chipotle_service.order.menu_snapshot import write_snapshot
+from not_chipotle_service.order.utils import MENU_CONFIG_DIR, load_menu
+
+
+def time_per_call(function: Callable[[], object], number: int, repeat: int = 5) -> float:
+    """Returns the median time of a single call in microseconds, over several repeats of many calls."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number * 1_000_000)
+    return statistics.median(timings)
+
+
+def _cart_with_entree(menu_index: MenuIndex) -> CompactCart:
+    cart = CompactCart(cart_id="bench")
+    item_id = cart_ops.add_item_to_cart(cart, menu_index, "entree", "burrito")
+    cart_ops.set_entree_protein(cart, menu_index, item_id, "chicken")
+    return cart
+
+
+def run_micro(number: int = 2000) -> Dict[str, float]:
+    """Benchmarks menu loading and the cart operations behind every tool call, reported as '<name>.median' in µs."""
+    _, menu_index = load_menu()
+    benchmarks: Dict[str, Callable[[], object]] = {}
+
+    benchmarks["load_menu"] = lambda: load_menu(use_snapshot=False)
+
+    # Snapshot of a copy of the menu, so a snapshot next to the real one doesn't skew load_menu
+    snapshot_dir = tempfile.mkdtemp(prefix="not-chipotle-bench-")
+    menu_file_path = shutil.copy(os.path.join(MENU_CONFIG_DIR, "menu.json"), snapshot_dir)
+    with open(menu_file_path, "rb") as f:
+        write_snapshot(menu_file_path, f.read(), menu_index)
+    benchmarks["load_menu_snapshot"] = lambda: load_menu(menu_file_path)
+    benchmarks["menu_index_from_menu"] = lambda: MenuIndex.from_menu(menu_index.menu)
+    benchmarks["render_compact_menu"] = lambda: render_compact_menu(menu_index)
+
+    def add_and_remove_item():
+        cart = CompactCart(cart_id="bench")
+        item_id = cart_ops.add_item_to_cart(cart, menu_index, "side", "chips")
+        cart_ops.remove_item_from_cart(cart, menu_index, item_id)
+
+    benchmarks["add_and_remove_item"] = add_and_remove_item
+
+    cart = _cart_with_entree(menu_index)
+
+    def add_and_remove_topping():
+        cart_ops.add_topping_to_entree(cart, menu_index, 1, "guacamole")
+        cart_ops.remove_topping_from_entree(cart, menu_index, 1, "guacamole")
+
+    benchmarks["add_and_remove_topping"] = add_and_remove_topping
+    benchmarks["set_entree_protein"] = lambda: cart_ops.set_entree_protein(cart, menu_index, 1, "steak")
+
+    entree_operation = AddEntreeOperation(
+        entree=EntreeSpec(
+            menu_item_id="burrito",
+            protein_ids=["chicken"],
+            toppings=["white_rice", "black_beans", "mild_salsa", "cheese", "lettuce"],
+        )
+    )
+    side_operation = AddItemOperation(item_type="side", menu_item_id="chips")
+    benchmarks["apply_cart_operations"] = lambda: cart_ops.apply_cart_operations(
+        CompactCart(cart_id="bench"), menu_index, [entree_operation, side_operation]
+    )
+
+    # A store that ran out of a few items mid-shift
+    stock = StoreStock.from_unavailable([("topping", "guacamole"), ("protein", "carnitas"), ("drink", "bottled_water")])
+    benchmarks["apply_cart_operations_with_stock"] = lambda: cart_ops.apply_cart_operations(
+        CompactCart(cart_id="bench"), menu_index, [entree_operation, side_operation], stock
+    )
+    benchmarks["get_compact_menu_with_stock"] = lambda: get_compact_menu(menu_index, stock)
+
+    full_cart = CompactCart(cart_id="bench")
+    for _ in range(10):
+        cart_ops.apply_cart_operations(full_cart, menu_index, [entree_operation, side_operation])
+    benchmarks["summarize_cart_20_items"] = lambda: cart_ops.summarize_cart(full_cart)
+
+    parser = FastPathParser(menu_index)
+    benchmarks["fast_path_parse"] = lambda: parser.parse("add a chicken burrito with rice and guac and a side of chips")
+
+    results = {}
+    for name, function in benchmarks.items():
+        # Menu loading does file I/O and validation, a few calls are plenty
+        calls = max(number // 100, 1) if name.startswith("load_menu") else number
+        results[f"micro.{name}_us.median"] = time_per_call(function, calls)
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    return results
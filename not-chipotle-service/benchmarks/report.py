@@ -0,0 +1,69 @@
+import json
+import math
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+
+# Metrics where a larger value is an improvement, every other metric is a cost
+HIGHER_IS_BETTER = frozenset({"load.throughput_turns_per_s", "load.throughput_tool_calls_per_s"})
+
+# Statistics compared against the baseline, tail percentiles of short runs are too noisy to gate CI on
+GATED_SUFFIXES = (".p50", ".p95", ".median", "_per_s", "_mb")
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Returns the q-th percentile (0-100) of sorted values, interpolating linearly between the closest ranks."""
+    if not sorted_values:
+        return math.nan
+    rank = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def summarize(name: str, values: Iterable[float]) -> Dict[str, float]:
+    """Flattens a latency distribution into '<name>.count', '<name>.p50', '<name>.p95', '<name>.p99' and '<name>.max'."""
+    sorted_values = sorted(values)
+    return {
+        f"{name}.count": float(len(sorted_values)),
+        f"{name}.p50": percentile(sorted_values, 50),
+        f"{name}.p95": percentile(sorted_values, 95),
+        f"{name}.p99": percentile(sorted_values, 99),
+        f"{name}.max": sorted_values[-1] if sorted_values else math.nan,
+    }
+
+
+def save_results(results: Dict[str, float], path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> Dict[str, float]:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def compare_to_baseline(
+    results: Dict[str, float], baseline: Dict[str, float], max_regression: float
+) -> List[Tuple[str, float, float, float]]:
+    """
+    Returns the gated metrics that regressed by more than max_regression (e.g., 0.2 for 20%) against the baseline,
+    as (metric, baseline value, current value, relative change) tuples.
+    """
+    regressions = []
+    for metric, value in sorted(results.items()):
+        baseline_value = baseline.get(metric)
+        if not metric.endswith(GATED_SUFFIXES) or not baseline_value or math.isnan(value):
+            continue
+
+        change = (value - baseline_value) / baseline_value
+        if metric in HIGHER_IS_BETTER:
+            change = -change
+        if change > max_regression:
+            regressions.append((metric, baseline_value, value, change))
+    return regressions
+
+
+def format_results(results: Dict[str, float]) -> str:
+    """Formats results as an aligned table, one metric per line."""
+    width = max((len(metric) for metric in results), default=0)
+    return "\n".join(f"{metric:<{width}}  {value:>12.3f}" for metric, value in sorted(results.items()))
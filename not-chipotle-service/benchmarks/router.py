@@ -0,0 +1,111 @@
+import asyncio
+import random
+import time
+from typing import AsyncIterator, Dict, List, Tuple
+
+from benchmarks.report import summarize
+from not_chipotle_service.agents.model_router import ModelRouter
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, TextPart, UserPromptPart
+from pydantic_ai.models import ModelRequestParameters
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+
+class StubProvider:
+    """
+    Stub of a model provider with a heavy latency tail and occasional errors, serving as a local FunctionModel.
+    Most requests take around median_latency, slow_rate of them take slow_latency and error_rate of them fail with a
+    503, like a provider under load.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rng: random.Random,
+        median_latency: float = 0.02,
+        slow_rate: float = 0.03,
+        slow_latency: float = 0.3,
+        error_rate: float = 0.01,
+    ):
+        self.name = name
+        self.rng = rng
+        self.median_latency = median_latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+
+    async def _respond(self) -> None:
+        if self.rng.random() < self.slow_rate:
+            latency = self.slow_latency
+        else:
+            latency = self.median_latency * self.rng.lognormvariate(0, 0.25)
+        await asyncio.sleep(latency)
+        if self.rng.random() < self.error_rate:
+            raise ModelHTTPError(status_code=503, model_name=self.name, body="overloaded")
+
+    async def _request(self, messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await self._respond()
+        return ModelResponse(parts=[TextPart("Here's our menu.")], model_name=self.name)
+
+    async def _stream(self, messages: List[ModelMessage], info: AgentInfo) -> AsyncIterator[str]:
+        await self._respond()
+        yield "Here's "
+        yield "our menu."
+
+    def model(self) -> FunctionModel:
+        return FunctionModel(self._request, stream_function=self._stream, model_name=self.name)
+
+
+_PARAMETERS = ModelRequestParameters(function_tools=[], allow_text_result=True, result_tools=[])
+
+
+async def _measure(router: ModelRouter, requests: int, concurrency: int, streamed: bool) -> Tuple[List[float], int]:
+    """Sends requests through a router, returning the latency of each successful one in milliseconds and the failures."""
+    messages: List[ModelMessage] = [ModelRequest(parts=[UserPromptPart("what do you have?")])]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def one_request() -> None:
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if streamed:
+                    async with router.request_stream(messages, None, _PARAMETERS) as response_stream:
+                        async for _ in response_stream:
+                            pass
+                else:
+                    await router.request(messages, None, _PARAMETERS)
+            except Exception:
+                failures += 1
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one_request() for _ in range(requests)))
+    return latencies, failures
+
+
+async def run_router(requests: int, concurrency: int, seed: int) -> Dict[str, float]:
+    """
+    Sends the same simple request through routers of stub providers, first with a single provider per tier and then
+    with a second provider to hedge and fail over to, both plain and streamed. Reports the latency percentiles of
+    each in milliseconds, along with the share of requests that failed.
+    """
+    results: Dict[str, float] = {}
+    for streamed in (False, True):
+        rng = random.Random(seed)
+        primary = StubProvider("stub-primary", rng).model()
+        secondary = StubProvider("stub-secondary", rng).model()
+        routers = {
+            "single": ModelRouter(fast_models=[primary], strong_models=[primary]),
+            "hedged": ModelRouter(fast_models=[primary, secondary], strong_models=[secondary, primary]),
+        }
+        for name, router in routers.items():
+            # Latency percentiles only kick in after a first batch of requests, as in a warmed up service
+            await _measure(router, requests // 4, concurrency, streamed)
+            latencies, failures = await _measure(router, requests, concurrency, streamed)
+            prefix = f"router.{'stream' if streamed else 'request'}.{name}"
+            results.update(summarize(f"{prefix}_ms", latencies))
+            results[f"{prefix}.failure_rate"] = failures / requests
+    return results
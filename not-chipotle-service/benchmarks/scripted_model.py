@@ -0,0 +1,173 @@
+import contextvars
+import json
+import random
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from not_chipotle_service.order.menu_index import MenuIndex
+from pydantic_ai.messages import ModelMessage, ModelResponse, TextPart, ToolCallPart, UserPromptPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+
+# A single tool call, as the tool name and its JSON arguments
+ToolCall = Tuple[str, Dict[str, Any]]
+
+
+@dataclass
+class TurnScript:
+    """What the stub model does in one turn: the tool calls of each model response, then the final reply."""
+
+    user_prompt: str
+    # Every inner list is one model response, its tool calls run together like parallel tool calls
+    tool_calls: List[List[ToolCall]] = field(default_factory=list)
+    reply: str = "Anything else?"
+
+
+# Script of the session running in the current task, so concurrent sessions share the agent's single model override
+current_script: contextvars.ContextVar[Dict[str, TurnScript]] = contextvars.ContextVar("current_script")
+
+
+def _latest_user_prompt(messages: List[ModelMessage]) -> Tuple[Optional[str], int]:
+    """Returns the latest user prompt and the number of model responses sent since."""
+    responses = 0
+    for message in reversed(messages):
+        if isinstance(message, ModelResponse):
+            responses += 1
+            continue
+        for part in message.parts:
+            if isinstance(part, UserPromptPart) and isinstance(part.content, str):
+                return part.content, responses
+    return None, responses
+
+
+async def _scripted_response(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+    """
+    FunctionModel function replaying the current session's script, one model response at a time.
+    It is async so it runs in the task of its session, where current_script is set, rather than in an executor.
+    """
+    user_prompt, step = _latest_user_prompt(messages)
+    turn = current_script.get().get(user_prompt)
+    if turn is None:
+        return ModelResponse(parts=[TextPart("Sorry, I didn't get that.")])
+
+    if step < len(turn.tool_calls):
+        return ModelResponse(
+            parts=[
+                ToolCallPart(tool_name=tool_name, args=json.dumps(args), tool_call_id=f"call_{step}_{position}")
+                for position, (tool_name, args) in enumerate(turn.tool_calls[step])
+            ]
+        )
+    return ModelResponse(parts=[TextPart(turn.reply)])
+
+
+def scripted_model() -> FunctionModel:
+    """Returns a stub model replaying the TurnScripts of current_script, with no network involved."""
+    return FunctionModel(_scripted_response, model_name="scripted")
+
+
+def generate_order_script(menu_index: MenuIndex, rng: random.Random, max_entrees: int = 3) -> List[TurnScript]:
+    """
+    Scripts a realistic conversation building an order from the menu: a greeting, a look at the menu, fully configured
+    entrees, a few changes to them, sides and drinks, an occasional removal and a final look at the cart.
+    """
+    entree_ids = list(menu_index.entrees.items)
+    protein_ids = list(menu_index.proteins.items)
+    topping_ids = [topping_id for topping_id in menu_index.toppings.items if not topping_id.startswith("double_protein")]
+    side_ids = list(menu_index.sides.items)
+    drink_ids = list(menu_index.drinks.items)
+
+    turns = [
+        TurnScript(user_prompt="hi", reply="Hi there! What can I start you off with today?"),
+        TurnScript(user_prompt="what do you have?", tool_calls=[[("view_menu", {})]], reply="Here's our menu."),
+    ]
+    # Carts number their items from 1 in the order they are added, and never reuse a number
+    next_item_id = 1
+    entree_item_ids = []
+    for number in range(rng.randint(1, max_entrees)):
+        entree_id = rng.choice(entree_ids)
+        entree: Dict[str, Any] = {
+            "menu_item_id": entree_id,
+            "protein_ids": [rng.choice(protein_ids)],
+            "toppings": rng.sample(topping_ids, rng.randint(2, 6)),
+        }
+        allowed_configurations = menu_index.allowed_special_configurations(entree_id)
+        if allowed_configurations:
+            entree["special_configurations"] = {
+                key: rng.choice(sorted(values)) for key, values in allowed_configurations.items()
+            }
+        turns.append(
+            TurnScript(
+                user_prompt=f"entree {number}: {entree_id} with {', '.join(entree['protein_ids'] + entree['toppings'])}",
+                tool_calls=[[("build_entree", entree)]],
+                reply=f"Added your {entree_id}. Anything else?",
+            )
+        )
+        entree_item_ids.append(next_item_id)
+        next_item_id += 1
+
+    # Change the first entree with two tool calls in the same response, then swap its protein
+    turns.append(
+        TurnScript(
+            user_prompt="can you make the first one with extra stuff",
+            tool_calls=[
+                [
+                    ("add_topping_to_entree", {"item_id": entree_item_ids[0], "topping_id": rng.choice(topping_ids)}),
+                    ("add_topping_to_entree", {"item_id": entree_item_ids[0], "topping_id": rng.choice(topping_ids)}),
+                ],
+                [("set_entree_protein", {"item_id": entree_item_ids[0], "new_protein_id": rng.choice(protein_ids)})],
+            ],
+            reply="Done, anything else?",
+        )
+    )
+
+    turns.append(
+        TurnScript(
+            user_prompt="add a side and a drink",
+            tool_calls=[
+                [
+                    ("add_item_to_cart", {"item_type": "side", "menu_item_id": rng.choice(side_ids)}),
+                    ("add_item_to_cart", {"item_type": "drink", "menu_item_id": rng.choice(drink_ids)}),
+                ]
+            ],
+            reply="Added a side and a drink.",
+        )
+    )
+    drink_item_id = next_item_id + 1
+    next_item_id += 2
+
+    if rng.random() < 0.5:
+        turns.append(
+            TurnScript(
+                user_prompt="actually remove the drink and add two more sides",
+                tool_calls=[
+                    [
+                        (
+                            "update_cart",
+                            {
+                                "operations": [
+                                    {"op": "remove_item", "item_id": drink_item_id},
+                                    {"op": "add_item", "item_type": "side", "menu_item_id": rng.choice(side_ids)},
+                                    {"op": "add_item", "item_type": "side", "menu_item_id": rng.choice(side_ids)},
+                                ]
+                            },
+                        )
+                    ]
+                ],
+                reply="Updated your order.",
+            )
+        )
+        next_item_id += 2
+
+    if rng.random() < 0.3:
+        turns.append(
+            TurnScript(
+                user_prompt="remove the last item",
+                tool_calls=[[("remove_item_from_cart", {"item_id": next_item_id - 1})]],
+                reply="Removed it.",
+            )
+        )
+
+    turns.append(
+        TurnScript(user_prompt="that's all", tool_calls=[[("view_cart", {})]], reply="Here's your order, enjoy!")
+    )
+    return turns
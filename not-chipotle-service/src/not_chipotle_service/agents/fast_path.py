@@ -0,0 +1,296 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import not_chipotle_service.order.cart_operations as cart_ops
+from not_chipotle_service.order.compact_cart import CompactCart
+from not_chipotle_service.order.inventory import StoreStock
+from not_chipotle_service.order.menu_index import MenuIndex, normalize_term
+from not_chipotle_service.order.models import (
+    AddEntreeOperation,
+    AddItemOperation,
+    AddToppingOperation,
+    CartOperation,
+    EntreeSpec,
+    RemoveItemOperation,
+    RemoveToppingOperation,
+)
+
+
+# Words that carry no meaning for a cart command, anything else that is not a menu term makes the parser back off
+FILLER_WORDS = frozenset(
+    {
+        "a", "also", "an", "and", "can", "could", "get", "give", "have", "i", "i'd", "i'll", "id", "ill", "just",
+        "let", "like", "me", "my", "order", "please", "plus", "some", "the", "then", "to", "want", "with", "would",
+    }
+)
+
+QUANTITY_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5}
+
+MAX_QUANTITY = 10
+
+ADD_VERBS = frozenset({"add", "put", "throw"})
+REMOVE_VERBS = frozenset({"remove", "delete", "drop", "cancel"})
+ITEM_WORDS = frozenset({"item", "entree", "number", "no", "#"})
+
+# Categories in the order they win when a phrase matches several of them
+CATEGORY_PRIORITY = ("entree", "protein", "topping", "side", "drink")
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+|#")
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower().replace("&", " and "))
+
+
+@dataclass
+class _Term:
+    """A menu phrase found in the utterance with every category it could belong to."""
+
+    position: int
+    text: str
+    ids: Dict[str, str]
+    quantity: int = 1
+    as_side: bool = False
+
+
+@dataclass
+class FastPathParser:
+    """
+    Deterministic parser mapping simple cart commands onto cart operations without a model round trip.
+    It only answers when every word of the utterance is understood (menu ids, names and synonyms, quantities, item
+    references and a small set of filler words), and returns None otherwise so the turn falls back to the agent.
+    Item references use the item IDs of the cart shown to the user.
+    """
+
+    menu_index: MenuIndex
+    max_phrase_length: int = field(init=False)
+    configuration_values: frozenset = field(init=False)
+
+    def __post_init__(self):
+        self.max_phrase_length = max(
+            (len(term.split()) for category in self.menu_index.categories.values() for term in category.synonyms),
+            default=1,
+        )
+        self.configuration_values = frozenset(
+            value
+            for configurations in self.menu_index.special_configurations.values()
+            for values in configurations.values()
+            for value in values
+        )
+
+    def _match_phrase(self, phrase: str) -> Dict[str, str]:
+        """Returns the menu item IDs a phrase refers to, by category."""
+        ids = {}
+        for item_type in CATEGORY_PRIORITY:
+            category = self.menu_index.categories[item_type]
+            item_id = category.synonyms.get(phrase)
+            # Accept simple plurals such as 'burritos'
+            if item_id is None and phrase.endswith("s"):
+                item_id = category.synonyms.get(phrase[:-1])
+            if item_id is not None:
+                ids[item_type] = item_id
+        if phrase in self.configuration_values:
+            ids["configuration"] = phrase
+        return ids
+
+    def _scan(self, tokens: Sequence[str]) -> Optional[List[_Term]]:
+        """Splits tokens into menu terms, skipping filler words. Returns None on any unknown word."""
+        terms: List[_Term] = []
+        quantity = 1
+        as_side = False
+        position = 0
+        while position < len(tokens):
+            token = tokens[position]
+
+            # Longest menu phrase starting at this token wins
+            for length in range(min(self.max_phrase_length, len(tokens) - position), 0, -1):
+                phrase = normalize_term(" ".join(tokens[position : position + length]))
+                ids = self._match_phrase(phrase)
+                if ids:
+                    terms.append(_Term(position=len(terms), text=phrase, ids=ids, quantity=quantity, as_side=as_side))
+                    quantity, as_side = 1, False
+                    position += length
+                    break
+            else:
+                if token in QUANTITY_WORDS or token.isdigit():
+                    quantity = QUANTITY_WORDS.get(token) or int(token)
+                    if not 0 < quantity <= MAX_QUANTITY:
+                        return None
+                elif token == "side" and position + 1 < len(tokens) and tokens[position + 1] == "of":
+                    as_side = True
+                    position += 1
+                elif token not in FILLER_WORDS:
+                    return None
+                position += 1
+        return terms
+
+    def _parse_item_id(self, tokens: Sequence[str]) -> Optional[int]:
+        """Parses a reference to a cart item such as 'item 2', 'number 2' or '#2'."""
+        words = [token for token in tokens if token not in FILLER_WORDS]
+        if len(words) >= 1 and words[-1].isdigit() and all(word in ITEM_WORDS for word in words[:-1]):
+            return int(words[-1])
+        return None
+
+    def _parse_toppings(self, tokens: Sequence[str]) -> Optional[Tuple[str, ...]]:
+        terms = self._scan(tokens)
+        if not terms or any("topping" not in term.ids or term.quantity != 1 for term in terms):
+            return None
+        return tuple(term.ids["topping"] for term in terms)
+
+    def _parse_add_items(self, tokens: Sequence[str]) -> Optional[List[CartOperation]]:
+        terms = self._scan(tokens)
+        if not terms:
+            return None
+
+        entree_terms = [term for term in terms if "entree" in term.ids and not term.as_side]
+        if len(entree_terms) > 1:
+            return None
+        entree = entree_terms[0] if entree_terms else None
+
+        protein_id = None
+        special_configurations: Dict[str, str] = {}
+        toppings: List[str] = []
+        standalone: List[_Term] = []
+        allowed_configurations = self.menu_index.allowed_special_configurations(entree.ids["entree"]) if entree else None
+        for term in terms:
+            if term is entree:
+                continue
+
+            # Words right before the entree carry its quantity, like 'two chicken burritos'
+            if entree and term.position < entree.position and term.quantity > 1:
+                if entree.quantity > 1:
+                    return None
+                entree.quantity, term.quantity = term.quantity, 1
+
+            # A configuration value right before its entree, like 'corn tacos'
+            if allowed_configurations and term.position == entree.position - 1:
+                config_key = next((key for key, values in allowed_configurations.items() if term.text in values), None)
+                if config_key:
+                    special_configurations[config_key] = term.text
+                    continue
+
+            if entree and not term.as_side and term.quantity == 1 and "protein" in term.ids:
+                if protein_id is not None:
+                    return None
+                protein_id = term.ids["protein"]
+            elif entree and not term.as_side and "topping" in term.ids:
+                if term.quantity != 1:
+                    return None
+                toppings.append(term.ids["topping"])
+            elif "drink" in term.ids or ("side" in term.ids and (term.as_side or "topping" not in term.ids)):
+                standalone.append(term)
+            elif term.as_side and "topping" in term.ids and term.ids["topping"] in self.menu_index.sides:
+                # Toppings like guacamole are also sold as sides, but only 'a side of guac' is unambiguous
+                term.ids["side"] = term.ids["topping"]
+                standalone.append(term)
+            else:
+                # Proteins and toppings can't be ordered on their own, e.g. 'add queso' may well be meant for an entree
+                return None
+
+        operations: List[CartOperation] = []
+        if entree and not (protein_id or toppings or special_configurations):
+            # A bare 'burrito' needs its protein and toppings asked for, which is the agent's job
+            return None
+        if entree:
+            entree_spec = EntreeSpec(
+                menu_item_id=entree.ids["entree"],
+                protein_ids=[protein_id] if protein_id else [],
+                toppings=list(dict.fromkeys(toppings)),
+                special_configurations=special_configurations or None,
+                quantity=entree.quantity,
+            )
+            operations.append(AddEntreeOperation(entree=entree_spec))
+        for term in standalone:
+            item_type = "side" if "side" in term.ids else "drink"
+            operations += [AddItemOperation(item_type=item_type, menu_item_id=term.ids[item_type])] * term.quantity
+        return operations
+
+    def parse(self, text: str) -> Optional[List[CartOperation]]:
+        """Parses an utterance into cart operations, or returns None when the agent should handle it."""
+        tokens = _tokenize(text)
+        if not tokens:
+            return None
+
+        verb, rest = tokens[0], tokens[1:]
+        if verb in REMOVE_VERBS:
+            # 'remove item 2' or 'remove guac from item 2'
+            item_id = self._parse_item_id(rest)
+            if item_id is not None:
+                return [RemoveItemOperation(item_id=item_id)]
+            if "from" in rest:
+                split = rest.index("from")
+                item_id = self._parse_item_id(rest[split + 1 :])
+                topping_ids = self._parse_toppings(rest[:split])
+                if item_id is not None and topping_ids:
+                    return [
+                        RemoveToppingOperation(item_id=item_id, topping_id=topping_id)
+                        for topping_id in topping_ids
+                    ]
+            return None
+
+        if verb in ADD_VERBS and "to" in rest:
+            # 'add guac and cheese to item 1'
+            split = len(rest) - 1 - rest[::-1].index("to")
+            item_id = self._parse_item_id(rest[split + 1 :])
+            if item_id is not None:
+                topping_ids = self._parse_toppings(rest[:split])
+                if not topping_ids:
+                    return None
+                return [AddToppingOperation(item_id=item_id, topping_id=topping_id) for topping_id in topping_ids]
+
+        return self._parse_add_items(rest if verb in ADD_VERBS else tokens)
+
+
+def _describe_operation(menu_index: MenuIndex, operation: CartOperation, item_ids: List[int]) -> str:
+    """Helper function describing an applied operation to the user."""
+    if isinstance(operation, AddEntreeOperation):
+        entree = operation.entree
+        name = menu_index.entrees.get(entree.menu_item_id).name
+        details = [menu_index.proteins.get(protein_id).name for protein_id in entree.protein_ids]
+        details += list((entree.special_configurations or {}).values())
+        details += [menu_index.toppings.get(topping_id).name for topping_id in entree.toppings]
+        if details:
+            name += f" ({', '.join(details)})"
+        items = ", ".join(f"[{item_id}]" for item_id in item_ids)
+        quantity = f"{entree.quantity} x " if entree.quantity > 1 else ""
+        return f"Added {quantity}{name} to your cart as item {items}."
+    if isinstance(operation, AddItemOperation):
+        name = menu_index.get(operation.item_type, operation.menu_item_id).name
+        return f"Added {name} to your cart as item [{item_ids[0]}]."
+    if isinstance(operation, RemoveItemOperation):
+        return f"Removed item [{operation.item_id}] from your cart."
+    if isinstance(operation, AddToppingOperation):
+        return f"Added {menu_index.toppings.get(operation.topping_id).name} to item [{operation.item_id}]."
+    if isinstance(operation, RemoveToppingOperation):
+        return f"Removed {menu_index.toppings.get(operation.topping_id).name} from item [{operation.item_id}]."
+    return "Updated your cart."
+
+
+def apply_operations(
+    cart: CompactCart,
+    menu_index: MenuIndex,
+    operations: Sequence[CartOperation],
+    stock: Optional[StoreStock] = None,
+) -> Optional[str]:
+    """
+    Applies parsed operations all together or not at all, returning a reply for the user.
+    Returns None if any of the operations is invalid for the current cart, or adds an item out of stock.
+    """
+    # Removing a topping the entree doesn't have leaves the cart as is, so the reply would confirm a removal that
+    # never happened. The agent can tell the user instead.
+    for operation in operations:
+        if isinstance(operation, RemoveToppingOperation):
+            item = cart.get(operation.item_id)
+            if item is None or operation.topping_id not in item.toppings:
+                return None
+
+    result = cart_ops.apply_cart_operations(cart, menu_index, operations, stock)
+    if not result.applied:
+        return None
+
+    descriptions = [
+        _describe_operation(menu_index, operation, item_ids)
+        for operation, item_ids in zip(operations, result.item_ids)
+    ]
+    return " ".join(descriptions) + f" Your total is ${cart.total_price:.2f}. Anything else?"
@@ -0,0 +1,175 @@
+import dataclasses
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+import not_chipotle_service.order.cart_operations as cart_ops
+from not_chipotle_service.order.compact_cart import CompactCart
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelRequestPart,
+    SystemPromptPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_core import to_json
+
+
+# Tools whose results are snapshots of state, so only their latest result is worth keeping in context
+SNAPSHOT_TOOLS = frozenset({"view_menu", "view_cart"})
+
+SUPERSEDED_CONTENT = "Superseded by a later call of this tool."
+
+# Marks the system prompt part carrying the summary of compacted turns, so it is replaced rather than accumulated
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+# Rough number of characters per token, good enough to budget prompts without a provider-specific tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def _estimate_content_tokens(content: object) -> int:
+    text = content if isinstance(content, str) else to_json(content, fallback=str).decode()
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_message_tokens(message: ModelMessage) -> int:
+    """Estimates the number of prompt tokens a message will take up."""
+    tokens = 0
+    for part in message.parts:
+        if isinstance(part, ToolCallPart):
+            tokens += _estimate_content_tokens(part.tool_name) + _estimate_content_tokens(part.args)
+        else:
+            tokens += _estimate_content_tokens(getattr(part, "content", ""))
+    return tokens
+
+
+def estimate_tokens(messages: Sequence[ModelMessage]) -> int:
+    """Estimates the number of prompt tokens a message history will take up."""
+    return sum(estimate_message_tokens(message) for message in messages)
+
+
+@dataclass(frozen=True)
+class HistoryCompactionStats:
+    """Metrics of a single compaction pass."""
+
+    tokens_before: int
+    tokens_after: int
+    messages_before: int
+    messages_after: int
+    superseded_tool_returns: int
+    summarized_turns: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+@dataclass(frozen=True)
+class HistoryCompactor:
+    """
+    Bounds the chat history sent to the model on every turn.
+    Compaction runs in three steps:
+    1. Results of snapshot tools (view_menu, view_cart) that were superseded by a later call are stubbed out.
+    2. Whole turns are kept from the most recent backwards, up to max_window_turns and the token budget.
+    3. Older turns are replaced by a short summary carrying a snapshot of the cart, kept next to the system prompt.
+    """
+
+    token_budget: int = 8_000
+    max_window_turns: int = 8
+
+    def compact(self, messages: Sequence[ModelMessage], cart: CompactCart) -> Tuple[List[ModelMessage], HistoryCompactionStats]:
+        """Returns the compacted history together with metrics of the pass."""
+        tokens_before = estimate_tokens(messages)
+
+        compacted, superseded = self._drop_superseded_tool_returns(messages)
+        compacted, summarized_turns = self._apply_window(compacted, cart)
+
+        stats = HistoryCompactionStats(
+            tokens_before=tokens_before,
+            tokens_after=estimate_tokens(compacted),
+            messages_before=len(messages),
+            messages_after=len(compacted),
+            superseded_tool_returns=superseded,
+            summarized_turns=summarized_turns,
+        )
+        return compacted, stats
+
+    def _drop_superseded_tool_returns(self, messages: Sequence[ModelMessage]) -> Tuple[List[ModelMessage], int]:
+        """Stubs out every snapshot tool result that has a later result of the same tool."""
+        seen_tools = set()
+        superseded = 0
+        compacted: List[ModelMessage] = []
+
+        # Walk backwards so the first result seen for each tool is the latest one
+        for message in reversed(messages):
+            if isinstance(message, ModelRequest):
+                parts: List[ModelRequestPart] = []
+                changed = False
+                for part in reversed(message.parts):
+                    if isinstance(part, ToolReturnPart) and part.tool_name in SNAPSHOT_TOOLS:
+                        if part.tool_name in seen_tools and part.content != SUPERSEDED_CONTENT:
+                            # Keep the part itself so every tool call still has a matching return
+                            part = dataclasses.replace(part, content=SUPERSEDED_CONTENT)
+                            superseded += 1
+                            changed = True
+                        seen_tools.add(part.tool_name)
+                    parts.append(part)
+                if changed:
+                    parts.reverse()
+                    message = dataclasses.replace(message, parts=parts)
+            compacted.append(message)
+
+        compacted.reverse()
+        return compacted, superseded
+
+    def _apply_window(self, messages: List[ModelMessage], cart: CompactCart) -> Tuple[List[ModelMessage], int]:
+        """Keeps the most recent turns that fit in the window and summarizes the rest."""
+        # A turn starts at a request carrying a user prompt, cutting anywhere else would orphan tool calls
+        turn_starts = [
+            idx
+            for idx, message in enumerate(messages)
+            if isinstance(message, ModelRequest) and any(isinstance(part, UserPromptPart) for part in message.parts)
+        ]
+        if not turn_starts:
+            return messages, 0
+
+        first_parts = messages[0].parts if isinstance(messages[0], ModelRequest) else []
+        system_parts = [
+            part
+            for part in first_parts
+            if isinstance(part, SystemPromptPart) and not part.content.startswith(SUMMARY_PREFIX)
+        ]
+        has_summary = len(system_parts) < sum(isinstance(part, SystemPromptPart) for part in first_parts)
+        budget = self.token_budget - sum(_estimate_content_tokens(part.content) for part in system_parts)
+
+        # Always keep the latest turn, then add older turns while they fit
+        cut = turn_starts[-1]
+        kept_turns = 1
+        tokens = estimate_tokens(messages[cut:])
+        for start in reversed(turn_starts[:-1]):
+            turn_tokens = estimate_tokens(messages[start:cut])
+            if kept_turns >= self.max_window_turns or tokens + turn_tokens > budget:
+                break
+            cut = start
+            kept_turns += 1
+            tokens += turn_tokens
+
+        summarized_turns = len(turn_starts) - kept_turns
+        if summarized_turns == 0 and not has_summary:
+            return messages, 0
+
+        # An existing summary is refreshed even when no turn is dropped, so its cart snapshot never goes stale
+        summary = SystemPromptPart(
+            f"{SUMMARY_PREFIX} earlier turns were omitted to save space. "
+            f"Current cart: {cart_ops.summarize_cart(cart)}"
+        )
+
+        # The system prompt only lives in the first message, so it moves to the start of the window
+        first, *rest = messages[cut:]
+        if not isinstance(first, ModelRequest):
+            raise ValueError(f"A compaction window must start with a model request, got {type(first).__name__}.")
+        window_parts = [part for part in first.parts if not isinstance(part, SystemPromptPart)]
+        first = dataclasses.replace(first, parts=[*system_parts, summary, *window_parts])
+
+        return [first, *rest], summarized_turns
@@ -0,0 +1,385 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple, Union
+
+import httpx
+import logfire
+import not_chipotle_service.telemetry as telemetry
+from pydantic_ai.exceptions import FallbackExceptionGroup, ModelHTTPError
+from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, RetryPromptPart, UserPromptPart
+from pydantic_ai.models import Model, ModelRequestParameters, StreamedResponse, get_user_agent, infer_model
+from pydantic_ai.settings import ModelSettings
+from pydantic_ai.usage import Usage
+
+
+FAST_TIER = "fast"
+STRONG_TIER = "strong"
+
+# Models of each tier as '<provider>:<model name>', in order of preference. The first one serves the tier's requests,
+# the others are hedged to when it is slow and failed over to when it errors.
+DEFAULT_FAST_MODELS = ("google-gla:gemini-2.0-flash-lite", "google-gla:gemini-2.0-flash")
+DEFAULT_STRONG_MODELS = ("google-gla:gemini-2.0-flash", "google-gla:gemini-2.0-flash-lite")
+
+# Words of requests that change what's already in the cart, which take reasoning over the cart and the conversation
+EDIT_WORDS = frozenset(
+    {"actually", "but", "change", "except", "instead", "modify", "rather", "replace", "swap", "switch", "without"}
+)
+
+# Prompts longer than this, or listing more items than MAX_FAST_ITEM_SEPARATORS, go to the strong tier
+MAX_FAST_PROMPT_WORDS = 30
+MAX_FAST_ITEM_SEPARATORS = 3
+
+# HTTP statuses of provider errors that say nothing about the request itself, so another model may well serve it.
+# Other 4xx errors (e.g. a malformed or oversized request) would fail on every model, and are raised right away.
+FAILOVER_STATUSES = frozenset({408, 429})
+
+
+def is_failover_error(error: BaseException) -> bool:
+    """Returns whether a model failed for reasons of its own (overload, server errors, timeouts, connection errors)."""
+    if isinstance(error, ModelHTTPError):
+        return error.status_code >= 500 or error.status_code in FAILOVER_STATUSES
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code in FAILOVER_STATUSES
+    return isinstance(error, (httpx.TransportError, TimeoutError))
+
+# HTTP clients shared by every model of a provider, keyed by provider
+_http_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def pooled_http_client(provider: str) -> httpx.AsyncClient:
+    """
+    Returns the HTTP client shared by every model of a provider. Each provider gets its own connection pool, sized for
+    many concurrent conversations and keeping connections alive between turns, so a burst of requests to one provider
+    never waits on connections held by another and most requests skip the TCP and TLS handshakes.
+    """
+    client = _http_clients.get(provider)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50, keepalive_expiry=60),
+            timeout=httpx.Timeout(timeout=60, connect=5),
+            headers={"User-Agent": get_user_agent()},
+        )
+        _http_clients[provider] = client
+    return client
+
+
+async def close_http_clients() -> None:
+    """Closes the pooled HTTP clients of every provider."""
+    clients = list(_http_clients.values())
+    _http_clients.clear()
+    await asyncio.gather(*(client.aclose() for client in clients))
+
+
+def create_model(model: str) -> Model:
+    """
+    Creates a model from its '<provider>:<model name>', using the pooled HTTP client of its provider. Providers
+    without an httpx based client (e.g. bedrock) get pydantic-ai's default client. Provider SDKs are imported here,
+    so only the ones of configured models are ever loaded.
+    """
+    provider, _, model_name = model.partition(":")
+    if provider == "google-gla":
+        from pydantic_ai.models.gemini import GeminiModel
+        from pydantic_ai.providers.google_gla import GoogleGLAProvider
+
+        return GeminiModel(model_name, provider=GoogleGLAProvider(http_client=pooled_http_client(provider)))
+    elif provider == "openai":
+        from pydantic_ai.models.openai import OpenAIModel
+        from pydantic_ai.providers.openai import OpenAIProvider
+
+        return OpenAIModel(model_name, provider=OpenAIProvider(http_client=pooled_http_client(provider)))
+    elif provider == "anthropic":
+        from pydantic_ai.models.anthropic import AnthropicModel
+        from pydantic_ai.providers.anthropic import AnthropicProvider
+
+        return AnthropicModel(model_name, provider=AnthropicProvider(http_client=pooled_http_client(provider)))
+    elif provider == "groq":
+        from pydantic_ai.models.groq import GroqModel
+        from pydantic_ai.providers.groq import GroqProvider
+
+        return GroqModel(model_name, provider=GroqProvider(http_client=pooled_http_client(provider)))
+    elif provider == "mistral":
+        from pydantic_ai.models.mistral import MistralModel
+        from pydantic_ai.providers.mistral import MistralProvider
+
+        return MistralModel(model_name, provider=MistralProvider(http_client=pooled_http_client(provider)))
+    return infer_model(model)
+
+
+def _turn_prompt(messages: Sequence[ModelMessage]) -> Optional[str]:
+    """Helper function returning the user prompt of the turn the messages end with."""
+    for message in reversed(messages):
+        if isinstance(message, ModelRequest):
+            for part in message.parts:
+                if isinstance(part, UserPromptPart):
+                    return part.content if isinstance(part.content, str) else None
+    return None
+
+
+def classify_turn(messages: Sequence[ModelMessage]) -> str:
+    """
+    Returns the tier of model a request should go to. Requests go to the fast tier unless the model just got a tool
+    call wrong, or the user prompt of the turn is long, lists many items or changes what's already in the cart.
+    Every request of a turn derives its tier from the same prompt, so a turn stays on one tier unless it escalates.
+    """
+    if messages and isinstance(messages[-1], ModelRequest):
+        if any(isinstance(part, RetryPromptPart) for part in messages[-1].parts):
+            return STRONG_TIER
+
+    prompt = _turn_prompt(messages)
+    if prompt is None:
+        return FAST_TIER
+
+    words = prompt.lower().replace(",", " , ").split()
+    if len(words) > MAX_FAST_PROMPT_WORDS or any(word in EDIT_WORDS for word in words):
+        return STRONG_TIER
+    if sum(word in (",", "and", "plus", "also") for word in words) > MAX_FAST_ITEM_SEPARATORS:
+        return STRONG_TIER
+    return FAST_TIER
+
+
+class LatencyTracker:
+    """Latencies of the latest successful requests to a model, to hedge requests that take longer than most."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def record(self, latency: float) -> None:
+        """Records the latency of a successful request in seconds."""
+        self._latencies.append(latency)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Returns the given percentile (0 to 1) of the recorded latencies, or None until there are enough of them."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(int(percentile * len(latencies)), len(latencies) - 1)]
+
+
+class _Attempt:
+    """A request to one model, running in its own task."""
+
+    def __init__(self, model: Model, streamed: bool):
+        self.model = model
+        self.streamed = streamed
+        self.task: Optional[asyncio.Task] = None
+        self.started_at = time.perf_counter()
+        # Set by streamed attempts once their stream has been consumed, so the task closes it
+        self.release = asyncio.Event()
+        # Resolved by streamed attempts with their stream once it is open
+        self.opened: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    @property
+    def waiter(self) -> asyncio.Future:
+        return self.opened if self.streamed else self.task
+
+
+# Starts the request of an attempt on a model
+_AttemptFunction = Callable[[Model, _Attempt], Awaitable[Any]]
+
+
+class ModelRouter(Model):
+    """
+    Model sending every request of the agent to a tier of models: simple turns to fast, cheap models and complex
+    ones to stronger models, as decided by classify_turn().
+    Within a tier, requests go to the first healthy model. When it takes longer than hedge_percentile of its recent
+    latencies, the request is hedged to the next model and the first reply wins, the other request is cancelled.
+    When a model fails with an error that isn't about the request, the request fails over to the next model and the
+    failing model is skipped for cooldown_seconds. Streamed requests are hedged on the time to their first chunk.
+    Models can be given as Model instances, e.g. stubs, or as '<provider>:<model name>' created on first use with a
+    pooled HTTP client per provider.
+    """
+
+    def __init__(
+        self,
+        fast_models: Sequence[Union[Model, str]] = DEFAULT_FAST_MODELS,
+        strong_models: Sequence[Union[Model, str]] = DEFAULT_STRONG_MODELS,
+        hedge_percentile: float = 0.95,
+        initial_hedge_delay: float = 2.0,
+        min_hedge_delay: float = 0.05,
+        cooldown_seconds: float = 30.0,
+        should_fail_over: Callable[[BaseException], bool] = is_failover_error,
+    ):
+        if not fast_models or not strong_models:
+            raise ValueError("Every tier of a ModelRouter needs at least one model.")
+        if not 0 < hedge_percentile < 1:
+            raise ValueError(f"hedge_percentile must be between 0 and 1, got {hedge_percentile}.")
+        self.tiers: Dict[str, List[Union[Model, str]]] = {FAST_TIER: list(fast_models), STRONG_TIER: list(strong_models)}
+        self.hedge_percentile = hedge_percentile
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.cooldown_seconds = cooldown_seconds
+        self.should_fail_over = should_fail_over
+        self._models: Dict[str, Model] = {}
+        self._latencies: Dict[Tuple[str, bool], LatencyTracker] = {}
+        self._unhealthy_until: Dict[str, float] = {}
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """
+        Creates a router from the comma separated models of NOT_CHIPOTLE_FAST_MODELS and NOT_CHIPOTLE_STRONG_MODELS,
+        e.g. 'google-gla:gemini-2.0-flash,anthropic:claude-3-5-haiku-latest', using the default models otherwise.
+        """
+
+        def models(name: str, default: Sequence[str]) -> List[str]:
+            value = os.getenv(name, "")
+            return [model.strip() for model in value.split(",") if model.strip()] or list(default)
+
+        return cls(
+            fast_models=models("NOT_CHIPOTLE_FAST_MODELS", DEFAULT_FAST_MODELS),
+            strong_models=models("NOT_CHIPOTLE_STRONG_MODELS", DEFAULT_STRONG_MODELS),
+        )
+
+    @property
+    def model_name(self) -> str:
+        return f"router:{self._tier_name(FAST_TIER)}|{self._tier_name(STRONG_TIER)}"
+
+    @property
+    def system(self) -> str:
+        return "router"
+
+    def _tier_name(self, tier: str) -> str:
+        return ",".join(model if isinstance(model, str) else model.model_name for model in self.tiers[tier])
+
+    def _resolve(self, model: Union[Model, str]) -> Model:
+        """Helper function creating a model given by name once."""
+        if not isinstance(model, str):
+            return model
+        if model not in self._models:
+            self._models[model] = create_model(model)
+        return self._models[model]
+
+    def _candidates(self, tier: str) -> List[Model]:
+        """Helper function returning the models of a tier, healthy ones first, in order of preference."""
+        models = [self._resolve(model) for model in self.tiers[tier]]
+        now = time.monotonic()
+        return sorted(models, key=lambda model: self._unhealthy_until.get(model.model_name, 0) > now)
+
+    def _latency_tracker(self, model: Model, streamed: bool) -> LatencyTracker:
+        tracker = self._latencies.get((model.model_name, streamed))
+        if tracker is None:
+            tracker = self._latencies[(model.model_name, streamed)] = LatencyTracker()
+        return tracker
+
+    def hedge_delay(self, model: Model, streamed: bool = False) -> float:
+        """Returns how long to wait on a model before hedging a request to the next one."""
+        delay = self._latency_tracker(model, streamed).percentile(self.hedge_percentile)
+        return max(delay if delay is not None else self.initial_hedge_delay, self.min_hedge_delay)
+
+    async def request(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Optional[ModelSettings],
+        model_request_parameters: ModelRequestParameters,
+    ) -> Tuple[ModelResponse, Usage]:
+        tier = classify_turn(messages)
+        attempt = await self._race(
+            tier,
+            lambda model, _: model.request(messages, model_settings, model_request_parameters),
+            streamed=False,
+        )
+        return attempt.task.result()
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Optional[ModelSettings],
+        model_request_parameters: ModelRequestParameters,
+    ) -> AsyncIterator[StreamedResponse]:
+        async def open_stream(model: Model, attempt: _Attempt) -> None:
+            # The stream is entered and exited by the attempt's own task, which holds it open until it is consumed
+            async with model.request_stream(messages, model_settings, model_request_parameters) as response_stream:
+                attempt.opened.set_result(response_stream)
+                await attempt.release.wait()
+
+        tier = classify_turn(messages)
+        attempt = await self._race(tier, open_stream, streamed=True)
+        try:
+            yield attempt.opened.result()
+        finally:
+            attempt.release.set()
+            await attempt.task
+
+    async def _race(self, tier: str, start: _AttemptFunction, streamed: bool) -> _Attempt:
+        """
+        Helper function running a request on the models of a tier until one succeeds, hedging and failing over as
+        needed, and returning the winning attempt. Raises FallbackExceptionGroup if every model fails.
+        """
+        candidates = self._candidates(tier)
+        attempts: Dict[asyncio.Future, _Attempt] = {}
+        errors: List[Exception] = []
+
+        def launch() -> None:
+            model = candidates.pop(0)
+            attempt = _Attempt(model, streamed)
+            attempt.task = asyncio.create_task(self._run_attempt(start, model, attempt))
+            attempts[attempt.waiter] = attempt
+
+        launch()
+        try:
+            while attempts:
+                # Only hedge once per request, so a slow provider at most doubles the load
+                can_hedge = candidates and len(attempts) == 1 and not errors
+                timeout = None
+                if can_hedge:
+                    primary = next(iter(attempts.values()))
+                    elapsed = time.perf_counter() - primary.started_at
+                    timeout = max(self.hedge_delay(primary.model, streamed) - elapsed, 0)
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    telemetry.record_model_hedge(tier, primary.model.model_name)
+                    launch()
+                    continue
+
+                for waiter in done:
+                    attempt = attempts.pop(waiter)
+                    error = waiter.exception()
+                    if error is None:
+                        latency = time.perf_counter() - attempt.started_at
+                        self._latency_tracker(attempt.model, streamed).record(latency)
+                        telemetry.record_model_request(tier, attempt.model.model_name, latency * 1000)
+                        return attempt
+                    if not self.should_fail_over(error):
+                        raise error
+
+                    errors.append(error)
+                    self._unhealthy_until[attempt.model.model_name] = time.monotonic() + self.cooldown_seconds
+                    telemetry.record_model_failover(tier, attempt.model.model_name)
+                    logfire.warning(
+                        "Model {model_name} failed, failing over: {error}",
+                        model_name=attempt.model.model_name,
+                        tier=tier,
+                        error=str(error),
+                    )
+                if not attempts and candidates:
+                    launch()
+            raise FallbackExceptionGroup(f"Every model of the {tier} tier failed", errors)
+        finally:
+            # Cancel the attempts that lost the race, or all of them if the request itself is cancelled
+            for attempt in attempts.values():
+                attempt.task.cancel()
+            await asyncio.gather(*(attempt.task for attempt in attempts.values()), return_exceptions=True)
+
+    @staticmethod
+    async def _run_attempt(start: _AttemptFunction, model: Model, attempt: _Attempt) -> Any:
+        """Helper function running an attempt. Streamed attempts report failures to open through opened instead."""
+        if not attempt.streamed:
+            return await start(model, attempt)
+
+        try:
+            await start(model, attempt)
+        except asyncio.CancelledError:
+            attempt.opened.cancel()
+            raise
+        except Exception as e:
+            if attempt.opened.done():
+                # The stream failed while being consumed, which the consumer sees when the attempt is awaited
+                raise
+            attempt.opened.set_exception(e)
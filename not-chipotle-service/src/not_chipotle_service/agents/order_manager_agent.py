@@ -1,33 +1,110 @@
-from dataclasses import dataclass
+import asyncio
+import functools
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional, TypeVar
 
-from dotenv import load_dotenv
 import not_chipotle_service.order.cart_operations as cart_ops
-from not_chipotle_service.order.models import Cart, Menu
+from not_chipotle_service.order.compact_cart import CompactCart
+from not_chipotle_service.order.inventory import InventoryIndex, StoreStock
+from not_chipotle_service.order.menu_index import MenuIndex
+from not_chipotle_service.order.menu_render import COMPACT_MENU_LEGEND, get_compact_menu
+from not_chipotle_service.order.models import AddEntreeOperation, Cart, CartOperation, CartOperationsResult, EntreeSpec, Menu
+from not_chipotle_service.telemetry import instrument_tool, record_validation_failure
 from pydantic_ai import Agent, RunContext
 
 
-# Load environment variables from .env file
-load_dotenv()
-
 @dataclass
 class OrderManagerAgentDeps:
-    cart: Cart
-    menu: Menu
+    cart: CompactCart
+    menu_index: MenuIndex
+    # Puts the compact menu in the system prompt, so providers can cache it as part of the prompt prefix
+    menu_in_system_prompt: bool = False
+    # Serializes the cart mutating tools of a turn, in the order the model called them
+    cart_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Snapshot of the cart served to read-only tools, dropped whenever a tool changes the cart
+    cart_snapshot: Optional[Cart] = None
+    # Stock of every store, looked up on each tool call so items running out mid-turn can't be added anymore
+    inventory: Optional[InventoryIndex] = None
+
+    @property
+    def menu(self) -> Menu:
+        return self.menu_index.menu
+
+    @property
+    def stock(self) -> Optional[StoreStock]:
+        return self.inventory.get(self.cart.store_id) if self.inventory is not None else None
+
+    def get_cart_snapshot(self) -> Cart:
+        """Returns a snapshot of the cart, taking a new one only if the cart changed since the last one."""
+        if self.cart_snapshot is None:
+            self.cart_snapshot = self.cart.to_model()
+        return self.cart_snapshot
+
+# Prompt used to open every conversation, the agent's reply is shown to the user as the first message
+GREETING_PROMPT = "Greet the user and ask what you could start them off with today. Your response to this will be shown to the user as the first message in the chat."
+
+# Tools that can change the cart, streamed turns push the cart to the client after each of them returns
+CART_MUTATING_TOOLS = frozenset(
+    {
+        "add_item_to_cart",
+        "remove_item_from_cart",
+        "add_topping_to_entree",
+        "remove_topping_from_entree",
+        "set_entree_protein",
+        "build_entree",
+        "update_cart",
+    }
+)
+
+# Tools that only read the menu or the cart. They take no lock and are served from snapshots, so the read-only calls
+# of a model response run concurrently, alongside its mutations.
+READ_ONLY_TOOLS = frozenset({"view_menu", "view_cart"})
+
+# Tools whose results only depend on the menu, turns calling no other tool can be answered from the response cache
+MENU_ONLY_TOOLS = frozenset({"view_menu"})
 
+ToolFunction = TypeVar("ToolFunction", bound=Callable[..., Awaitable])
+
+
+def mutates_cart(function: ToolFunction) -> ToolFunction:
+    """
+    Wraps a cart mutating tool so it holds the cart lock of its turn, and drops the cart snapshot once it changed the
+    cart. Tool calls of a model response start in order, and the lock is first come first served, so mutations apply
+    in the order the model called them even once tools await I/O. Apply it below instrument_tool.
+    """
+    if function.__name__ not in CART_MUTATING_TOOLS:
+        raise ValueError(f"Tool {function.__name__} mutates the cart but isn't listed in CART_MUTATING_TOOLS.")
+
+    @functools.wraps(function)
+    async def serialized(ctx: RunContext[OrderManagerAgentDeps], *args, **kwargs):
+        async with ctx.deps.cart_lock:
+            try:
+                return await function(ctx, *args, **kwargs)
+            finally:
+                ctx.deps.cart_snapshot = None
+
+    return serialized
+
+
+# Tools are async so they run on the event loop rather than in executor threads. The tool calls of a model response
+# run as concurrent tasks: read-only tools run freely, while cart mutating tools are serialized by mutates_cart.
 order_manager_agent = Agent(
     model="google-gla:gemini-2.0-flash",
+    # The provider SDK is only imported when the agent first runs, so importing this module stays cheap and doesn't
+    # need an API key
+    defer_model_check=True,
     deps_type=OrderManagerAgentDeps,
     system_prompt="""
     You are a helpful assistant for managing the construction of a Chipotle order.
     Your task is to assist the user in building their order by interacting with the menu and the shopping cart.
     You will help the user navigate through the menu, select items, and customize their order.
     You can add items to the cart, modify them, and finalize the order.
-    Make sure to familiarize yourself with the menu items and their options by using the view_menu tool at the start of the conversation.
 
     Here are some guidelines to follow:
     - Greet the user and ask what they would like to order.
     - Assist the user in selecting items from the menu, including entrees, sides, and drinks.
     - Guide the user through the customization process for entrees (1. selecting protein, 2. rice, 3. beans, 4. other toppings).
+    - Once you know how the user wants an entree, add it fully configured with a single build_entree call, and apply several changes at once with update_cart.
     - Provide options for sides and drinks once the user has selected their entree(s).
     - Keep track of the items in the cart and provide updates on the current order.
     - If the user wants to remove an item or make changes to their order, assist them with that as well.
@@ -44,96 +121,147 @@ order_manager_agent = Agent(
     """
 )
 
+@order_manager_agent.system_prompt(dynamic=True)
+def menu_system_prompt(ctx: RunContext[OrderManagerAgentDeps]) -> str:
+    """Either embeds the compact menu or tells the agent to fetch it, re-evaluated every run to follow menu updates."""
+
+    if ctx.deps.menu_in_system_prompt:
+        compact_menu = get_compact_menu(ctx.deps.menu_index, ctx.deps.stock)
+        return f"Here is the menu. {COMPACT_MENU_LEGEND}\n{compact_menu.text()}"
+
+    return "Make sure to familiarize yourself with the menu items and their options by using the view_menu tool at the start of the conversation."
+
 @order_manager_agent.tool
-def view_menu(ctx: RunContext[OrderManagerAgentDeps]) -> Menu:
-    """View the menu items available for ordering."""
+@instrument_tool
+async def view_menu(ctx: RunContext[OrderManagerAgentDeps], category: Optional[str] = None) -> str:
+    """View the menu items available for ordering, optionally only one category ('entrees', 'proteins', 'toppings', 'sides' or 'drinks').
+
+    Compact menu keys: v = menu version, id = menu_item_id, n = name, p = price (base price for entrees, price added to the entree for proteins and toppings), d = description, cfg = allowed special configurations. Items out of stock are left out.
+    """
     
-    menu = ctx.deps.menu
+    # Cached per menu version and stock state, so it is only rendered again once the store's stock changes
+    compact_menu = get_compact_menu(ctx.deps.menu_index, ctx.deps.stock)
     
-    return menu
+    try:
+        return compact_menu.text(category)
+    except KeyError:
+        return f"Unknown menu category '{category}'. Must be 'entrees', 'proteins', 'toppings', 'sides' or 'drinks'."
 
 @order_manager_agent.tool
-def view_cart(ctx: RunContext[OrderManagerAgentDeps]) -> Cart:
+@instrument_tool
+async def view_cart(ctx: RunContext[OrderManagerAgentDeps]) -> Cart:
     """View the current items in the cart."""
     
-    cart = ctx.deps.cart
-    
-    return cart
+    return ctx.deps.get_cart_snapshot()
 
 @order_manager_agent.tool
-def add_item_to_cart(ctx: RunContext[OrderManagerAgentDeps], item_type: str, menu_item_id: str) -> str:
+@instrument_tool
+@mutates_cart
+async def add_item_to_cart(ctx: RunContext[OrderManagerAgentDeps], item_type: str, menu_item_id: str) -> str:
     """Add an item to the cart."""
 
-    index = cart_ops.add_item_to_cart(ctx.deps.cart, ctx.deps.menu, item_type, menu_item_id)
-    
-    print(f"[ DEBUG ] Added {item_type} with ID {menu_item_id} to the cart at index {index}.")
-
-    # Return a confirmation message
-    return f"Added {item_type} with ID {menu_item_id} to the cart at index {index}."
+    try:
+        item_id = cart_ops.add_item_to_cart(ctx.deps.cart, ctx.deps.menu_index, item_type, menu_item_id, ctx.deps.stock)
+        # Return a confirmation message
+        return f"Added {item_type} with ID {menu_item_id} to the cart as item {item_id}. Cart total: ${ctx.deps.cart.total_price:.2f}"
+    except ValueError as e:
+        # Items running out mid-shift make this an expected answer, e.g. the drink the customer asked for is out of stock
+        record_validation_failure("add_item_to_cart", str(e))
+        return str(e)
 
 @order_manager_agent.tool
-def remove_item_from_cart(ctx: RunContext[OrderManagerAgentDeps], item_index: int) -> str:
-    """Remove an item from the cart based on its index."""
-    
-    cart_ops.remove_item_from_cart(ctx.deps.cart, item_index)
+@instrument_tool
+@mutates_cart
+async def remove_item_from_cart(ctx: RunContext[OrderManagerAgentDeps], item_id: int) -> str:
+    """Remove an item from the cart based on its item ID."""
     
-    print(f"[ DEBUG ] Removed item at index {item_index} from the cart.")
-
-    # Return a confirmation message
-    return f"Removed item at index {item_index} from the cart."
+    try:
+        cart_ops.remove_item_from_cart(ctx.deps.cart, ctx.deps.menu_index, item_id)
+        # Return a confirmation message
+        return f"Removed item {item_id} from the cart. Cart total: ${ctx.deps.cart.total_price:.2f}"
+    except ValueError as e:
+        record_validation_failure("remove_item_from_cart", str(e))
+        return str(e)
 
 @order_manager_agent.tool
-def add_topping_to_entree(ctx: RunContext[OrderManagerAgentDeps], item_index: int, topping_id: str) -> str:
-    """Add a topping to an entree in the cart based on its index."""
+@instrument_tool
+@mutates_cart
+async def add_topping_to_entree(ctx: RunContext[OrderManagerAgentDeps], item_id: int, topping_id: str) -> str:
+    """Add a topping to an entree in the cart based on its item ID."""
     
     try:
-        cart_ops.add_topping_to_entree(ctx.deps.cart, ctx.deps.menu, item_index, topping_id)
-        print(f"[ DEBUG ] Added topping with ID {topping_id} to entree at index {item_index}.")
-        
+        cart_ops.add_topping_to_entree(ctx.deps.cart, ctx.deps.menu_index, item_id, topping_id, ctx.deps.stock)
         # Return a confirmation message
-        return f"Added topping with ID {topping_id} to entree at index {item_index}."
+        return f"Added topping with ID {topping_id} to entree {item_id}. Cart total: ${ctx.deps.cart.total_price:.2f}"
     except ValueError as e:
-        print(f"[ DEBUG ] Error adding topping: {str(e)}")
+        record_validation_failure("add_topping_to_entree", str(e))
         return str(e)
     
 @order_manager_agent.tool
-def remove_topping_from_entree(ctx: RunContext[OrderManagerAgentDeps], item_index: int, topping_id: str) -> str:
-    """Remove a topping from an entree in the cart based on its index."""
+@instrument_tool
+@mutates_cart
+async def remove_topping_from_entree(ctx: RunContext[OrderManagerAgentDeps], item_id: int, topping_id: str) -> str:
+    """Remove a topping from an entree in the cart based on its item ID."""
     
     try:
-        cart_ops.remove_topping_from_entree(ctx.deps.cart, item_index, topping_id)
-        print(f"[ DEBUG ] Removed topping with ID {topping_id} from entree at index {item_index}.")
-        
+        cart_ops.remove_topping_from_entree(ctx.deps.cart, ctx.deps.menu_index, item_id, topping_id)
         # Return a confirmation message
-        return f"Removed topping with ID {topping_id} from entree at index {item_index}."
+        return f"Removed topping with ID {topping_id} from entree {item_id}. Cart total: ${ctx.deps.cart.total_price:.2f}"
     except ValueError as e:
-        print(f"[ DEBUG ] Error removing topping: {str(e)}")
+        record_validation_failure("remove_topping_from_entree", str(e))
         return str(e)
     
 @order_manager_agent.tool
-def set_entree_protein(ctx: RunContext[OrderManagerAgentDeps], item_index: int, new_protein_id: str) -> str:
-    """Set the protein for an entree in the cart based on its index."""
+@instrument_tool
+@mutates_cart
+async def set_entree_protein(ctx: RunContext[OrderManagerAgentDeps], item_id: int, new_protein_id: str) -> str:
+    """Set the protein for an entree in the cart based on its item ID."""
     
     try:
-        index = cart_ops.set_entree_protein(ctx.deps.cart, ctx.deps.menu, item_index, new_protein_id)
-        print(f"[ DEBUG ] Set protein with ID {new_protein_id} for entree at index {item_index}.")
-        
+        item_id = cart_ops.set_entree_protein(ctx.deps.cart, ctx.deps.menu_index, item_id, new_protein_id, ctx.deps.stock)
         # Return a confirmation message
-        return f"Set protein with ID {new_protein_id} for entree at index {index}."
+        return f"Set protein with ID {new_protein_id} for entree {item_id}. Cart total: ${ctx.deps.cart.total_price:.2f}"
     except ValueError as e:
-        print(f"[ DEBUG ] Error setting protein: {str(e)}")
+        record_validation_failure("set_entree_protein", str(e))
         return str(e)
     
+@order_manager_agent.tool
+@instrument_tool
+@mutates_cart
+async def build_entree(ctx: RunContext[OrderManagerAgentDeps], entree: EntreeSpec) -> CartOperationsResult:
+    """Add a fully configured entree (protein(s), toppings and special configurations) to the cart in one step. Nothing is added if any option is invalid."""
+    
+    result = cart_ops.apply_cart_operations(
+        ctx.deps.cart, ctx.deps.menu_index, [AddEntreeOperation(entree=entree)], ctx.deps.stock
+    )
+    
+    if not result.applied:
+        record_validation_failure("build_entree", " ".join(result.errors))
+    
+    return result
+
+@order_manager_agent.tool
+@instrument_tool
+@mutates_cart
+async def update_cart(ctx: RunContext[OrderManagerAgentDeps], operations: List[CartOperation]) -> CartOperationsResult:
+    """Apply several changes to the cart in order, all together or not at all. Items are referred to by their item IDs, which never change."""
+    
+    result = cart_ops.apply_cart_operations(ctx.deps.cart, ctx.deps.menu_index, operations, ctx.deps.stock)
+    
+    if not result.applied:
+        record_validation_failure("update_cart", " ".join(result.errors))
+    
+    return result
+    
 # @order_manager_agent.tool
-# def set_entree_special_configurations(ctx: RunContext[OrderManagerAgentDeps], item_index: int, special_configurations: dict) -> str:
-#     """Set special configurations for an entree in the cart based on its index."""
+# @instrument_tool
+# async def set_entree_special_configurations(ctx: RunContext[OrderManagerAgentDeps], item_id: int, special_configurations: dict) -> str:
+#     """Set special configurations for an entree in the cart based on its item ID."""
     
 #     try:
-#         index = cart_ops.set_entree_special_configurations(ctx.deps.cart, ctx.deps.menu, item_index, special_configurations)
-#         print(f"[ DEBUG ] Set special configurations for entree at index {item_index}: {special_configurations}.")
-        
+#         item_id = cart_ops.set_entree_special_configurations(ctx.deps.cart, ctx.deps.menu_index, item_id, special_configurations)
 #         # Return a confirmation message
-#         return f"Set special configurations for entree at index {index}: {special_configurations}."
+#         return f"Set special configurations for entree {item_id}: {special_configurations}."
 #     except ValueError as e:
-#         print(f"[ DEBUG ] Error setting special configurations: {str(e)}")
+#         record_validation_failure("set_entree_special_configurations", str(e))
 #         return str(e)
\ No newline at end of file
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional, Sequence, Tuple
+
+import not_chipotle_service.telemetry as telemetry
+from not_chipotle_service.agents.fast_path import ADD_VERBS, REMOVE_VERBS
+from not_chipotle_service.agents.order_manager_agent import MENU_ONLY_TOOLS
+from not_chipotle_service.order.menu_index import normalize_term
+from pydantic_ai.messages import ModelMessage, ModelResponse, ToolCallPart
+
+
+# First words of the questions about the menu whose answers are cached
+QUESTION_WORDS = frozenset(
+    {"any", "are", "can", "could", "do", "does", "how", "is", "what", "what's", "whats", "which"}
+)
+
+# Words tying a prompt to the conversation or the cart, their answers can't be reused for another customer
+CONTEXT_WORDS = frozenset(
+    {
+        "cart", "he", "her", "him", "i", "i'd", "i'll", "i'm", "id", "it", "it's", "item", "items", "its", "me",
+        "mine", "my", "order", "ordered", "our", "she", "that", "that's", "their", "them", "these", "they", "this",
+        "those", "total", "us", "we",
+    }
+) | ADD_VERBS | REMOVE_VERBS
+
+
+def normalize_prompt(prompt: str) -> Optional[str]:
+    """
+    Returns the cache key of a user prompt, or None if its answer can't be cached. Only standalone questions are
+    cached, e.g. 'What proteins do you have?' or 'how much is guac', not 'is it vegan' or 'what's in my cart'.
+    """
+    normalized = normalize_term(prompt)
+    words = normalized.split()
+    if not words or words[0] not in QUESTION_WORDS or any(word in CONTEXT_WORDS for word in words):
+        return None
+    return normalized
+
+
+def is_cacheable_turn(new_messages: Sequence[ModelMessage]) -> bool:
+    """Returns whether a turn only looked at the menu, so its reply doesn't depend on the cart."""
+    return all(
+        part.tool_name in MENU_ONLY_TOOLS
+        for message in new_messages
+        if isinstance(message, ModelResponse)
+        for part in message.parts
+        if isinstance(part, ToolCallPart)
+    )
+
+
+@dataclass(frozen=True)
+class _CachedReply:
+    reply: str
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    Replies of the agent to menu questions, keyed on the menu version and the normalized question, so repeated
+    questions are answered without running the agent. Only replies of turns that didn't touch the cart are cached.
+    Entries expire after ttl_seconds, the least recently used ones are evicted beyond max_entries, and the entries of
+    a menu version are dropped when the menu is reloaded with a new one. Versions of menus filtered by a store's stock
+    (see StoreStock.menu_version) are '<menu version>-<stock version>', and are dropped along with their menu version.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if max_entries <= 0:
+            raise ValueError(f"max_entries must be positive, got {max_entries}.")
+        if ttl_seconds <= 0:
+            raise ValueError(f"ttl_seconds must be positive, got {ttl_seconds}.")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Tuple[str, str], _CachedReply] = OrderedDict()
+
+        # Menu reloads invalidate entries from worker threads while the event loop reads them
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups of cacheable prompts answered from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, menu_version: str, prompt: str) -> Optional[str]:
+        """Returns the cached reply to a prompt under a menu version, or None."""
+        key = normalize_prompt(prompt)
+        if key is None:
+            return None
+
+        with self._lock:
+            cached = self._entries.get((menu_version, key))
+            if cached is not None and cached.expires_at <= self.clock():
+                del self._entries[(menu_version, key)]
+                cached = None
+            if cached is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end((menu_version, key))
+                self.hits += 1
+
+        telemetry.record_response_cache_lookup(cached is not None)
+        return cached.reply if cached is not None else None
+
+    def put(self, menu_version: str, prompt: str, reply: str) -> bool:
+        """Caches the reply to a prompt under a menu version, returning whether the prompt is cacheable."""
+        key = normalize_prompt(prompt)
+        if key is None:
+            return False
+
+        with self._lock:
+            self._entries[(menu_version, key)] = _CachedReply(reply=reply, expires_at=self.clock() + self.ttl_seconds)
+            self._entries.move_to_end((menu_version, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def invalidate(self, menu_version: str) -> int:
+        """Drops the replies cached under a menu version and its filtered versions, returning how many were dropped."""
+        filtered_prefix = f"{menu_version}-"
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == menu_version or key[0].startswith(filtered_prefix)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """Drops every cached reply."""
+        with self._lock:
+            self._entries.clear()
@@ -1,68 +1,117 @@
+import argparse
 import asyncio
-import logfire
-from not_chipotle_service.agents.order_manager_agent import (
-    OrderManagerAgentDeps,
-    order_manager_agent,
-)
-from not_chipotle_service.order.models import Cart
-import not_chipotle_service.order.cart_operations as cart_ops
-import not_chipotle_service.order.utils as order_utils
-from pydantic_ai.messages import ModelMessage
+import os
+from typing import TYPE_CHECKING
+
 from dotenv import load_dotenv
 
+# The entry points import the rest of the service lazily, so each only pays for the modules it uses
+if TYPE_CHECKING:
+    from not_chipotle_service.session.manager import SessionManager
+    from not_chipotle_service.session.models import Session
+    from not_chipotle_service.voice.recognizer import StreamingRecognizer
+
 
-# Load environment variables from .env file
-load_dotenv()
+async def print_streamed_reply(session_manager: "SessionManager", session: "Session", user_input: str) -> None:
+    """Prints the agent's reply as it is generated, noting every change the agent makes to the cart along the way."""
+    from not_chipotle_service.session.events import CartUpdatedEvent, TextDeltaEvent
 
-logfire.configure()
+    print("Gemini: ", end="", flush=True)
+    async for event in session_manager.stream_message(session, user_input):
+        if isinstance(event, TextDeltaEvent):
+            print(event.text, end="", flush=True)
+        elif isinstance(event, CartUpdatedEvent):
+            print(f"\n🛒 Cart updated ({len(event.cart.items)} items, ${event.cart.total_price:.2f})", flush=True)
+    print()
 
 
 async def main():
     """Enables users to chat with Gemini 2.0 Flash in the terminal, keeping full chat history."""
+    import not_chipotle_service.order.cart_operations as cart_ops
+    from not_chipotle_service.agents.model_router import ModelRouter, close_http_clients
+    from not_chipotle_service.agents.order_manager_agent import GREETING_PROMPT
+    from not_chipotle_service.order.inventory import InventoryIndex
+    from not_chipotle_service.order.menu_registry import MenuRegistry
+    from not_chipotle_service.session.manager import SessionManager
 
-    # Load the menu and initialize the cart
-    menu, menu_items_dict = order_utils.load_menu()
-    cart = Cart(cart_id="user_cart_123")
+    # Initialize the session holding the cart and chat history, menus are loaded on first use and hot reloaded
+    session_manager = SessionManager(MenuRegistry(), model=ModelRouter.from_env(), inventory=InventoryIndex.from_env())
+    session = await session_manager.create_session(session_id="user_cart_123")
 
     print("Welcome to the Gemini 2.0 Flash Chatbot!")
     print("Type 'exit' to end the chat.\n")
 
-    chat_history: list[ModelMessage] = []
-
     # Initialize the chat with a greeting message from the agent
-    result = await order_manager_agent.run(
-        user_prompt="Greet the user and ask what you could start them off with today. Your response to this will be shown to the user as the first message in the chat.",
-        message_history=chat_history,
-        deps=OrderManagerAgentDeps(cart=cart, menu=menu),
-    )
-    chat_history.extend(result.new_messages())
-    print(f"\n\nGemini: {result.data}\n")
+    print("\n")
+    await print_streamed_reply(session_manager, session, GREETING_PROMPT)
+    print()
 
     while True:
-        user_input = input("You: ")
+        # Read input in a worker thread so the event loop is never blocked
+        user_input = await asyncio.to_thread(input, "You: ")
         print()
 
         if user_input.lower() == "exit":
             print("Goodbye!")
             break
 
-        result = await order_manager_agent.run(
-            user_prompt=user_input,
-            message_history=chat_history,
-            deps=OrderManagerAgentDeps(cart=cart, menu=menu),
-        )
-        chat_history.extend(result.new_messages())
-        print(f"Gemini: {result.data}")
+        await print_streamed_reply(session_manager, session, user_input)
 
         # Print the current state of the cart after each interaction
         print("Current Cart:")
-        cart_ops.print_cart(cart, menu_items_dict)
+        cart_ops.print_cart(session.cart, session.menu_index)
         print("\n")
 
+    await session_manager.close()
+    await close_http_clients()
+
+
+async def voice_main(audio_path: str, recognizer: "StreamingRecognizer", realtime: bool = True) -> None:
+    """Holds a voice conversation from an audio file, printing what is heard and the agent's replies."""
+    from not_chipotle_service.agents.model_router import ModelRouter, close_http_clients
+    from not_chipotle_service.order.inventory import InventoryIndex
+    from not_chipotle_service.order.menu_registry import MenuRegistry
+    from not_chipotle_service.session.events import CartUpdatedEvent, TextDeltaEvent, TurnCompletedEvent
+    from not_chipotle_service.session.manager import SessionManager
+    from not_chipotle_service.voice.events import MenuHintEvent, TranscriptEvent
+    from not_chipotle_service.voice.pipeline import VoicePipeline
+    from not_chipotle_service.voice.sources import read_audio_file
+
+    session_manager = SessionManager(MenuRegistry(), model=ModelRouter.from_env(), inventory=InventoryIndex.from_env())
+    session = await session_manager.create_session()
+    pipeline = VoicePipeline(session_manager, recognizer)
+
+    async for event in pipeline.run(session, read_audio_file(audio_path, realtime=realtime)):
+        if isinstance(event, TranscriptEvent):
+            # Partial transcripts overwrite each other on the same line
+            print(f"\r🎤 {event.text}", end="\n" if event.is_final else "", flush=True)
+        elif isinstance(event, MenuHintEvent):
+            print(f"\n💡 Heard {event.name} ({event.item_type})", flush=True)
+        elif isinstance(event, TextDeltaEvent):
+            print(event.text, end="", flush=True)
+        elif isinstance(event, CartUpdatedEvent):
+            print(f"\n🛒 Cart updated ({len(event.cart.items)} items, ${event.cart.total_price:.2f})", flush=True)
+        elif isinstance(event, TurnCompletedEvent):
+            print("\n")
+
+    await recognizer.close()
+    await session_manager.close()
+    await close_http_clients()
+
+
+def _configure() -> None:
+    """Helper function loading the .env file and setting up telemetry, done by each entry point rather than on import."""
+    import not_chipotle_service.telemetry as telemetry
+
+    # Load environment variables from .env file
+    load_dotenv()
+    telemetry.configure()
+
 
 def run():
     """Entry point for the NotChipotle service."""
     print("Invoking the NotChipotle service via run()...")
+    _configure()
 
     try:
         asyncio.run(main())
@@ -70,6 +119,54 @@ def run():
         print(f"An error occurred: {e}")
 
 
+def serve():
+    """Entry point for the NotChipotle HTTP/WebSocket server. The app configures telemetry when it starts up."""
+    import uvicorn
+
+    # Load environment variables from .env file
+    load_dotenv()
+    host = os.getenv("NOT_CHIPOTLE_HOST", "127.0.0.1")
+    port = int(os.getenv("NOT_CHIPOTLE_PORT", "8000"))
+    print(f"Serving the NotChipotle service on http://{host}:{port}...")
+
+    uvicorn.run("not_chipotle_service.server.app:create_app", factory=True, host=host, port=port)
+
+
+def run_voice():
+    """
+    Entry point holding a voice conversation from a WAV or raw PCM file.
+    No speech recognizer ships with the service: pass one as '<module>:<callable>', or the utterances of the file to
+    the scripted recognizer, one per line.
+    """
+    from not_chipotle_service.voice.recognizer import ScriptedRecognizer, load_recognizer_factory
+
+    parser = argparse.ArgumentParser(prog="not-chipotle-voice", description=run_voice.__doc__)
+    parser.add_argument("audio", help="16 kHz 16-bit mono PCM audio, as a WAV file or raw")
+    recognizers = parser.add_mutually_exclusive_group(required=True)
+    recognizers.add_argument("--recognizer", help="speech recognizer factory as '<module>:<callable>'")
+    recognizers.add_argument("--script", help="text file of the utterances of the audio, for the scripted recognizer")
+    parser.add_argument("--fast", action="store_true", help="read the audio as fast as possible, not in real time")
+    args = parser.parse_args()
+    _configure()
+
+    if args.recognizer:
+        recognizer = load_recognizer_factory(args.recognizer)()
+    else:
+        with open(args.script, "r") as f:
+            recognizer = ScriptedRecognizer([line.strip() for line in f if line.strip()])
+    asyncio.run(voice_main(args.audio, recognizer, realtime=not args.fast))
+
+
+def build_menus():
+    """Entry point validating every menu of the config directory into a snapshot that loads without validation."""
+    from not_chipotle_service.order.utils import MENU_CONFIG_DIR, build_menu_snapshots
+
+    load_dotenv()
+    for snapshot_path in build_menu_snapshots(os.getenv("NOT_CHIPOTLE_MENU_DIR", MENU_CONFIG_DIR)):
+        print(f"Wrote {snapshot_path}")
+
+
 if __name__ == "__main__":
     print("Invoking the NotChipotle service via __main__...")
+    _configure()
     asyncio.run(main())
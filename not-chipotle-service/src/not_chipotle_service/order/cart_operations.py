@@ -1,185 +1,421 @@
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterable, List, Sequence
+from not_chipotle_service.order.compact_cart import CompactCart, CompactCartItem, intern_id
+from not_chipotle_service.order.inventory import DOUBLE_PROTEIN_PREFIX, StoreStock
+from not_chipotle_service.order.menu_index import MenuIndex
+from not_chipotle_service.order.pricing import adjust_cart_total, price_cart_item, price_known_items
 from not_chipotle_service.order.models import (
-    Cart,
-    Menu,
-    CartEntree,
-    CartSide,
-    CartDrink,
-    MenuItem,
+    AddEntreeOperation,
+    AddItemOperation,
+    AddToppingOperation,
+    CartOperation,
+    CartOperationsResult,
+    EntreeSpec,
+    RemoveItemOperation,
+    RemoveToppingOperation,
+    SetProteinOperation,
+    SetSpecialConfigurationsOperation,
 )
 
 
 def _get_entree_from_cart(
-    cart: Cart, item_index: int
-) -> Optional[CartEntree]:
-    """Helper function to get a specific CartEntree from the cart."""
-    # Make sure a valid item_index is provided
-    if item_index < 0 or item_index >= len(cart.items):
-        return None
-
-    # Get the item at the specified index
-    cart_item = cart.items[item_index]
-
-    # Check if the item is a CartEntree
-    if isinstance(cart_item, CartEntree):
+    cart: CompactCart, item_id: int
+) -> Optional[CompactCartItem]:
+    """Helper function to get a specific entree from the cart."""
+    cart_item = cart.get(item_id)
+
+    # Check if the item is an entree
+    if cart_item is not None and cart_item.item_type == "entree":
         return cart_item
 
-    # If it's not an entree, return None
+    # If there is no such item or it's not an entree, return None
     return None
 
 
+def _double_protein_topping_id(protein_id: str) -> str:
+    """Returns the ID of the topping that adds a second portion of a protein."""
+    return f"{DOUBLE_PROTEIN_PREFIX}{protein_id}"
+
+
+def _stock_errors(stock: Optional[StoreStock], item_type: str, item_ids: Iterable[str]) -> List[str]:
+    """Helper function returning an error for every item the store ran out of. Without a stock, everything is served."""
+    if stock is None:
+        return []
+    return [
+        f"{item_type.capitalize()} with ID '{item_id}' is out of stock."
+        for item_id in item_ids
+        if not stock.is_available(item_type, item_id)
+    ]
+
+
+def _validate_special_configurations(
+    menu_index: MenuIndex, entree_id: str, special_configurations: Dict
+) -> List[str]:
+    """Helper function returning every reason the special configurations are invalid for an entree."""
+    allowed_configurations = menu_index.allowed_special_configurations(entree_id)
+    if not allowed_configurations:
+        return [f"Entree '{entree_id}' does not support special configurations"]
+
+    errors = []
+    for config_key, config_value in special_configurations.items():
+        if config_key not in allowed_configurations:
+            errors.append(f"Configuration '{config_key}' is not supported for {entree_id}")
+            continue
+
+        allowed_values = allowed_configurations[config_key]
+        if allowed_values and config_value not in allowed_values:
+            errors.append(
+                f"Invalid value '{config_value}' for configuration '{config_key}'. "
+                f"Allowed values: {', '.join(sorted(allowed_values))}"
+            )
+    return errors
+
+
 def add_item_to_cart(
-    cart: Cart,
-    menu: Menu,
+    cart: CompactCart,
+    menu_index: MenuIndex,
     item_type: str,
     menu_item_id: str,
+    stock: Optional[StoreStock] = None,
 ) -> int:
-    """Adds an item to the shopping cart based on the item type and menu item ID."""
+    """Adds an item to the shopping cart based on the item type and menu item ID, if the store has it in stock."""
     if item_type == "entree":
-        menu_item = next((item for item in menu.entrees if item.id == menu_item_id), None)
-        if menu_item:
-            cart.items.append(CartEntree(menu_item_id=menu_item_id, quantity=1))
-        else:
+        if menu_item_id not in menu_index.entrees:
             raise ValueError(f"Entree with ID '{menu_item_id}' not found in the menu.")
     elif item_type == "side":
-        menu_item = next((item for item in menu.sides if item.id == menu_item_id), None)
-        if menu_item:
-            cart.items.append(CartSide(menu_item_id=menu_item_id, quantity=1))
-        else:
+        if menu_item_id not in menu_index.sides:
             raise ValueError(f"Side with ID '{menu_item_id}' not found in the menu.")
     elif item_type == "drink":
-        menu_item = next((item for item in menu.drinks if item.id == menu_item_id), None)
-        if menu_item:
-            cart.items.append(CartDrink(menu_item_id=menu_item_id, quantity=1))
-        else:
+        if menu_item_id not in menu_index.drinks:
             raise ValueError(f"Drink with ID '{menu_item_id}' not found in the menu.")
     else:
         raise ValueError(
             f"Invalid item_type: '{item_type}'. Must be 'entree', 'side', or 'drink'."
         )
+    errors = _stock_errors(stock, item_type, [menu_item_id])
+    if errors:
+        raise ValueError(errors[0])
 
-    return cart.items.index(cart.items[-1])  # Return the index of the newly added item
+    cart_item = cart.add(item_type, menu_item_id)
+    adjust_cart_total(cart, menu_index.price_of(item_type, menu_item_id))
+    return cart_item.item_id  # Return the item ID of the newly added item
 
 
-def remove_item_from_cart(cart: Cart, item_index: int) -> None:
-    """Removes an item from the shopping cart by index."""
-    if item_index < 0 or item_index >= len(cart.items):
-        raise ValueError(f"Invalid index: {item_index}. Cannot remove item from cart.")
-    
-    removed_item = cart.items.pop(item_index)
+def remove_item_from_cart(cart: CompactCart, menu_index: MenuIndex, item_id: int) -> None:
+    """Removes an item from the shopping cart by item ID."""
+    removed_item = cart.pop(item_id)
+    if removed_item is None:
+        raise ValueError(f"Invalid item ID: {item_id}. Cannot remove item from cart.")
+
+    try:
+        adjust_cart_total(cart, -price_cart_item(menu_index, removed_item))
+    except KeyError:
+        # The item was taken off the menu since it was added, price the rest of the cart from scratch instead, which
+        # can't fail on other items taken off the menu as well
+        cart.total_price = price_known_items(menu_index, cart)
     return
 
 
-def add_topping_to_entree(cart: Cart, menu: Menu, item_index: int, topping_id: str) -> int:
-    """Adds a topping to a specific entree in the cart."""
-    # Make sure a valid item_index is provided
-    if item_index < 0 or item_index >= len(cart.items):
-        raise ValueError(f"Invalid index: {item_index}. Cannot add topping to entree.")
+def add_topping_to_entree(
+    cart: CompactCart, menu_index: MenuIndex, item_id: int, topping_id: str, stock: Optional[StoreStock] = None
+) -> int:
+    """Adds a topping to a specific entree in the cart, if the store has it in stock."""
+    # Make sure a valid item_id is provided
+    if item_id not in cart:
+        raise ValueError(f"Invalid item ID: {item_id}. Cannot add topping to entree.")
 
     # Get the entree from the cart and verify it's an entree
-    entree = _get_entree_from_cart(cart, item_index)
+    entree = _get_entree_from_cart(cart, item_id)
     if not entree:
-        raise ValueError(f"Menu item index '{item_index}' is not an entree.")
+        raise ValueError(f"Cart item '{item_id}' is not an entree.")
 
     # Check if the topping exists in the menu
-    topping_exists = any(topping.id == topping_id for topping in menu.toppings)
-    if not topping_exists:
+    if topping_id not in menu_index.toppings:
         raise ValueError(f"Topping with ID '{topping_id}' not found in the menu.")
+    errors = _stock_errors(stock, "topping", [topping_id])
+    if errors:
+        raise ValueError(errors[0])
 
     # Add the topping if it is not already present
     if topping_id not in entree.toppings:
-        entree.toppings.append(topping_id)
+        entree.toppings += (intern_id(topping_id),)
+        adjust_cart_total(cart, menu_index.price_of("topping", topping_id))
 
-    return cart.items.index(entree)
+    return item_id
 
 
-def remove_topping_from_entree(cart: Cart, item_index: int, topping_id: str) -> None:
+def remove_topping_from_entree(cart: CompactCart, menu_index: MenuIndex, item_id: int, topping_id: str) -> None:
     """Removes a topping from a specific entree in the cart."""
-    entree = _get_entree_from_cart(cart, item_index)
+    entree = _get_entree_from_cart(cart, item_id)
     if not entree:
-        raise ValueError(f"Menu item index '{item_index}' is not an entree.")
+        raise ValueError(f"Cart item '{item_id}' is not an entree.")
 
     if topping_id in entree.toppings:
-        entree.toppings.remove(topping_id)
+        entree.toppings = tuple(existing_id for existing_id in entree.toppings if existing_id != topping_id)
+        adjust_cart_total(cart, -menu_index.price_of("topping", topping_id))
     return
 
 
 def set_entree_protein(
-    cart: Cart,
-    menu: Menu,
-    item_index: int,
+    cart: CompactCart,
+    menu_index: MenuIndex,
+    item_id: int,
     new_protein_id: str,
+    stock: Optional[StoreStock] = None,
 ) -> int:
-    """Sets the protein of a specific entree in the cart."""
-    entree = _get_entree_from_cart(cart, item_index)
+    """Sets the protein of a specific entree in the cart, if the store has it in stock."""
+    entree = _get_entree_from_cart(cart, item_id)
     if not entree:
-        raise ValueError(f"Menu item index '{item_index}' is not an entree.")
+        raise ValueError(f"Cart item '{item_id}' is not an entree.")
 
-    protein_exists = any(protein.id == new_protein_id for protein in menu.proteins)
-    if not protein_exists:
+    if new_protein_id not in menu_index.proteins:
         raise ValueError(f"Protein with ID '{new_protein_id}' not found in the menu.")
-    entree.protein_id = new_protein_id
+    errors = _stock_errors(stock, "protein", [new_protein_id])
+    if errors:
+        raise ValueError(errors[0])
+    old_price = menu_index.price_of("protein", entree.protein_id) if entree.protein_id else 0.0
+    entree.protein_id = intern_id(new_protein_id)
+    adjust_cart_total(cart, menu_index.price_of("protein", new_protein_id) - old_price)
 
-    return cart.items.index(entree)  # Return the index of the entree after setting the protein
+    return item_id  # Return the item ID of the entree after setting the protein
 
 
 def set_entree_special_configurations(
-    cart: Cart,
-    menu: Menu,
-    item_index: int,
+    cart: CompactCart,
+    menu_index: MenuIndex,
+    item_id: int,
     special_configurations: Dict,
 ) -> int:
     """Configures the special configurations for a specific entree in the cart."""
-    entree = _get_entree_from_cart(cart, item_index)
+    entree = _get_entree_from_cart(cart, item_id)
     if not entree:
-        raise ValueError(f"Menu item index '{item_index}' is not an entree.")
-
-    # Get the menu item to check its allowed special configurations
-    menu_item = next((item for item in menu.entrees if item.id == entree.menu_item_id), None)
-    if not menu_item or not menu_item.special_configurations:
-        raise ValueError(f"Entree '{entree.menu_item_id}' does not support special configurations")
-    
-    # Validate each provided configuration
-    for config_key, config_value in special_configurations.items():
-        # Check if this configuration type is allowed for this entree
-        if config_key not in menu_item.special_configurations:
-            raise ValueError(f"Configuration '{config_key}' is not supported for {entree.menu_item_id}")
-        
-        # Check if the value is in the allowed values for this configuration
-        allowed_values = menu_item.special_configurations.get(config_key)
-        if allowed_values and config_value not in allowed_values:
-            raise ValueError(
-                f"Invalid value '{config_value}' for configuration '{config_key}'. "
-                f"Allowed values: {', '.join(allowed_values)}"
-            )
-    
-    entree.special_configurations = special_configurations
-    return cart.items.index(entree)  # Return the index of the entree after setting special configurations
+        raise ValueError(f"Cart item '{item_id}' is not an entree.")
+
+    # Validate each provided configuration against the ones the entree allows
+    errors = _validate_special_configurations(menu_index, entree.menu_item_id, special_configurations)
+    if errors:
+        raise ValueError(errors[0])
+
+    entree.special_configurations = dict(special_configurations)
+    return item_id  # Return the item ID of the entree after setting special configurations
+
+
+def validate_entree_spec(menu_index: MenuIndex, entree: EntreeSpec, stock: Optional[StoreStock] = None) -> List[str]:
+    """Returns every reason an entree spec doesn't match the menu or the stock, or an empty list if it is valid."""
+    if entree.menu_item_id not in menu_index.entrees:
+        return [f"Entree with ID '{entree.menu_item_id}' not found in the menu."]
+
+    errors = []
+    for position, protein_id in enumerate(entree.protein_ids):
+        if protein_id not in menu_index.proteins:
+            errors.append(f"Protein with ID '{protein_id}' not found in the menu.")
+        elif position > 0 and _double_protein_topping_id(protein_id) not in menu_index.toppings:
+            errors.append(f"Protein with ID '{protein_id}' can't be added as a double protein.")
+    for topping_id in entree.toppings:
+        if topping_id not in menu_index.toppings:
+            errors.append(f"Topping with ID '{topping_id}' not found in the menu.")
+    # Items on the menu can still be out of stock
+    errors += _stock_errors(stock, "entree", [entree.menu_item_id])
+    errors += _stock_errors(stock, "protein", entree.protein_ids)
+    errors += _stock_errors(stock, "topping", entree.toppings)
+    if entree.special_configurations:
+        errors += _validate_special_configurations(menu_index, entree.menu_item_id, entree.special_configurations)
+    return errors
 
 
-def print_cart(cart: Cart, menu_items_dict: Dict[str, MenuItem]):
-    """Prints the contents of the cart in a more readable format with emojis and indexes."""
+def validate_cart(menu_index: MenuIndex, cart: CompactCart, stock: Optional[StoreStock] = None) -> List[str]:
+    """
+    Returns every reason the cart can't be ordered from the menu, e.g. items taken off the menu or out of stock since
+    they were added.
+    """
+    if not cart.items:
+        return ["The cart is empty."]
+
+    errors = []
+    for item_id, item in cart.items.items():
+        if not menu_index.has(item.item_type, item.menu_item_id):
+            errors.append(f"Item {item_id}: {item.item_type.capitalize()} with ID '{item.menu_item_id}' not found in the menu.")
+            continue
+        errors += [f"Item {item_id}: {error}" for error in _stock_errors(stock, item.item_type, [item.menu_item_id])]
+        if item.item_type != "entree":
+            continue
+        if item.protein_id and item.protein_id not in menu_index.proteins:
+            errors.append(f"Item {item_id}: Protein with ID '{item.protein_id}' not found in the menu.")
+        for topping_id in item.toppings:
+            if topping_id not in menu_index.toppings:
+                errors.append(f"Item {item_id}: Topping with ID '{topping_id}' not found in the menu.")
+        # Items on the menu can still be out of stock
+        stock_errors = _stock_errors(stock, "protein", [item.protein_id] if item.protein_id else [])
+        stock_errors += _stock_errors(stock, "topping", item.toppings)
+        errors += [f"Item {item_id}: {error}" for error in stock_errors]
+        if item.special_configurations:
+            errors += [
+                f"Item {item_id}: {error}"
+                for error in _validate_special_configurations(menu_index, item.menu_item_id, item.special_configurations)
+            ]
+    return errors
+
+
+def validate_cart_operations(
+    menu_index: MenuIndex, operations: Sequence[CartOperation], stock: Optional[StoreStock] = None
+) -> List[str]:
+    """
+    Validates operations against the menu and the stock without looking at the cart.
+    Returns every error found, prefixed with the position of the offending operation.
+    """
+    errors = []
+    for position, operation in enumerate(operations):
+        if isinstance(operation, AddEntreeOperation):
+            operation_errors = validate_entree_spec(menu_index, operation.entree, stock)
+        elif isinstance(operation, AddItemOperation) and not menu_index.has(operation.item_type, operation.menu_item_id):
+            operation_errors = [f"{operation.item_type.capitalize()} with ID '{operation.menu_item_id}' not found in the menu."]
+        elif isinstance(operation, AddItemOperation):
+            operation_errors = _stock_errors(stock, operation.item_type, [operation.menu_item_id])
+        elif isinstance(operation, AddToppingOperation) and operation.topping_id not in menu_index.toppings:
+            operation_errors = [f"Topping with ID '{operation.topping_id}' not found in the menu."]
+        elif isinstance(operation, AddToppingOperation):
+            operation_errors = _stock_errors(stock, "topping", [operation.topping_id])
+        elif isinstance(operation, SetProteinOperation) and operation.protein_id not in menu_index.proteins:
+            operation_errors = [f"Protein with ID '{operation.protein_id}' not found in the menu."]
+        elif isinstance(operation, SetProteinOperation):
+            operation_errors = _stock_errors(stock, "protein", [operation.protein_id])
+        else:
+            operation_errors = []
+        errors += [f"Operation {position} ({operation.op}): {error}" for error in operation_errors]
+    return errors
+
+
+def add_entree_to_cart(
+    cart: CompactCart, menu_index: MenuIndex, entree: EntreeSpec, stock: Optional[StoreStock] = None
+) -> List[int]:
+    """
+    Adds fully configured entrees to the cart and returns their item IDs. The spec must be valid for the menu and the
+    stock.
+    """
+    errors = validate_entree_spec(menu_index, entree, stock)
+    if errors:
+        raise ValueError(" ".join(errors))
+
+    protein_id = entree.protein_ids[0] if entree.protein_ids else None
+    toppings = [_double_protein_topping_id(protein_id) for protein_id in entree.protein_ids[1:]]
+    toppings = list(dict.fromkeys(toppings + entree.toppings))
+
+    item_ids = []
+    for _ in range(entree.quantity):
+        cart_entree = cart.add(
+            "entree",
+            entree.menu_item_id,
+            protein_id,
+            toppings,
+            dict(entree.special_configurations) if entree.special_configurations else None,
+        )
+        adjust_cart_total(cart, price_cart_item(menu_index, cart_entree))
+        item_ids.append(cart_entree.item_id)
+    return item_ids
+
+
+def _apply_cart_operation(
+    cart: CompactCart, menu_index: MenuIndex, operation: CartOperation, stock: Optional[StoreStock]
+) -> List[int]:
+    """Helper function applying a single operation and returning the item IDs of the items it affected."""
+    if isinstance(operation, AddEntreeOperation):
+        return add_entree_to_cart(cart, menu_index, operation.entree, stock)
+    if isinstance(operation, AddItemOperation):
+        return [add_item_to_cart(cart, menu_index, operation.item_type, operation.menu_item_id, stock)]
+    if isinstance(operation, RemoveItemOperation):
+        remove_item_from_cart(cart, menu_index, operation.item_id)
+        return [operation.item_id]
+    if isinstance(operation, AddToppingOperation):
+        return [add_topping_to_entree(cart, menu_index, operation.item_id, operation.topping_id, stock)]
+    if isinstance(operation, RemoveToppingOperation):
+        remove_topping_from_entree(cart, menu_index, operation.item_id, operation.topping_id)
+        return [operation.item_id]
+    if isinstance(operation, SetProteinOperation):
+        return [set_entree_protein(cart, menu_index, operation.item_id, operation.protein_id, stock)]
+    if isinstance(operation, SetSpecialConfigurationsOperation):
+        return [
+            set_entree_special_configurations(cart, menu_index, operation.item_id, operation.special_configurations)
+        ]
+    raise ValueError(f"Unsupported cart operation: {operation!r}")
+
+
+def apply_cart_operations(
+    cart: CompactCart,
+    menu_index: MenuIndex,
+    operations: Sequence[CartOperation],
+    stock: Optional[StoreStock] = None,
+) -> CartOperationsResult:
+    """
+    Applies a batch of operations in order, atomically: either every operation succeeds or the cart is left untouched.
+    Items added by the batch get their item IDs as they are added, the IDs are returned in the result. Items the
+    store ran out of, according to the stock, can't be added.
+    """
+    # Catch menu and stock errors up front, reporting all of them at once
+    errors = validate_cart_operations(menu_index, operations, stock)
+    if errors:
+        return CartOperationsResult(applied=False, errors=errors)
+
+    # Apply to a copy so an operation failing on the cart's state leaves the cart untouched
+    draft = cart.copy()
+    item_ids = []
+    for position, operation in enumerate(operations):
+        try:
+            item_ids.append(_apply_cart_operation(draft, menu_index, operation, stock))
+        except ValueError as e:
+            return CartOperationsResult(applied=False, errors=[f"Operation {position} ({operation.op}): {e}"])
+
+    cart.update_from(draft)
+    return CartOperationsResult(applied=True, item_ids=item_ids, total_price=cart.total_price)
+
+
+def print_cart(cart: CompactCart, menu_index: MenuIndex):
+    """Prints the contents of the cart in a more readable format with emojis and item IDs."""
     if not cart.items:
         print("🛒 Your cart is empty.")
         return
 
     print(f"🛒 Cart ID: {cart.cart_id}")
-    for idx, item in enumerate(cart.items):
+    for item_id, item in cart.items.items():
         item_type = item.item_type
-        menu_item = menu_items_dict.get(f"{item_type}|{item.menu_item_id}", None)
+        menu_item = menu_index.get(item_type, item.menu_item_id)
         item_name = menu_item.name if menu_item else item.menu_item_id
 
-        if isinstance(item, CartEntree):
-            print(f"  [{idx}] 🌯 Entree: {item_name}")
+        if item_type == "entree":
+            print(f"  [{item_id}] 🌯 Entree: {item_name}")
             if item.protein_id:
                 print(f"\t🐥 Protein: {item.protein_id}")
             if item.toppings:
                 print(f"\t🫘 Toppings: {', '.join(item.toppings)}")
             if item.special_configurations:
                 print(f"\t⚙️ Configurations: {item.special_configurations}")
-        elif isinstance(item, CartSide):
-            print(f"  [{idx}] 🥑 Side: {item_name}")
-        elif isinstance(item, CartDrink):
-            print(f"  [{idx}] 💧 Drink: {item_name}")
+        elif item_type == "side":
+            print(f"  [{item_id}] 🥑 Side: {item_name}")
+        elif item_type == "drink":
+            print(f"  [{item_id}] 💧 Drink: {item_name}")
         else:
-            print(f"  [{idx}] ❓ Unknown Item: {item_name}")
+            print(f"  [{item_id}] ❓ Unknown Item: {item_name}")
+    print(f"💵 Total: ${cart.total_price:.2f}")
+
+
+def summarize_cart(cart: CompactCart) -> str:
+    """Returns a compact one-line description of the cart contents, suitable for model context."""
+    if not cart.items:
+        return "The cart is empty."
+
+    descriptions = []
+    for item_id, item in cart.items.items():
+        description = f"[{item_id}] {item.item_type} {item.menu_item_id}"
+        if item.item_type == "entree":
+            details = []
+            if item.protein_id:
+                details.append(f"protein {item.protein_id}")
+            if item.toppings:
+                details.append(f"toppings {', '.join(item.toppings)}")
+            if item.special_configurations:
+                details.append(
+                    ", ".join(f"{key} {value}" for key, value in item.special_configurations.items())
+                )
+            if details:
+                description += f" ({'; '.join(details)})"
+        descriptions.append(description)
+
+    return f"{'; '.join(descriptions)}. Total ${cart.total_price:.2f}"
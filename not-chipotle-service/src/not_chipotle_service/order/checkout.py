@@ -0,0 +1,208 @@
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+
+import logfire
+import not_chipotle_service.order.cart_operations as cart_ops
+import not_chipotle_service.telemetry as telemetry
+from not_chipotle_service.order.compact_cart import CompactCart
+from not_chipotle_service.order.inventory import StoreStock
+from not_chipotle_service.order.kitchen import InMemoryTicketSink, TicketSink, create_ticket
+from not_chipotle_service.order.menu_index import MenuIndex
+from not_chipotle_service.order.models import Order
+from not_chipotle_service.order.order_store import InMemoryOrderStore, OrderStore
+from not_chipotle_service.order.pricing import price_items
+
+
+Batch = TypeVar("Batch", bound=Sequence)
+
+
+class CheckoutError(ValueError):
+    """Raised when a cart can't be turned into an order, with every reason in errors."""
+
+    def __init__(self, errors: List[str]):
+        super().__init__(" ".join(errors))
+        self.errors = errors
+
+
+def create_order(
+    cart: CompactCart,
+    menu_index: MenuIndex,
+    customer_name: Optional[str] = None,
+    stock: Optional[StoreStock] = None,
+) -> Order:
+    """
+    Validates a cart against the menu and the stock, and snapshots it into a priced Order. Raises CheckoutError if it
+    is invalid.
+    """
+    errors = cart_ops.validate_cart(menu_index, cart, stock)
+    if errors:
+        raise CheckoutError(errors)
+
+    return Order(
+        order_id=uuid.uuid4().hex,
+        cart_id=cart.cart_id,
+        # Fresh models, so later changes to the cart never reach the order
+        items=[item.to_model() for item in cart],
+        # Priced from scratch rather than trusting the running total of the cart
+        total_price=price_items(menu_index, cart),
+        customer_name=customer_name,
+        store_id=cart.store_id,
+        menu_version=menu_index.version,
+    )
+
+
+@dataclass
+class _QueuedOrder:
+    order: Order
+    menu_index: MenuIndex
+    submitted_at: float
+
+
+class CheckoutPipeline:
+    """
+    Turns carts into orders and hands them off to the kitchen without making conversations wait on I/O.
+    submit() validates, prices and snapshots a cart into an Order, then puts it on a bounded queue. A pool of worker
+    tasks takes orders off the queue in batches, saves each batch with the OrderStore and sends its tickets to the
+    TicketSink. When the queue is full submit() waits for room (backpressure) instead of dropping the order, and
+    failed batches are retried with exponential backoff until they go through. close() drains the queue first, for
+    up to drain_timeout seconds, and logs the orders that couldn't go through by then rather than blocking shutdown.
+    """
+
+    def __init__(
+        self,
+        order_store: Optional[OrderStore] = None,
+        ticket_sink: Optional[TicketSink] = None,
+        workers: int = 4,
+        max_queue_size: int = 1000,
+        max_batch_size: int = 50,
+        batch_interval: float = 0.02,
+        retry_delay: float = 0.5,
+        max_retry_delay: float = 30.0,
+        drain_timeout: Optional[float] = 30.0,
+    ):
+        if workers <= 0:
+            raise ValueError(f"workers must be positive, got {workers}.")
+        if max_batch_size <= 0:
+            raise ValueError(f"max_batch_size must be positive, got {max_batch_size}.")
+        self.order_store = order_store if order_store is not None else InMemoryOrderStore()
+        self.ticket_sink = ticket_sink if ticket_sink is not None else InMemoryTicketSink()
+        self.workers = workers
+        self.max_batch_size = max_batch_size
+        self.batch_interval = batch_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.drain_timeout = drain_timeout
+        self._queue: asyncio.Queue[_QueuedOrder] = asyncio.Queue(maxsize=max_queue_size)
+        self._workers: List[asyncio.Task] = []
+        self._closed = False
+        # Orders submitted but not yet both persisted and sent to the kitchen, by order ID
+        self._unsent: Dict[str, Order] = {}
+
+    def pending(self) -> int:
+        """Returns the number of orders waiting in the queue."""
+        return self._queue.qsize()
+
+    async def submit(
+        self,
+        cart: CompactCart,
+        menu_index: MenuIndex,
+        customer_name: Optional[str] = None,
+        stock: Optional[StoreStock] = None,
+    ) -> Order:
+        """
+        Checks out a cart and returns its order once it is queued, waiting if the queue is full.
+        Raises CheckoutError if the cart is invalid, e.g. has items out of stock. The order is persisted and sent to
+        the kitchen in the background.
+        """
+        if self._closed:
+            raise RuntimeError("Cannot check out with a closed CheckoutPipeline.")
+
+        order = create_order(cart, menu_index, customer_name, stock)
+        self._unsent[order.order_id] = order
+        self._ensure_workers()
+        await self._queue.put(_QueuedOrder(order=order, menu_index=menu_index, submitted_at=time.perf_counter()))
+        return order
+
+    async def join(self) -> None:
+        """Waits until every queued order is persisted and sent to the kitchen."""
+        await self._queue.join()
+
+    def _ensure_workers(self) -> None:
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.workers:
+            self._workers.append(
+                asyncio.create_task(self._work(), name=f"checkout-worker-{len(self._workers)}")
+            )
+
+    async def _next_batch(self) -> List[_QueuedOrder]:
+        batch = [await self._queue.get()]
+        if self._queue.empty() and self.batch_interval > 0:
+            # Let more orders pile up so they share a single write
+            await asyncio.sleep(self.batch_interval)
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _work(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._process(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _process(self, batch: List[_QueuedOrder]) -> None:
+        await self._retry("save", self.order_store.save, [queued.order for queued in batch])
+        tickets = [create_ticket(queued.order, queued.menu_index) for queued in batch]
+        await self._retry("send_tickets", self.ticket_sink.send, tickets)
+
+        for queued in batch:
+            self._unsent.pop(queued.order.order_id, None)
+        now = time.perf_counter()
+        telemetry.record_checkout_batch([(now - queued.submitted_at) * 1000 for queued in batch])
+
+    async def _retry(self, stage: str, function: Callable[[Batch], Awaitable[None]], batch: Batch) -> None:
+        """Helper function calling a batch operation until it succeeds, backing off exponentially between attempts."""
+        delay = self.retry_delay
+        while True:
+            try:
+                return await function(batch)
+            except Exception as e:
+                telemetry.record_checkout_retry(stage)
+                logfire.warning(
+                    "Checkout stage {stage} failed for {batch_size} orders, retrying in {delay:.1f}s: {error}",
+                    stage=stage,
+                    batch_size=len(batch),
+                    delay=delay,
+                    error=str(e),
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    async def close(self) -> None:
+        """
+        Stops taking orders, waits up to drain_timeout seconds for the queued ones to go through, then closes the
+        store and the sink. Orders still unsent by then are logged as errors, so they can be recovered by hand.
+        """
+        self._closed = True
+        if self._workers:
+            try:
+                await asyncio.wait_for(self._queue.join(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                for order in self._unsent.values():
+                    logfire.error(
+                        "Order {order_id} of store {store_id} wasn't persisted or sent to the kitchen before shutdown",
+                        order_id=order.order_id,
+                        store_id=order.store_id,
+                        order=order.model_dump(mode="json"),
+                    )
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await self.order_store.close()
+        await self.ticket_sink.close()
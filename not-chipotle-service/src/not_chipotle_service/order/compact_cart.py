@@ -0,0 +1,153 @@
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from not_chipotle_service.order.models import AnyCartItem, Cart, CartDrink, CartEntree, CartSide
+
+
+def intern_id(menu_item_id: str) -> str:
+    """Interns a menu ID, so every live cart holding it shares a single string."""
+    return sys.intern(menu_item_id)
+
+
+@dataclass(slots=True, eq=False)
+class CompactCartItem:
+    """
+    A cart item as held in memory. Entrees, sides and drinks share this one slotted class, and every menu ID in it is
+    interned, so an item costs a few pointers rather than a pydantic model with its own copies of the IDs.
+    """
+
+    item_id: int
+    item_type: str
+    menu_item_id: str
+    protein_id: Optional[str] = None
+    # Tuples are replaced rather than mutated, so copies of the cart can share them
+    toppings: Tuple[str, ...] = ()
+    special_configurations: Optional[Dict[str, str]] = None
+
+    def copy(self) -> "CompactCartItem":
+        return CompactCartItem(
+            self.item_id,
+            self.item_type,
+            self.menu_item_id,
+            self.protein_id,
+            self.toppings,
+            self.special_configurations,
+        )
+
+    def to_model(self) -> AnyCartItem:
+        """Converts the item to its pydantic model, for API responses and persistence."""
+        if self.item_type == "entree":
+            return CartEntree(
+                item_id=self.item_id,
+                menu_item_id=self.menu_item_id,
+                protein_id=self.protein_id,
+                toppings=list(self.toppings),
+                special_configurations=dict(self.special_configurations) if self.special_configurations else None,
+            )
+        if self.item_type == "side":
+            return CartSide(item_id=self.item_id, menu_item_id=self.menu_item_id)
+        return CartDrink(item_id=self.item_id, menu_item_id=self.menu_item_id)
+
+
+@dataclass(slots=True, eq=False)
+class CompactCart:
+    """
+    The cart of a live session. Items are keyed by item IDs that stay the same for as long as the item is in the
+    cart, so removing one never shifts the others, and adding, removing and looking up an item are all O(1).
+    Items are kept in the order they were added. Convert to a Cart with to_model at API boundaries.
+    """
+
+    cart_id: str
+    store_id: str = "default"
+    items: Dict[int, CompactCartItem] = field(default_factory=dict)
+    total_price: float = 0.0
+    # Item IDs are not reused while the cart is live, so an ID the model saw earlier can't point at another item.
+    # A cart restored from its model continues after its highest item ID.
+    next_item_id: int = 1
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self) -> Iterator[CompactCartItem]:
+        return iter(self.items.values())
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self.items
+
+    def get(self, item_id: int) -> Optional[CompactCartItem]:
+        return self.items.get(item_id)
+
+    def add(
+        self,
+        item_type: str,
+        menu_item_id: str,
+        protein_id: Optional[str] = None,
+        toppings: Iterable[str] = (),
+        special_configurations: Optional[Dict[str, str]] = None,
+        item_id: Optional[int] = None,
+    ) -> CompactCartItem:
+        """
+        Adds an item and returns it. It gets a new item ID unless one is given, e.g. when restoring a saved cart.
+        The menu IDs are not checked against the menu.
+        """
+        if item_id is None:
+            item_id = self.next_item_id
+        item = CompactCartItem(
+            item_id=item_id,
+            item_type=intern_id(item_type),
+            menu_item_id=intern_id(menu_item_id),
+            protein_id=intern_id(protein_id) if protein_id else None,
+            toppings=tuple(intern_id(topping_id) for topping_id in toppings),
+            special_configurations=special_configurations,
+        )
+        self.items[item_id] = item
+        self.next_item_id = max(self.next_item_id, item_id + 1)
+        return item
+
+    def pop(self, item_id: int) -> Optional[CompactCartItem]:
+        """Removes an item and returns it, or None if no item has this ID."""
+        return self.items.pop(item_id, None)
+
+    def copy(self) -> "CompactCart":
+        """Returns a copy of the cart whose items can be changed without touching this one."""
+        return CompactCart(
+            cart_id=self.cart_id,
+            store_id=self.store_id,
+            items={item_id: item.copy() for item_id, item in self.items.items()},
+            total_price=self.total_price,
+            next_item_id=self.next_item_id,
+        )
+
+    def update_from(self, other: "CompactCart") -> None:
+        """Replaces the contents of the cart with those of another one, e.g. a copy changes were applied to."""
+        self.items = other.items
+        self.total_price = other.total_price
+        self.next_item_id = other.next_item_id
+
+    def to_model(self) -> Cart:
+        """Converts the cart to its pydantic model, for API responses, events and persistence."""
+        return Cart(
+            cart_id=self.cart_id,
+            store_id=self.store_id,
+            items=[item.to_model() for item in self.items.values()],
+            total_price=self.total_price,
+        )
+
+    @classmethod
+    def from_model(cls, cart: Cart) -> "CompactCart":
+        """Builds a cart from its pydantic model. Items saved without an item ID are given new ones."""
+        compact_cart = cls(cart_id=cart.cart_id, store_id=cart.store_id, total_price=cart.total_price)
+        for item in cart.items:
+            if isinstance(item, CartEntree):
+                compact_cart.add(
+                    item.item_type,
+                    item.menu_item_id,
+                    item.protein_id,
+                    item.toppings,
+                    dict(item.special_configurations) if item.special_configurations else None,
+                    item_id=item.item_id,
+                )
+            else:
+                compact_cart.add(item.item_type, item.menu_item_id, item_id=item.item_id)
+        return compact_cart
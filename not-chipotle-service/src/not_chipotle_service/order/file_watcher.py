@@ -0,0 +1,38 @@
+import asyncio
+from typing import Any, Callable, Optional
+
+
+class FileWatcher:
+    """
+    Background task picking up changes to files by calling a blocking poll function in a worker thread every
+    poll_interval seconds. It is started on first use from the event loop, and never when poll_interval is None.
+    """
+
+    def __init__(self, name: str, poll: Callable[[], Any], poll_interval: Optional[float]):
+        self.name = name
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Starts polling, unless it is already running."""
+        if self.poll_interval is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._poll_loop(), name=self.name)
+
+    async def _poll_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await asyncio.to_thread(self.poll)
+
+    async def stop(self) -> None:
+        """Stops polling."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        # A task started by another event loop can't be awaited from this one
+        if task.get_loop() is asyncio.get_running_loop():
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
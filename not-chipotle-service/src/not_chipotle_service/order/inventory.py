@@ -0,0 +1,173 @@
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, Literal, Mapping, Optional, Set, Tuple
+
+import logfire
+from not_chipotle_service.order.file_watcher import FileWatcher
+from not_chipotle_service.order.menu_index import MenuIndex
+from not_chipotle_service.order.menu_registry import DEFAULT_STORE_ID
+from pydantic import BaseModel, Field, ValidationError
+
+
+# Prefix of the toppings adding a second portion of a protein, which run out along with the protein
+DOUBLE_PROTEIN_PREFIX = "double_protein_"
+
+
+class StockEvent(BaseModel):
+    store_id: str = Field(default=DEFAULT_STORE_ID, description="ID of the store whose stock changed")
+    item_type: Literal["entree", "protein", "topping", "side", "drink"] = Field(description="Type of the menu item")
+    menu_item_id: str = Field(description="ID of the menu item (e.g., 'guacamole', 'carnitas')")
+    available: bool = Field(description="Whether the store can serve the item, false once it ran out (86'd)")
+
+
+@dataclass(frozen=True)
+class StoreStock:
+    """
+    Immutable snapshot of the menu items a store ran out of, replaced as a whole whenever its stock changes.
+    Availability checks are O(1) set lookups. The version is a content hash of the unavailable items, empty when
+    everything is in stock, so renderings and replies cached for a stock state are reused whenever it comes back.
+    """
+
+    version: str
+    unavailable: Mapping[str, FrozenSet[str]]
+
+    @classmethod
+    def from_unavailable(cls, unavailable: Iterable[Tuple[str, str]]) -> "StoreStock":
+        """Builds the stock of a store from the (item_type, menu_item_id) pairs it ran out of."""
+        by_type: Dict[str, Set[str]] = {}
+        for item_type, item_id in unavailable:
+            by_type.setdefault(item_type, set()).add(item_id)
+
+        keys = sorted(f"{item_type}:{item_id}" for item_type, item_ids in by_type.items() for item_id in item_ids)
+        version = hashlib.sha256("\n".join(keys).encode()).hexdigest()[:16] if keys else ""
+        return cls(
+            version=version,
+            unavailable=MappingProxyType({item_type: frozenset(item_ids) for item_type, item_ids in by_type.items()}),
+        )
+
+    @property
+    def all_available(self) -> bool:
+        return not self.version
+
+    def is_available(self, item_type: str, item_id: str) -> bool:
+        """Returns whether the store can serve a menu item. A double protein topping is unavailable with its protein."""
+        if item_type == "topping" and item_id.startswith(DOUBLE_PROTEIN_PREFIX):
+            if self._is_listed("protein", item_id[len(DOUBLE_PROTEIN_PREFIX) :]):
+                return False
+        return not self._is_listed(item_type, item_id)
+
+    def _is_listed(self, item_type: str, item_id: str) -> bool:
+        """Helper function returning whether a menu item itself ran out."""
+        unavailable = self.unavailable.get(item_type)
+        return unavailable is not None and item_id in unavailable
+
+    def menu_version(self, menu_index: MenuIndex) -> str:
+        """Returns the version of a menu filtered by this stock, which is the menu's own version when nothing ran out."""
+        if self.all_available:
+            return menu_index.version
+        return f"{menu_index.version}-{self.version}"
+
+
+# Stock of every store that never ran out of anything
+ALL_AVAILABLE = StoreStock.from_unavailable(())
+
+
+class InventoryIndex:
+    """
+    Stock of many stores, kept in memory and updated from stock events.
+    Each store's stock is an immutable StoreStock swapped in atomically on every change, so cart validations check
+    items in O(1) without locks or I/O and never re-query the menu. Events are applied with apply(), or read from a
+    local JSON Lines feed of StockEvents (e.g. appended by the kitchen display when an item is 86'd). The feed is
+    read once on creation and then tailed by a background task every poll_interval seconds.
+    """
+
+    def __init__(self, feed_path: Optional[str] = None, poll_interval: Optional[float] = 1.0):
+        self.feed_path = feed_path
+        self.poll_interval = poll_interval
+        self._stores: Dict[str, StoreStock] = {}
+        self._feed_offset = 0
+        self._watcher = FileWatcher(
+            "inventory-feed-watcher", self.read_feed, poll_interval if feed_path is not None else None
+        )
+
+        # Feed events are applied by worker threads while the event loop reads the stock
+        self._lock = threading.Lock()
+
+        if self.feed_path is not None:
+            self.read_feed()
+
+    @classmethod
+    def from_env(cls) -> "InventoryIndex":
+        """Creates an inventory tailing the stock feed NOT_CHIPOTLE_STOCK_FEED points to, if it is set."""
+        return cls(os.getenv("NOT_CHIPOTLE_STOCK_FEED") or None)
+
+    def get(self, store_id: str = DEFAULT_STORE_ID) -> StoreStock:
+        """Returns the current stock of a store, everything is available in stores without stock events."""
+        return self._stores.get(store_id, ALL_AVAILABLE)
+
+    async def aget(self, store_id: str = DEFAULT_STORE_ID) -> StoreStock:
+        """Like get(), but starts tailing the feed on first use."""
+        self._watcher.start()
+        return self.get(store_id)
+
+    def apply(self, event: StockEvent) -> bool:
+        """Applies a stock event, returning whether it changed the stock of its store."""
+        with self._lock:
+            stock = self.get(event.store_id)
+            if stock._is_listed(event.item_type, event.menu_item_id) != event.available:
+                return False
+
+            unavailable = {
+                (item_type, item_id) for item_type, item_ids in stock.unavailable.items() for item_id in item_ids
+            }
+            if event.available:
+                unavailable.discard((event.item_type, event.menu_item_id))
+            else:
+                unavailable.add((event.item_type, event.menu_item_id))
+            self._stores[event.store_id] = StoreStock.from_unavailable(unavailable)
+
+        logfire.info(
+            "{item_type} {menu_item_id} of store {store_id} is {status}",
+            item_type=event.item_type.capitalize(),
+            menu_item_id=event.menu_item_id,
+            store_id=event.store_id,
+            status="back in stock" if event.available else "out of stock",
+        )
+        return True
+
+    def read_feed(self) -> int:
+        """Applies the events appended to the feed since it was last read, returning how many changed the stock."""
+        if self.feed_path is None:
+            return 0
+        try:
+            with open(self.feed_path, "rb") as file:
+                if os.fstat(file.fileno()).st_size < self._feed_offset:
+                    # The feed was truncated or replaced, read it again from the start
+                    self._feed_offset = 0
+                file.seek(self._feed_offset)
+                data = file.read()
+        except FileNotFoundError:
+            return 0
+
+        # Only whole lines are applied, a line still being written is picked up by the next read
+        end = data.rfind(b"\n") + 1
+        self._feed_offset += end
+
+        changed = 0
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                event = StockEvent.model_validate_json(line)
+            except ValidationError as e:
+                logfire.warning("Skipped invalid stock event in {path}: {error}", path=self.feed_path, error=str(e))
+                continue
+            changed += self.apply(event)
+        return changed
+
+    async def close(self) -> None:
+        """Stops tailing the feed."""
+        await self._watcher.stop()
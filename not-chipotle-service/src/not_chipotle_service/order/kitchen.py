@@ -0,0 +1,83 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime
+from typing import Deque, List, Optional, Sequence
+
+from not_chipotle_service.order.menu_index import MenuIndex
+from not_chipotle_service.order.models import Order
+from pydantic import BaseModel, Field
+
+
+class KitchenTicket(BaseModel):
+    order_id: str = Field(description="ID of the order the ticket is for")
+    store_id: str = Field(description="ID of the store whose kitchen prepares the order")
+    customer_name: Optional[str] = Field(default=None, description="Name to call the order out with")
+    created_at: datetime = Field(description="When the order was placed")
+    lines: List[str] = Field(description="One line per item, readable by the kitchen staff")
+
+
+def _item_name(menu_index: MenuIndex, item_type: str, item_id: str) -> str:
+    menu_item = menu_index.get(item_type, item_id)
+    return menu_item.name if menu_item else item_id
+
+
+def create_ticket(order: Order, menu_index: MenuIndex) -> KitchenTicket:
+    """Renders an order as a kitchen ticket, with menu names rather than IDs."""
+    lines = []
+    for item in order.items:
+        line = _item_name(menu_index, item.item_type, item.menu_item_id)
+        if item.item_type == "entree":
+            details = []
+            if item.protein_id:
+                details.append(_item_name(menu_index, "protein", item.protein_id))
+            details += [_item_name(menu_index, "topping", topping_id) for topping_id in item.toppings]
+            details += [f"{key} {value}" for key, value in (item.special_configurations or {}).items()]
+            if details:
+                line += f": {', '.join(details)}"
+        lines.append(line)
+
+    return KitchenTicket(
+        order_id=order.order_id,
+        store_id=order.store_id,
+        customer_name=order.customer_name,
+        created_at=order.created_at,
+        lines=lines,
+    )
+
+
+class TicketSink(ABC):
+    """Destination of kitchen tickets, e.g. a kitchen display or printer. Tickets are sent in batches."""
+
+    @abstractmethod
+    async def send(self, tickets: Sequence[KitchenTicket]) -> None:
+        """Sends a batch of tickets to the kitchen."""
+
+    async def close(self) -> None:
+        """Releases any resources held by the sink."""
+
+
+class InMemoryTicketSink(TicketSink):
+    """Keeps the most recent tickets in process memory, for development and tests."""
+
+    def __init__(self, max_tickets: int = 10_000):
+        self.tickets: Deque[KitchenTicket] = deque(maxlen=max_tickets)
+
+    async def send(self, tickets: Sequence[KitchenTicket]) -> None:
+        self.tickets.extend(tickets)
+
+
+class JSONLinesTicketSink(TicketSink):
+    """Appends tickets to a local JSON Lines file, one ticket per line, which kitchen displays can tail."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _append(self, data: bytes) -> None:
+        with open(self.path, "ab") as file:
+            file.write(data)
+
+    async def send(self, tickets: Sequence[KitchenTicket]) -> None:
+        data = b"".join(ticket.model_dump_json().encode() + b"\n" for ticket in tickets)
+        # File I/O happens in a worker thread, so a slow disk never stalls the event loop
+        await asyncio.to_thread(self._append, data)
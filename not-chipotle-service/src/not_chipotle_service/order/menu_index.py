@@ -0,0 +1,207 @@
+import hashlib
+import re
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, Mapping, Optional
+from not_chipotle_service.order.models import Menu, MenuItem
+
+
+# Maps the singular item type (as used by MenuItem.type and CartItem.item_type) to the Menu field holding it
+MENU_CATEGORIES: Mapping[str, str] = MappingProxyType(
+    {
+        "entree": "entrees",
+        "protein": "proteins",
+        "topping": "toppings",
+        "side": "sides",
+        "drink": "drinks",
+    }
+)
+
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9']+")
+
+
+def normalize_term(term: str) -> str:
+    """Normalizes a free-form menu term (name, synonym or id) for synonym lookups."""
+    return " ".join(_NON_WORD_RE.sub(" ", term.lower().replace("&", " and ")).split())
+
+
+def _unit_price(item: MenuItem) -> float:
+    """Returns the price contributed by a single unit of a menu item."""
+    if item.price is not None:
+        return item.price
+    if item.base_price is not None:
+        return item.base_price
+    if item.price_add is not None:
+        return item.price_add
+    return 0.0
+
+
+@dataclass(frozen=True)
+class MenuCategoryIndex:
+    """Hash-based lookups for a single category of the menu (e.g., toppings)."""
+
+    item_type: str
+    items: Mapping[str, MenuItem]
+    synonyms: Mapping[str, str]
+    prices: Mapping[str, float]
+
+    @classmethod
+    def from_items(cls, item_type: str, menu_items: Iterable[MenuItem]) -> "MenuCategoryIndex":
+        items: Dict[str, MenuItem] = {}
+        synonyms: Dict[str, str] = {}
+        prices: Dict[str, float] = {}
+        for item in menu_items:
+            items[item.id] = item
+            prices[item.id] = _unit_price(item)
+
+            # Explicit synonyms win over ids and names, and earlier items win over later ones
+            for term in (*(item.synonyms or []), item.id, item.name):
+                synonyms.setdefault(normalize_term(term), item.id)
+
+        return cls(
+            item_type=item_type,
+            items=MappingProxyType(items),
+            synonyms=MappingProxyType(synonyms),
+            prices=MappingProxyType(prices),
+        )
+
+    def __reduce__(self):
+        # Mapping proxies can't be pickled, the index is pickled as plain dicts and wrapped again on load
+        return (
+            _restore_category_index,
+            (self.item_type, dict(self.items), dict(self.synonyms), dict(self.prices)),
+        )
+
+    def get(self, item_id: str) -> Optional[MenuItem]:
+        return self.items.get(item_id)
+
+    def __contains__(self, item_id: object) -> bool:
+        return item_id in self.items
+
+    def resolve(self, term: str) -> Optional[str]:
+        """Resolves an id, name or synonym to a menu item ID of this category."""
+        if term in self.items:
+            return term
+        return self.synonyms.get(normalize_term(term))
+
+
+def _restore_category_index(
+    item_type: str, items: Dict[str, MenuItem], synonyms: Dict[str, str], prices: Dict[str, float]
+) -> MenuCategoryIndex:
+    return MenuCategoryIndex(
+        item_type=item_type,
+        items=MappingProxyType(items),
+        synonyms=MappingProxyType(synonyms),
+        prices=MappingProxyType(prices),
+    )
+
+
+@dataclass(frozen=True)
+class MenuIndex:
+    """
+    Immutable catalog built once from a Menu.
+    Every cart operation and agent tool resolves menu items through this index, so validations are O(1) hash
+    lookups instead of linear scans over the Menu lists.
+    """
+
+    menu: Menu
+    version: str
+    categories: Mapping[str, MenuCategoryIndex]
+    special_configurations: Mapping[str, Mapping[str, FrozenSet[str]]]
+
+    @classmethod
+    def from_menu(cls, menu: Menu) -> "MenuIndex":
+        # The version is a content hash, so identical menus share it and any edit produces a new one
+        version = hashlib.sha256(menu.model_dump_json().encode()).hexdigest()[:16]
+        categories = {
+            item_type: MenuCategoryIndex.from_items(item_type, getattr(menu, field_name))
+            for item_type, field_name in MENU_CATEGORIES.items()
+        }
+        special_configurations = {
+            item.id: MappingProxyType(
+                {key: frozenset(values) for key, values in item.special_configurations.items()}
+            )
+            for item in menu.entrees
+            if item.special_configurations
+        }
+        return cls(
+            menu=menu,
+            version=version,
+            categories=MappingProxyType(categories),
+            special_configurations=MappingProxyType(special_configurations),
+        )
+
+    def __reduce__(self):
+        # Pickled for menu snapshots, which load without validating the menu or rebuilding the index
+        return (
+            _restore_menu_index,
+            (
+                self.menu,
+                self.version,
+                dict(self.categories),
+                {entree_id: dict(configurations) for entree_id, configurations in self.special_configurations.items()},
+            ),
+        )
+
+    @property
+    def entrees(self) -> MenuCategoryIndex:
+        return self.categories["entree"]
+
+    @property
+    def proteins(self) -> MenuCategoryIndex:
+        return self.categories["protein"]
+
+    @property
+    def toppings(self) -> MenuCategoryIndex:
+        return self.categories["topping"]
+
+    @property
+    def sides(self) -> MenuCategoryIndex:
+        return self.categories["side"]
+
+    @property
+    def drinks(self) -> MenuCategoryIndex:
+        return self.categories["drink"]
+
+    def category(self, item_type: str) -> Optional[MenuCategoryIndex]:
+        """Returns the index for an item type ('entree', 'protein', 'topping', 'side' or 'drink')."""
+        return self.categories.get(item_type)
+
+    def get(self, item_type: str, item_id: str) -> Optional[MenuItem]:
+        """Returns the menu item of the given type and ID, if it exists."""
+        category = self.categories.get(item_type)
+        return category.get(item_id) if category else None
+
+    def has(self, item_type: str, item_id: str) -> bool:
+        category = self.categories.get(item_type)
+        return category is not None and item_id in category
+
+    def resolve(self, item_type: str, term: str) -> Optional[str]:
+        """Resolves an id, name or synonym of the given item type to a menu item ID."""
+        category = self.categories.get(item_type)
+        return category.resolve(term) if category else None
+
+    def price_of(self, item_type: str, item_id: str) -> float:
+        """Returns the precomputed unit price of a menu item."""
+        return self.categories[item_type].prices[item_id]
+
+    def allowed_special_configurations(self, entree_id: str) -> Optional[Mapping[str, FrozenSet[str]]]:
+        """Returns the allowed special configurations for an entree, or None if it doesn't support any."""
+        return self.special_configurations.get(entree_id)
+
+
+def _restore_menu_index(
+    menu: Menu,
+    version: str,
+    categories: Dict[str, MenuCategoryIndex],
+    special_configurations: Dict[str, Dict[str, FrozenSet[str]]],
+) -> MenuIndex:
+    return MenuIndex(
+        menu=menu,
+        version=version,
+        categories=MappingProxyType(categories),
+        special_configurations=MappingProxyType(
+            {entree_id: MappingProxyType(configurations) for entree_id, configurations in special_configurations.items()}
+        ),
+    )
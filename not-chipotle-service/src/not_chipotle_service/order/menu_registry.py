@@ -0,0 +1,181 @@
+import asyncio
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import logfire
+from not_chipotle_service.order.file_watcher import FileWatcher
+from not_chipotle_service.order.menu_index import MenuIndex
+from not_chipotle_service.order.utils import MENU_CONFIG_DIR, load_menu
+
+
+# Store served by config/menu.json, used whenever no store is specified
+DEFAULT_STORE_ID = "default"
+
+_STORE_ID_RE = re.compile(r"[A-Za-z0-9_-]+")
+
+
+# Called with the store ID, the replaced menu and the new one whenever a loaded menu is reloaded with a new version
+ReloadListener = Callable[[str, MenuIndex, MenuIndex], None]
+
+
+class MenuNotFoundError(KeyError):
+    """Raised when no menu file exists for a store."""
+
+
+@dataclass(frozen=True)
+class _LoadedMenu:
+    """A loaded menu together with the file stats it was loaded from."""
+
+    path: str
+    menu_index: MenuIndex
+    file_stat: Tuple[int, int]
+
+
+def _stat(path: str) -> Tuple[int, int]:
+    """Returns the modification time and size of a file, which change whenever the file is rewritten."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class MenuRegistry:
+    """
+    Menus of many stores, loaded lazily and hot reloaded when their files change.
+    The default store reads config/menu.json and every other store reads config/menus/<store_id>.json. Loaded menus
+    are immutable MenuIndex snapshots swapped in atomically on reload, so callers holding a snapshot keep a consistent
+    menu while new callers get the new version. A background task polls the file stats of loaded menus and reloads
+    changed ones in a worker thread, and the least recently used menus are evicted beyond max_loaded_menus.
+    """
+
+    def __init__(
+        self,
+        config_dir: str = MENU_CONFIG_DIR,
+        max_loaded_menus: int = 256,
+        poll_interval: Optional[float] = 1.0,
+    ):
+        if max_loaded_menus <= 0:
+            raise ValueError(f"max_loaded_menus must be positive, got {max_loaded_menus}.")
+        self.config_dir = config_dir
+        self.max_loaded_menus = max_loaded_menus
+        self.poll_interval = poll_interval
+        self._menus: OrderedDict[str, _LoadedMenu] = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._watcher = FileWatcher("menu-registry-watcher", self.reload_changed, poll_interval)
+        self._reload_listeners: List[ReloadListener] = []
+
+        # Menus are swapped in by worker threads while the event loop reads them
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._menus)
+
+    def path_for(self, store_id: str) -> str:
+        """Returns the menu file of a store."""
+        if not _STORE_ID_RE.fullmatch(store_id):
+            raise ValueError(f"Invalid store_id: '{store_id}'. Must only contain letters, digits, '_' and '-'.")
+        if store_id == DEFAULT_STORE_ID:
+            return os.path.join(self.config_dir, "menu.json")
+        return os.path.join(self.config_dir, "menus", f"{store_id}.json")
+
+    def _cached(self, store_id: str) -> Optional[MenuIndex]:
+        with self._lock:
+            loaded = self._menus.get(store_id)
+            if loaded is None:
+                return None
+            self._menus.move_to_end(store_id)
+            return loaded.menu_index
+
+    def add_reload_listener(self, listener: ReloadListener) -> None:
+        """
+        Registers a function called whenever a loaded menu is replaced by a new version, e.g. to drop data cached for
+        the old one. It may be called from a worker thread, so it must be thread-safe and must not block.
+        """
+        self._reload_listeners.append(listener)
+
+    def _swap_in(self, store_id: str, loaded: _LoadedMenu) -> None:
+        with self._lock:
+            replaced = self._menus.get(store_id)
+            self._menus[store_id] = loaded
+            self._menus.move_to_end(store_id)
+            while len(self._menus) > self.max_loaded_menus:
+                self._menus.popitem(last=False)
+
+        if replaced is not None and replaced.menu_index.version != loaded.menu_index.version:
+            for listener in self._reload_listeners:
+                listener(store_id, replaced.menu_index, loaded.menu_index)
+
+    def _load(self, store_id: str) -> MenuIndex:
+        """Reads, validates and indexes a store's menu, then swaps it in."""
+        path = self.path_for(store_id)
+        try:
+            # Stat before reading, so a write racing with the read is picked up by the next poll
+            file_stat = _stat(path)
+            _, menu_index = load_menu(path)
+        except FileNotFoundError:
+            raise MenuNotFoundError(store_id)
+
+        self._swap_in(store_id, _LoadedMenu(path=path, menu_index=menu_index, file_stat=file_stat))
+        return menu_index
+
+    def get(self, store_id: str = DEFAULT_STORE_ID) -> MenuIndex:
+        """Returns the current menu of a store, loading it on first use. Raises MenuNotFoundError for unknown stores."""
+        menu_index = self._cached(store_id)
+        if menu_index is None:
+            menu_index = self._load(store_id)
+        return menu_index
+
+    async def aget(self, store_id: str = DEFAULT_STORE_ID) -> MenuIndex:
+        """Like get(), but loads menus in a worker thread and only once for concurrent callers."""
+        self._watcher.start()
+        menu_index = self._cached(store_id)
+        if menu_index is not None:
+            return menu_index
+
+        loading = self._loading.get(store_id)
+        if loading is None:
+            loading = asyncio.ensure_future(asyncio.to_thread(self._load, store_id))
+            self._loading[store_id] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(store_id, None))
+        return await asyncio.shield(loading)
+
+    def reload(self, store_id: str) -> MenuIndex:
+        """Reloads a store's menu from its file right away."""
+        return self._load(store_id)
+
+    def evict(self, store_id: str) -> None:
+        """Drops a store's menu, it is loaded again on next use."""
+        with self._lock:
+            self._menus.pop(store_id, None)
+
+    def reload_changed(self) -> List[str]:
+        """Reloads every loaded menu whose file changed, returning the IDs of the reloaded stores."""
+        with self._lock:
+            loaded_menus = list(self._menus.items())
+
+        reloaded = []
+        for store_id, loaded in loaded_menus:
+            try:
+                if _stat(loaded.path) == loaded.file_stat:
+                    continue
+                menu_index = self._load(store_id)
+            except Exception as e:
+                # Keep serving the last good menu when the file is removed or has an invalid edit
+                logfire.warning("Failed to reload menu of store {store_id}: {error}", store_id=store_id, error=str(e))
+                continue
+
+            reloaded.append(store_id)
+            if menu_index.version != loaded.menu_index.version:
+                logfire.info(
+                    "Reloaded menu of store {store_id}, version {old_version} -> {new_version}",
+                    store_id=store_id,
+                    old_version=loaded.menu_index.version,
+                    new_version=menu_index.version,
+                )
+        return reloaded
+
+    async def close(self) -> None:
+        """Stops watching menu files."""
+        await self._watcher.stop()
@@ -0,0 +1,115 @@
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+from not_chipotle_service.order.inventory import StoreStock
+from not_chipotle_service.order.menu_index import MENU_CATEGORIES, MenuIndex
+
+
+# Explains the short keys of the compact rendering, meant for tool descriptions and system prompts
+COMPACT_MENU_LEGEND = (
+    "Compact menu keys: v = menu version, id = menu_item_id, n = name, "
+    "p = price (base price for entrees, price added to the entree for proteins and toppings), "
+    "d = description, cfg = allowed special configurations. Items out of stock are left out."
+)
+
+# Number of menu versions whose renderings are kept around, covering the menus and stock states of many stores
+MAX_CACHED_VERSIONS = 256
+
+
+@dataclass(frozen=True)
+class CompactMenu:
+    """Precomputed compact JSON renderings of a menu version, as bytes and text, for the full menu and per category."""
+
+    version: str
+    full_bytes: bytes
+    full_text: str
+    category_bytes: Mapping[str, bytes]
+    category_texts: Mapping[str, str]
+
+    def text(self, category: Optional[str] = None) -> str:
+        """Returns the rendering of the full menu or of a single category ('toppings' or 'topping')."""
+        if category is None:
+            return self.full_text
+        return self.category_texts[_normalize_category(category)]
+
+    def data(self, category: Optional[str] = None) -> bytes:
+        """Returns the same rendering as text() as UTF-8 bytes, ready to be written to a response."""
+        if category is None:
+            return self.full_bytes
+        return self.category_bytes[_normalize_category(category)]
+
+
+def _normalize_category(category: str) -> str:
+    """Accepts both Menu field names ('toppings') and item types ('topping'), returning the field name."""
+    category = category.strip().lower()
+    if category in MENU_CATEGORIES:
+        return MENU_CATEGORIES[category]
+    if category in MENU_CATEGORIES.values():
+        return category
+    raise KeyError(category)
+
+
+def _dumps(data: Any) -> bytes:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _compact_items(menu_index: MenuIndex, item_type: str, stock: Optional[StoreStock]) -> list:
+    category = menu_index.categories[item_type]
+    compact_items = []
+    for item_id, item in category.items.items():
+        if stock is not None and not stock.is_available(item_type, item_id):
+            continue
+        compact_item: Dict[str, Any] = {"id": item_id, "n": item.name, "p": category.prices[item_id]}
+        if item.description:
+            compact_item["d"] = item.description
+        if item.special_configurations:
+            compact_item["cfg"] = item.special_configurations
+        compact_items.append(compact_item)
+    return compact_items
+
+
+def render_compact_menu(menu_index: MenuIndex, stock: Optional[StoreStock] = None) -> CompactMenu:
+    """
+    Renders a menu to compact JSON with short keys, omitting synonyms, item types and empty fields, as well as the
+    items out of stock if a stock is given. The rendering's version is then the version of the filtered menu.
+    """
+    version = stock.menu_version(menu_index) if stock is not None else menu_index.version
+    categories = {
+        field_name: _compact_items(menu_index, item_type, stock) for item_type, field_name in MENU_CATEGORIES.items()
+    }
+
+    full_bytes = _dumps({"v": version, **categories})
+    category_bytes = {
+        field_name: _dumps({"v": version, field_name: items}) for field_name, items in categories.items()
+    }
+
+    return CompactMenu(
+        version=version,
+        full_bytes=full_bytes,
+        full_text=full_bytes.decode(),
+        category_bytes=MappingProxyType(category_bytes),
+        category_texts=MappingProxyType({name: data.decode() for name, data in category_bytes.items()}),
+    )
+
+
+_compact_menus: "OrderedDict[str, CompactMenu]" = OrderedDict()
+
+
+def get_compact_menu(menu_index: MenuIndex, stock: Optional[StoreStock] = None) -> CompactMenu:
+    """
+    Returns the compact rendering of a menu without the items out of stock, rendering it only once per menu version
+    and stock state. A stock change gives the filtered menu a new version, which is all it takes to invalidate it.
+    """
+    version = stock.menu_version(menu_index) if stock is not None else menu_index.version
+    compact_menu = _compact_menus.get(version)
+    if compact_menu is None:
+        compact_menu = render_compact_menu(menu_index, stock)
+        _compact_menus[version] = compact_menu
+        if len(_compact_menus) > MAX_CACHED_VERSIONS:
+            _compact_menus.popitem(last=False)
+    else:
+        _compact_menus.move_to_end(version)
+    return compact_menu
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import pickle
+from typing import Optional
+
+import pydantic
+from not_chipotle_service.order.menu_index import MenuIndex
+
+
+# Bumped whenever the layout of snapshots or of the pickled MenuIndex changes, so old snapshots are ignored
+SNAPSHOT_FORMAT = 1
+
+# Snapshots sit next to their menu file, e.g. config/menu.json.snapshot
+SNAPSHOT_SUFFIX = ".snapshot"
+
+
+def snapshot_path_for(menu_file_path: str) -> str:
+    """Returns the snapshot file of a menu file."""
+    return menu_file_path + SNAPSHOT_SUFFIX
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_snapshot(menu_file_path: str, source: bytes, menu_index: MenuIndex) -> str:
+    """
+    Writes the snapshot of a menu, given the JSON it was validated from and its index, and returns the snapshot path.
+    A snapshot is a one-line JSON header followed by the pickled MenuIndex. The header records the hash of the JSON
+    source and of the pickle, along with the snapshot format and pydantic versions the pickle is only valid for.
+    """
+    payload = pickle.dumps(menu_index, protocol=pickle.HIGHEST_PROTOCOL)
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "pydantic": pydantic.VERSION,
+        "source_sha256": _digest(source),
+        "payload_sha256": _digest(payload),
+    }
+
+    # Write to a temporary file first, so readers never see a partially written snapshot
+    snapshot_path = snapshot_path_for(menu_file_path)
+    temporary_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(json.dumps(header).encode() + b"\n")
+        f.write(payload)
+    os.replace(temporary_path, snapshot_path)
+    return snapshot_path
+
+
+def read_snapshot(menu_file_path: str, source: bytes) -> Optional[MenuIndex]:
+    """
+    Returns the menu index stored in the snapshot of a menu file, or None if there is no snapshot or it doesn't match
+    the current JSON source, the snapshot format or the installed pydantic version. Snapshots are unpickled, so like
+    the code itself they must only come from the service's own build.
+    """
+    try:
+        with open(snapshot_path_for(menu_file_path), "rb") as f:
+            header_line = f.readline()
+            payload = f.read()
+        header = json.loads(header_line)
+    except (OSError, ValueError):
+        return None
+
+    if (
+        not isinstance(header, dict)
+        or header.get("format") != SNAPSHOT_FORMAT
+        or header.get("pydantic") != pydantic.VERSION
+        or header.get("source_sha256") != _digest(source)
+        or header.get("payload_sha256") != _digest(payload)
+    ):
+        return None
+
+    try:
+        menu_index = pickle.loads(payload)
+    except Exception:
+        # e.g. a class the snapshot refers to was renamed since it was built
+        return None
+    return menu_index if isinstance(menu_index, MenuIndex) else None
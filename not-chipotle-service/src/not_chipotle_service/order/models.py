@@ -1,48 +1,46 @@
+from datetime import datetime, timezone
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from typing import Annotated, List, Literal, Optional, Dict, Union
 
 class CartItem(BaseModel):
+    """Base class of all cart items. Subclasses set the item_type literal used to tell them apart when deserializing."""
+    item_type: str = Field(description="Type of the cart item ('entree', 'side' or 'drink')")
     menu_item_id: str = Field(description="ID of the menu item (e.g., 'burrito', 'chicken', 'white_rice')")
-
-    @property
-    def item_type(self) -> str:
-        """Abstract property that must be implemented by subclasses to indicate the type of cart item."""
-        raise NotImplementedError("Subclasses must implement this property")
+    item_id: Optional[int] = Field(default=None, description="ID of the item in the cart, it stays the same until the item is removed")
 
 class CartEntree(CartItem):
     menu_item_id: str = Field(description="ID of the entree (e.g., 'burrito', 'tacos')")
     protein_id: Optional[str] = Field(default=None, description="ID of the selected protein")
     toppings: List[str] = Field(default_factory=list, description="List of IDs of selected toppings")
     special_configurations: Optional[Dict] = Field(default=None, description="Special configurations for the entree (e.g., taco type)")
-
-    @property
-    def item_type(self) -> str:
-        return "entree"
+    item_type: Literal["entree"] = "entree"
 
 class CartSide(CartItem):
     menu_item_id: str = Field(description="ID of the side item (e.g., 'guacamole', 'chips')")
-
-    @property
-    def item_type(self) -> str:
-        return "side"
+    item_type: Literal["side"] = "side"
 
 class CartDrink(CartItem):
     menu_item_id: str = Field(description="ID of the drink item (e.g., 'fountain_small', 'bottled_water')")
+    item_type: Literal["drink"] = "drink"
 
-    @property
-    def item_type(self) -> str:
-        return "drink"
+# Any concrete cart item, discriminated by item_type so carts round-trip through JSON without losing entree details
+AnyCartItem = Annotated[Union[CartEntree, CartSide, CartDrink], Field(discriminator="item_type")]
 
 class Cart(BaseModel):
     cart_id: str = Field(description="Unique identifier for the shopping cart")
-    items: List[CartItem] = Field(default_factory=list, description="List of items in the cart")
+    store_id: str = Field(default="default", description="ID of the store whose menu the cart is ordered from")
+    items: List[AnyCartItem] = Field(default_factory=list, description="List of items in the cart")
+    total_price: float = Field(default=0.0, description="Running total price of the items in the cart")
 
 class Order(BaseModel):
     order_id: str = Field(description="Unique identifier for the order")
     cart_id: str = Field(description="ID of the cart that was used to create this order")
-    items: List[CartItem] = Field(description="List of items in the order (could be a copy of the cart items or more detailed)")
+    items: List[AnyCartItem] = Field(description="List of items in the order (could be a copy of the cart items or more detailed)")
     total_price: float = Field(description="Total price of the order")
     customer_name: Optional[str] = Field(default=None, description="Name of the customer placing the order")
+    store_id: str = Field(default="default", description="ID of the store the order is placed at")
+    menu_version: Optional[str] = Field(default=None, description="Version of the menu the order was priced with")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), description="When the order was placed")
 
 class MenuItem(BaseModel):
     id: str = Field(description="Unique identifier for the menu item. This is often reffered to as menu_item_id.")
@@ -70,4 +68,64 @@ class Menu(BaseModel):
     drinks: List[MenuItem] = Field(default_factory=list, description="List of drink menu items (e.g., fountain_small, bottled_water)")
 
 class MenuItems(BaseModel):
-    items: Dict[str, MenuItem] = Field(default_factory=dict, description="Dictionary of menu items with their IDs as keys")
\ No newline at end of file
+    items: Dict[str, MenuItem] = Field(default_factory=dict, description="Dictionary of menu items with their IDs as keys")
+
+class EntreeSpec(BaseModel):
+    menu_item_id: str = Field(description="ID of the entree (e.g., 'burrito', 'tacos')")
+    protein_ids: List[str] = Field(default_factory=list, description="IDs of the selected proteins. The first one is the entree's protein, any further ones are added as double protein toppings")
+    toppings: List[str] = Field(default_factory=list, description="List of IDs of selected toppings")
+    special_configurations: Optional[Dict[str, str]] = Field(default=None, description="Special configurations for the entree (e.g., {'taco_type': 'corn'})")
+    quantity: int = Field(default=1, ge=1, le=20, description="Number of identical entrees to add")
+
+class AddItemOperation(BaseModel):
+    op: Literal["add_item"] = "add_item"
+    item_type: Literal["entree", "side", "drink"] = Field(description="Type of the item to add")
+    menu_item_id: str = Field(description="ID of the menu item to add")
+
+class AddEntreeOperation(BaseModel):
+    op: Literal["add_entree"] = "add_entree"
+    entree: EntreeSpec = Field(description="Fully configured entree to add")
+
+class RemoveItemOperation(BaseModel):
+    op: Literal["remove_item"] = "remove_item"
+    item_id: int = Field(description="Item ID of the item to remove")
+
+class AddToppingOperation(BaseModel):
+    op: Literal["add_topping"] = "add_topping"
+    item_id: int = Field(description="Item ID of the entree")
+    topping_id: str = Field(description="ID of the topping to add")
+
+class RemoveToppingOperation(BaseModel):
+    op: Literal["remove_topping"] = "remove_topping"
+    item_id: int = Field(description="Item ID of the entree")
+    topping_id: str = Field(description="ID of the topping to remove")
+
+class SetProteinOperation(BaseModel):
+    op: Literal["set_protein"] = "set_protein"
+    item_id: int = Field(description="Item ID of the entree")
+    protein_id: str = Field(description="ID of the protein")
+
+class SetSpecialConfigurationsOperation(BaseModel):
+    op: Literal["set_special_configurations"] = "set_special_configurations"
+    item_id: int = Field(description="Item ID of the entree")
+    special_configurations: Dict[str, str] = Field(description="Special configurations for the entree (e.g., {'taco_type': 'corn'})")
+
+# Any single cart mutation, discriminated by op so a list of them can be applied as one batch
+CartOperation = Annotated[
+    Union[
+        AddItemOperation,
+        AddEntreeOperation,
+        RemoveItemOperation,
+        AddToppingOperation,
+        RemoveToppingOperation,
+        SetProteinOperation,
+        SetSpecialConfigurationsOperation,
+    ],
+    Field(discriminator="op"),
+]
+
+class CartOperationsResult(BaseModel):
+    applied: bool = Field(description="Whether the operations were applied. Either all of them are, or none")
+    item_ids: List[List[int]] = Field(default_factory=list, description="Item IDs of the cart items affected by each operation, in order")
+    errors: List[str] = Field(default_factory=list, description="Why the operations were rejected, if they were")
+    total_price: Optional[float] = Field(default=None, description="Total price of the cart after the operations were applied")
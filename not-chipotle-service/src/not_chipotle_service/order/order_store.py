@@ -0,0 +1,102 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+from not_chipotle_service.order.models import Order
+from not_chipotle_service.sqlite_db import SQLiteDatabase
+
+
+class OrderStore(ABC):
+    """
+    Storage backend for placed orders.
+    Orders are saved in batches, and saving an order that is already stored must be a no-op, so a batch can be retried
+    after a failure without duplicating orders.
+    """
+
+    @abstractmethod
+    async def save(self, orders: Sequence[Order]) -> None:
+        """Stores a batch of orders, all together or not at all."""
+
+    @abstractmethod
+    async def get(self, order_id: str) -> Optional[Order]:
+        """Returns the order with the given ID, or None if it isn't stored."""
+
+    async def close(self) -> None:
+        """Releases any resources held by the store."""
+
+
+class InMemoryOrderStore(OrderStore):
+    """Keeps the most recent orders in process memory, for development and tests."""
+
+    def __init__(self, max_orders: int = 100_000):
+        if max_orders <= 0:
+            raise ValueError(f"max_orders must be positive, got {max_orders}.")
+        self.max_orders = max_orders
+        self._orders: OrderedDict[str, Order] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    async def save(self, orders: Sequence[Order]) -> None:
+        for order in orders:
+            self._orders.setdefault(order.order_id, order)
+        while len(self._orders) > self.max_orders:
+            self._orders.popitem(last=False)
+
+    async def get(self, order_id: str) -> Optional[Order]:
+        return self._orders.get(order_id)
+
+
+class SQLiteOrderStore(OrderStore):
+    """Durable order store backed by SQLite. Every batch is inserted in a single transaction by a worker thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = SQLiteDatabase(
+            path,
+            """
+            CREATE TABLE IF NOT EXISTS orders (
+                order_id TEXT PRIMARY KEY,
+                cart_id TEXT NOT NULL,
+                store_id TEXT NOT NULL,
+                total_price REAL NOT NULL,
+                created_at TEXT NOT NULL,
+                data TEXT NOT NULL
+            )
+            """,
+        )
+
+    def _write_rows(self, rows: List[Tuple[str, str, str, float, str, str]]) -> None:
+        self._db.write_many(
+            """
+            INSERT INTO orders (order_id, cart_id, store_id, total_price, created_at, data)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(order_id) DO NOTHING
+            """,
+            rows,
+        )
+
+    def _read_row(self, order_id: str) -> Optional[Tuple[str]]:
+        return self._db.fetch_one("SELECT data FROM orders WHERE order_id = ?", (order_id,))
+
+    async def save(self, orders: Sequence[Order]) -> None:
+        rows = [
+            (
+                order.order_id,
+                order.cart_id,
+                order.store_id,
+                order.total_price,
+                order.created_at.isoformat(),
+                order.model_dump_json(),
+            )
+            for order in orders
+        ]
+        await asyncio.to_thread(self._write_rows, rows)
+
+    async def get(self, order_id: str) -> Optional[Order]:
+        row = await asyncio.to_thread(self._read_row, order_id)
+        return Order.model_validate_json(row[0]) if row is not None else None
+
+    async def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,133 @@
+from typing import TYPE_CHECKING, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+from not_chipotle_service.order.compact_cart import CompactCart, CompactCartItem
+from not_chipotle_service.order.menu_index import MENU_CATEGORIES, MenuIndex
+from not_chipotle_service.order.models import Cart, CartItem, Order
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def round_price(price: float) -> float:
+    """Rounds a price to cents, keeping running totals free of floating point drift."""
+    # Adding 0.0 turns a negative zero left by subtractions into a plain zero
+    return round(price, 2) + 0.0
+
+
+# A cart item either as held by a live cart or as its pydantic model
+AnyItem = Union[CompactCartItem, CartItem]
+
+
+def price_cart_item(menu_index: MenuIndex, item: AnyItem) -> float:
+    """Returns the price of a single cart item, including the protein and toppings of entrees."""
+    price = menu_index.price_of(item.item_type, item.menu_item_id)
+    if item.item_type == "entree":
+        if item.protein_id:
+            price += menu_index.price_of("protein", item.protein_id)
+        for topping_id in item.toppings:
+            price += menu_index.price_of("topping", topping_id)
+    return round_price(price)
+
+
+def price_items(menu_index: MenuIndex, items: Iterable[AnyItem]) -> float:
+    """Prices a list of cart items from scratch."""
+    return round_price(sum(price_cart_item(menu_index, item) for item in items))
+
+
+def price_known_items(menu_index: MenuIndex, items: Iterable[AnyItem]) -> float:
+    """Prices a list of cart items from scratch, leaving out the items that aren't on the menu."""
+    total = 0.0
+    for item in items:
+        try:
+            total += price_cart_item(menu_index, item)
+        except KeyError:
+            continue
+    return round_price(total)
+
+
+def adjust_cart_total(cart: CompactCart, delta: float) -> None:
+    """Applies a price change to the running total of the cart."""
+    cart.total_price = round_price(cart.total_price + delta)
+
+
+def recompute_cart_total(cart: CompactCart, menu_index: MenuIndex) -> float:
+    """Recomputes the cart total from scratch, e.g. after loading a cart priced with another menu version."""
+    cart.total_price = price_items(menu_index, cart)
+    return cart.total_price
+
+
+PricedItems = Union[CompactCart, Cart, Order, Sequence[AnyItem]]
+
+
+class BulkPricer:
+    """
+    Vectorized pricing of many carts or orders at once with NumPy, for end-of-day reconciliation and what-if analysis.
+    Carts are encoded into a matrix counting how many of each menu item (entrees, proteins, toppings, sides and drinks)
+    they contain, so pricing them under any price vector is a single matrix product.
+    NumPy is an optional dependency (the bulk extra), only imported when a BulkPricer is created.
+    """
+
+    def __init__(self, menu_index: MenuIndex):
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise ImportError(
+                "BulkPricer requires NumPy, install the bulk extra with 'pip install not-chipotle-service[bulk]'."
+            ) from e
+
+        self._np = np
+        self.menu_index = menu_index
+        self.columns: Dict[Tuple[str, str], int] = {}
+        prices: List[float] = []
+        for item_type in MENU_CATEGORIES:
+            for item_id, price in menu_index.categories[item_type].prices.items():
+                self.columns[(item_type, item_id)] = len(prices)
+                prices.append(price)
+        self.prices = np.asarray(prices, dtype=np.float64)
+
+    def _column(self, item_type: str, item_id: str) -> int:
+        column = self.columns.get((item_type, item_id))
+        if column is None:
+            raise ValueError(f"{item_type.capitalize()} with ID '{item_id}' not found in the menu.")
+        return column
+
+    def price_vector(self, overrides: Optional[Mapping[Tuple[str, str], float]] = None) -> "np.ndarray":
+        """Returns the menu prices as a vector, with some of them replaced, e.g. {('topping', 'guacamole'): 1.75}."""
+        prices = self.prices.copy()
+        for (item_type, item_id), price in (overrides or {}).items():
+            prices[self._column(item_type, item_id)] = price
+        return prices
+
+    def encode(self, carts: Iterable[PricedItems]) -> "np.ndarray":
+        """Encodes carts, orders or lists of cart items into a (carts x menu items) matrix of counts."""
+        np = self._np
+        rows: List[int] = []
+        columns: List[int] = []
+        row = -1
+        for row, cart in enumerate(carts):
+            items = cart.items if isinstance(cart, (Cart, Order)) else cart
+            for item in items:
+                rows.append(row)
+                columns.append(self._column(item.item_type, item.menu_item_id))
+                if item.item_type == "entree":
+                    if item.protein_id:
+                        rows.append(row)
+                        columns.append(self._column("protein", item.protein_id))
+                    for topping_id in item.toppings:
+                        rows.append(row)
+                        columns.append(self._column("topping", topping_id))
+
+        # Count (cart, menu item) pairs in one pass over their flattened positions
+        n_carts, n_items = row + 1, len(self.prices)
+        flat_positions = np.asarray(rows, dtype=np.intp) * n_items + np.asarray(columns, dtype=np.intp)
+        counts = np.bincount(flat_positions, minlength=n_carts * n_items)
+        return counts.reshape(n_carts, n_items).astype(np.int32, copy=False)
+
+    def totals(self, counts: "np.ndarray", prices: Optional["np.ndarray"] = None) -> "np.ndarray":
+        """Returns the total of every encoded cart, under the menu prices or the given price vector."""
+        prices = self.prices if prices is None else prices
+        return self._np.round(counts @ prices, 2)
+
+    def what_if(self, counts: "np.ndarray", price_scenarios: "np.ndarray") -> "np.ndarray":
+        """Prices every encoded cart under several price vectors at once, returning a (carts x scenarios) matrix."""
+        return self._np.round(counts @ self._np.atleast_2d(price_scenarios).T, 2)
@@ -1,36 +1,58 @@
-import functools
-import json
+import glob
 import os
-from typing import Dict, Tuple
-from not_chipotle_service.order.models import Menu, MenuItem
+from typing import List, Optional, Tuple
+from not_chipotle_service.order.menu_index import MenuIndex
+from not_chipotle_service.order.menu_snapshot import read_snapshot, write_snapshot
+from not_chipotle_service.order.models import Menu
 from pydantic import TypeAdapter
 
 
-@functools.cache
-def load_menu() -> Tuple[Menu, Dict[str, MenuItem]]:
-    """Load the menu from the JSON file"""
-    menu_file_path = os.path.join(
-        os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-        "..",
-        "config",
-        "menu.json",
-    )
-    with open(menu_file_path, "r") as f:
-        menu_data = json.load(f)
-    menu_adapter = TypeAdapter(Menu)
-    menu = menu_adapter.validate_python(menu_data)
-
-    # Create a dictionary of menu items for easy access
-    menu_items_dict = {}
-    for item in menu.entrees:
-        menu_items_dict[f"{item.type}|{item.id}"] = item
-    for item in menu.proteins:
-        menu_items_dict[f"{item.type}|{item.id}"] = item
-    for item in menu.toppings:
-        menu_items_dict[f"{item.type}|{item.id}"] = item
-    for item in menu.sides:
-        menu_items_dict[f"{item.type}|{item.id}"] = item
-    for item in menu.drinks:
-        menu_items_dict[f"{item.type}|{item.id}"] = item
-
-    return menu, menu_items_dict
\ No newline at end of file
+# Directory holding menu.json, the menu of the default store, and menus/<store_id>.json for every other store
+MENU_CONFIG_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    "..",
+    "config",
+)
+
+_menu_adapter = TypeAdapter(Menu)
+
+
+def _index_menu(source: bytes) -> MenuIndex:
+    """Helper function validating a menu from its JSON source and indexing it."""
+    menu = _menu_adapter.validate_json(source)
+
+    # Build the lookup index once so cart operations never scan the menu lists
+    return MenuIndex.from_menu(menu)
+
+
+def load_menu(menu_file_path: Optional[str] = None, use_snapshot: bool = True) -> Tuple[Menu, MenuIndex]:
+    """
+    Load a menu from a JSON file, the default store's menu unless a path is given.
+    A snapshot built from the same JSON by build_menu_snapshots() is loaded instead when there is one, skipping
+    validation and indexing.
+    """
+    if menu_file_path is None:
+        menu_file_path = os.path.join(MENU_CONFIG_DIR, "menu.json")
+    with open(menu_file_path, "rb") as f:
+        source = f.read()
+
+    menu_index = read_snapshot(menu_file_path, source) if use_snapshot else None
+    if menu_index is None:
+        menu_index = _index_menu(source)
+
+    return menu_index.menu, menu_index
+
+
+def build_menu_snapshots(config_dir: str = MENU_CONFIG_DIR) -> List[str]:
+    """Validates every menu of the config directory and writes its snapshot, returning the snapshot paths."""
+    menu_file_paths = [os.path.join(config_dir, "menu.json")]
+    menu_file_paths += sorted(glob.glob(os.path.join(config_dir, "menus", "*.json")))
+
+    snapshot_paths = []
+    for menu_file_path in menu_file_paths:
+        if not os.path.exists(menu_file_path):
+            continue
+        with open(menu_file_path, "rb") as f:
+            source = f.read()
+        snapshot_paths.append(write_snapshot(menu_file_path, source, _index_menu(source)))
+    return snapshot_paths
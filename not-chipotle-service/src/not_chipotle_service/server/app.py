@@ -0,0 +1,353 @@
+import contextlib
+import os
+from typing import AsyncIterator, Optional, Tuple
+
+from dotenv import load_dotenv
+import not_chipotle_service.telemetry as telemetry
+from not_chipotle_service.agents.model_router import ModelRouter, close_http_clients
+from not_chipotle_service.agents.order_manager_agent import GREETING_PROMPT
+import not_chipotle_service.order.utils as order_utils
+from not_chipotle_service.order.checkout import CheckoutError, CheckoutPipeline
+from not_chipotle_service.order.inventory import InventoryIndex
+from not_chipotle_service.order.kitchen import InMemoryTicketSink, JSONLinesTicketSink, TicketSink
+from not_chipotle_service.order.menu_registry import DEFAULT_STORE_ID, MenuNotFoundError, MenuRegistry
+from not_chipotle_service.order.menu_render import get_compact_menu
+from not_chipotle_service.order.order_store import InMemoryOrderStore, OrderStore, SQLiteOrderStore
+from not_chipotle_service.session.manager import SessionManager
+from not_chipotle_service.session.models import Session, SessionNotFoundError
+from not_chipotle_service.session.store import InMemorySessionStore, SessionStore, SQLiteSessionStore
+from not_chipotle_service.voice.pipeline import VoicePipeline
+from not_chipotle_service.voice.recognizer import RecognizerFactory, load_recognizer_factory
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+
+async def _get_session_or_404(request: Request):
+    """Helper function to resolve the session referenced by the request path."""
+    session_manager: SessionManager = request.app.state.session_manager
+    try:
+        return await session_manager.get_session(request.path_params["session_id"])
+    except SessionNotFoundError:
+        raise HTTPException(status_code=404, detail="Session not found.")
+
+
+async def _create_session_or_404(session_manager: SessionManager, store_id: str):
+    """Helper function to start a session at the store referenced by the 'store_id' query param."""
+    try:
+        return await session_manager.create_session(store_id=store_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except MenuNotFoundError:
+        raise HTTPException(status_code=404, detail="Store not found.")
+
+
+async def create_session(request: Request) -> JSONResponse:
+    """Starts a new conversation, at the store given by the 'store_id' query param, and returns the agent's greeting."""
+    session_manager: SessionManager = request.app.state.session_manager
+    session = await _create_session_or_404(session_manager, request.query_params.get("store_id", DEFAULT_STORE_ID))
+    message = await session_manager.greet(session)
+
+    return JSONResponse({"session_id": session.session_id, "message": message}, status_code=201)
+
+
+async def _get_user_input(request: Request) -> str:
+    """Helper function to read the user message from a JSON request body."""
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body must be valid JSON.")
+    user_input = payload.get("message") if isinstance(payload, dict) else None
+    if not isinstance(user_input, str) or not user_input:
+        raise HTTPException(status_code=422, detail="Request body must contain a non-empty 'message' string.")
+    return user_input
+
+
+async def send_message(request: Request) -> JSONResponse:
+    """Sends a user message to a conversation and returns the agent's reply with the updated cart."""
+    session = await _get_session_or_404(request)
+    user_input = await _get_user_input(request)
+
+    message = await request.app.state.session_manager.send_message(session, user_input)
+
+    return JSONResponse({"message": message, "cart": session.cart.to_model().model_dump(mode="json")})
+
+
+async def stream_message(request: Request) -> StreamingResponse:
+    """
+    Sends a user message to a conversation and streams the turn back as server-sent events.
+    Every event is named after its type ('text_delta', 'cart_updated' or 'turn_completed') and carries the event as
+    JSON, the reply text as it is generated and the cart every time it changes.
+    """
+    session = await _get_session_or_404(request)
+    user_input = await _get_user_input(request)
+    session_manager: SessionManager = request.app.state.session_manager
+
+    async def event_stream():
+        async for event in session_manager.stream_message(session, user_input):
+            yield f"event: {event.type}\ndata: {event.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream, which would defeat its purpose
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def view_cart(request: Request) -> JSONResponse:
+    """Returns the current cart of a conversation."""
+    session = await _get_session_or_404(request)
+
+    return JSONResponse(session.cart.to_model().model_dump(mode="json"))
+
+
+async def checkout(request: Request) -> JSONResponse:
+    """Places an order for the cart of a conversation, with an optional 'customer_name' in the JSON body."""
+    session = await _get_session_or_404(request)
+    customer_name = None
+    if await request.body():
+        try:
+            payload = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body must be valid JSON.")
+        customer_name = payload.get("customer_name") if isinstance(payload, dict) else None
+        if customer_name is not None and not isinstance(customer_name, str):
+            raise HTTPException(status_code=422, detail="'customer_name' must be a string.")
+
+    try:
+        order = await request.app.state.session_manager.checkout(session, customer_name)
+    except CheckoutError as e:
+        return JSONResponse({"detail": "The cart can't be checked out.", "errors": e.errors}, status_code=422)
+
+    return JSONResponse(order.model_dump(mode="json"), status_code=201)
+
+
+async def close_session(request: Request) -> Response:
+    """Ends a conversation and discards its state."""
+    session = await _get_session_or_404(request)
+    await request.app.state.session_manager.close_session(session.session_id)
+
+    return Response(status_code=204)
+
+
+async def view_menu(request: Request) -> Response:
+    """
+    Returns the compact menu of a store without the items it ran out of, or a single category of it, straight from the
+    cached rendering. The ETag changes with the menu and with the store's stock.
+    """
+    session_manager: SessionManager = request.app.state.session_manager
+    store_id = request.query_params.get("store_id", DEFAULT_STORE_ID)
+    try:
+        menu_index = await session_manager.menus.aget(store_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except MenuNotFoundError:
+        raise HTTPException(status_code=404, detail="Store not found.")
+
+    compact_menu = get_compact_menu(menu_index, await session_manager.inventory.aget(store_id))
+    etag = f'"{compact_menu.version}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    try:
+        content = compact_menu.data(request.query_params.get("category"))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Menu category not found.")
+
+    return Response(content, media_type="application/json", headers={"ETag": etag})
+
+
+async def _open_websocket_session(websocket: WebSocket) -> Tuple[Optional[Session], bool]:
+    """
+    Helper function resolving the session of a WebSocket connection, either the one of the 'session_id' query param
+    or a new one at the store of the 'store_id' query param. Returns the session, or None once the connection is
+    closed because it doesn't exist, and whether it is new.
+    """
+    session_manager: SessionManager = websocket.app.state.session_manager
+    session_id = websocket.query_params.get("session_id")
+    if session_id:
+        try:
+            return await session_manager.get_session(session_id), False
+        except SessionNotFoundError:
+            await websocket.close(code=4404, reason="Session not found.")
+            return None, False
+
+    try:
+        session = await session_manager.create_session(store_id=websocket.query_params.get("store_id", DEFAULT_STORE_ID))
+    except (ValueError, MenuNotFoundError):
+        await websocket.close(code=4404, reason="Store not found.")
+        return None, False
+    return session, True
+
+
+async def chat_websocket(websocket: WebSocket) -> None:
+    """
+    Full-duplex chat over a WebSocket.
+    A new session is created for every connection, at the store given by the 'store_id' query param, unless an
+    existing one is passed as the 'session_id' query param.
+    Each text frame received is one user turn, and each reply is sent back as a JSON frame. With the 'stream' query
+    param set to 'true', the greeting and each turn are instead sent back as a sequence of JSON event frames (text
+    deltas and cart updates), each ending with a 'turn_completed' event.
+    """
+    session_manager: SessionManager = websocket.app.state.session_manager
+    stream = websocket.query_params.get("stream", "").lower() in ("1", "true")
+    await websocket.accept()
+
+    session, created = await _open_websocket_session(websocket)
+    if session is None:
+        return
+    if created:
+        if stream:
+            await websocket.send_json({"session_id": session.session_id})
+            async for event in session_manager.stream_message(session, GREETING_PROMPT):
+                await websocket.send_text(event.model_dump_json())
+        else:
+            message = await session_manager.greet(session)
+            await websocket.send_json({"session_id": session.session_id, "message": message})
+
+    try:
+        while True:
+            user_input = await websocket.receive_text()
+            if not user_input.strip():
+                continue
+
+            if stream:
+                async for event in session_manager.stream_message(session, user_input):
+                    await websocket.send_text(event.model_dump_json())
+                continue
+
+            message = await session_manager.send_message(session, user_input)
+            await websocket.send_json(
+                {
+                    "session_id": session.session_id,
+                    "message": message,
+                    "cart": session.cart.to_model().model_dump(mode="json"),
+                }
+            )
+    except WebSocketDisconnect:
+        # Keep the session around so the client can reconnect with its session_id
+        return
+
+
+async def _receive_audio(websocket: WebSocket) -> AsyncIterator[bytes]:
+    """Helper function yielding the binary frames of a WebSocket as audio, until a text frame."""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        if message.get("bytes") is None:
+            return
+        yield message["bytes"]
+
+
+async def voice_websocket(websocket: WebSocket) -> None:
+    """
+    Voice conversation over a WebSocket, e.g. from a drive-thru lane.
+    Sessions are opened like with the chat WebSocket. The client streams binary frames of 16 kHz 16-bit mono PCM,
+    and gets back JSON event frames: the greeting of new sessions, then for every utterance its partial transcripts
+    and the menu items recognized while it is spoken, its final transcript and the events of the turn it starts.
+    A text frame ends the audio stream, and the connection closes once the last utterance is answered.
+    """
+    recognizer_factory: Optional[RecognizerFactory] = websocket.app.state.recognizer_factory
+    session_manager: SessionManager = websocket.app.state.session_manager
+    await websocket.accept()
+    if recognizer_factory is None:
+        await websocket.close(code=4501, reason="No speech recognizer is configured.")
+        return
+
+    session, created = await _open_websocket_session(websocket)
+    if session is None:
+        return
+    await websocket.send_json({"session_id": session.session_id})
+    if created:
+        async for event in session_manager.stream_message(session, GREETING_PROMPT):
+            await websocket.send_text(event.model_dump_json())
+
+    recognizer = recognizer_factory()
+    pipeline = VoicePipeline(session_manager, recognizer)
+    try:
+        async for event in pipeline.run(session, _receive_audio(websocket)):
+            await websocket.send_text(event.model_dump_json())
+        await websocket.close()
+    except WebSocketDisconnect:
+        # Keep the session around so the client can reconnect with its session_id
+        return
+    finally:
+        await recognizer.close()
+
+
+def _create_session_store() -> SessionStore:
+    """Uses SQLite when NOT_CHIPOTLE_SESSION_DB points to a database file, otherwise keeps sessions in memory."""
+    session_db_path = os.getenv("NOT_CHIPOTLE_SESSION_DB")
+    if session_db_path:
+        return SQLiteSessionStore(session_db_path)
+    return InMemorySessionStore()
+
+
+def _create_checkout_pipeline() -> CheckoutPipeline:
+    """
+    Persists orders to SQLite when NOT_CHIPOTLE_ORDER_DB points to a database file, and appends kitchen tickets to
+    the JSON Lines file NOT_CHIPOTLE_KITCHEN_TICKETS points to. Both are kept in memory otherwise.
+    """
+    order_db_path = os.getenv("NOT_CHIPOTLE_ORDER_DB")
+    order_store: OrderStore = SQLiteOrderStore(order_db_path) if order_db_path else InMemoryOrderStore()
+    tickets_path = os.getenv("NOT_CHIPOTLE_KITCHEN_TICKETS")
+    ticket_sink: TicketSink = JSONLinesTicketSink(tickets_path) if tickets_path else InMemoryTicketSink()
+    return CheckoutPipeline(order_store, ticket_sink)
+
+
+def create_app(
+    session_manager: Optional[SessionManager] = None, recognizer_factory: Optional[RecognizerFactory] = None
+) -> Starlette:
+    """
+    Creates the ASGI application serving concurrent ordering conversations, e.g. with
+    'uvicorn --factory not_chipotle_service.server.app:create_app', so nothing is set up by importing this module.
+    Voice conversations use the given speech recognizer factory, or the one NOT_CHIPOTLE_RECOGNIZER points to as
+    '<module>:<callable>', and are turned down without one.
+    """
+    # Load environment variables from .env file, for when uvicorn calls the factory directly
+    load_dotenv()
+    if recognizer_factory is None and os.getenv("NOT_CHIPOTLE_RECOGNIZER"):
+        recognizer_factory = load_recognizer_factory(os.environ["NOT_CHIPOTLE_RECOGNIZER"])
+    if session_manager is None:
+        session_manager = SessionManager(
+            MenuRegistry(os.getenv("NOT_CHIPOTLE_MENU_DIR", order_utils.MENU_CONFIG_DIR)),
+            store=_create_session_store(),
+            checkout=_create_checkout_pipeline(),
+            menu_in_system_prompt=os.getenv("NOT_CHIPOTLE_MENU_IN_SYSTEM_PROMPT", "").lower() in ("1", "true"),
+            model=ModelRouter.from_env(),
+            inventory=InventoryIndex.from_env(),
+        )
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette):
+        telemetry.configure()
+        # Load the default store's menu before taking traffic, other stores are loaded on first use
+        await session_manager.menus.aget()
+        yield
+        # Drain queued orders and flush pending session writes before the worker exits
+        await session_manager.close()
+        await close_http_clients()
+
+    app = Starlette(
+        lifespan=lifespan,
+        routes=[
+            Route("/menu", view_menu, methods=["GET"]),
+            Route("/sessions", create_session, methods=["POST"]),
+            Route("/sessions/{session_id}/messages", send_message, methods=["POST"]),
+            Route("/sessions/{session_id}/messages/stream", stream_message, methods=["POST"]),
+            Route("/sessions/{session_id}/cart", view_cart, methods=["GET"]),
+            Route("/sessions/{session_id}/checkout", checkout, methods=["POST"]),
+            Route("/sessions/{session_id}", close_session, methods=["DELETE"]),
+            WebSocketRoute("/sessions/ws", chat_websocket),
+            WebSocketRoute("/sessions/voice", voice_websocket),
+        ]
+    )
+    app.state.session_manager = session_manager
+    app.state.recognizer_factory = recognizer_factory
+
+    return app
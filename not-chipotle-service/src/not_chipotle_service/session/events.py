@@ -0,0 +1,25 @@
+from typing import Annotated, Literal, Union
+
+from not_chipotle_service.order.models import Cart
+from pydantic import BaseModel, Field
+
+
+class TextDeltaEvent(BaseModel):
+    """A chunk of the agent's reply, forwarded as soon as the model produces it."""
+    type: Literal["text_delta"] = "text_delta"
+    text: str = Field(description="Text to append to the reply shown so far")
+
+class CartUpdatedEvent(BaseModel):
+    """Snapshot of the cart taken right after a tool (or the fast path) changed it."""
+    type: Literal["cart_updated"] = "cart_updated"
+    tool_name: str = Field(description="Name of the tool that changed the cart, 'fast_path' for deterministic turns")
+    cart: Cart = Field(description="The cart after the change")
+
+class TurnCompletedEvent(BaseModel):
+    """Last event of a turn, carrying the full reply and the final cart."""
+    type: Literal["turn_completed"] = "turn_completed"
+    message: str = Field(description="The agent's full reply")
+    cart: Cart = Field(description="The cart at the end of the turn")
+
+# Any event streamed during a turn, discriminated by type so clients can dispatch on it
+TurnEvent = Annotated[Union[TextDeltaEvent, CartUpdatedEvent, TurnCompletedEvent], Field(discriminator="type")]
@@ -0,0 +1,363 @@
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, List, Optional
+
+import logfire
+import not_chipotle_service.telemetry as telemetry
+from not_chipotle_service.agents.fast_path import FastPathParser, apply_operations
+from not_chipotle_service.agents.history import HistoryCompactor
+from not_chipotle_service.agents.response_cache import ResponseCache, is_cacheable_turn
+from not_chipotle_service.agents.order_manager_agent import (
+    CART_MUTATING_TOOLS,
+    GREETING_PROMPT,
+    OrderManagerAgentDeps,
+    order_manager_agent,
+)
+from not_chipotle_service.order.checkout import CheckoutPipeline
+from not_chipotle_service.order.inventory import InventoryIndex, StoreStock
+from not_chipotle_service.order.menu_index import MenuIndex
+from not_chipotle_service.order.menu_registry import DEFAULT_STORE_ID, MenuRegistry
+from not_chipotle_service.order.compact_cart import CompactCart
+from not_chipotle_service.order.models import Order
+from not_chipotle_service.order.pricing import recompute_cart_total
+from not_chipotle_service.session.events import CartUpdatedEvent, TextDeltaEvent, TurnCompletedEvent, TurnEvent
+from not_chipotle_service.session.models import Session, SessionNotFoundError
+from not_chipotle_service.session.store import InMemorySessionStore, SessionStore
+from pydantic_ai import Agent
+from pydantic_ai.models import Model
+from pydantic_ai.messages import (
+    FunctionToolResultEvent,
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    PartDeltaEvent,
+    PartStartEvent,
+    TextPart,
+    TextPartDelta,
+    UserPromptPart,
+)
+from pydantic_ai.usage import Usage
+
+
+class SessionManager:
+    """
+    Hosts many concurrent conversations on a single event loop.
+    Turns of different sessions interleave freely while turns of the same session are serialized by the session's
+    lock, so concurrent requests never mutate the same cart at once. Sessions live in a pluggable SessionStore, and
+    their chat history is compacted after every turn to keep prompt size bounded. Simple cart commands are handled by
+    a deterministic fast path without calling the model at all, and repeated menu questions are answered from a
+    response cache. Each session orders from its store's menu, taken from the MenuRegistry at the start of every turn
+    so menu updates apply from the next turn on. Items a store runs out of, according to the InventoryIndex, can't be
+    added to carts or checked out and are left out of the menu shown to the agent. Turns run on the given model, e.g. a
+    ModelRouter, or on the agent's own model by default. Checked out carts are handed to a CheckoutPipeline, which persists
+    the orders and sends them to the kitchen in the background.
+    """
+
+    def __init__(
+        self,
+        menus: MenuRegistry,
+        store: Optional[SessionStore] = None,
+        checkout: Optional[CheckoutPipeline] = None,
+        history_compactor: Optional[HistoryCompactor] = None,
+        menu_in_system_prompt: bool = False,
+        fast_path: bool = True,
+        response_cache: bool = True,
+        model: Optional[Model] = None,
+        inventory: Optional[InventoryIndex] = None,
+    ):
+        self.menus = menus
+        self.inventory = inventory if inventory is not None else InventoryIndex()
+        self.store = store if store is not None else InMemorySessionStore()
+        self.checkout_pipeline = checkout if checkout is not None else CheckoutPipeline()
+        self.history_compactor = history_compactor if history_compactor is not None else HistoryCompactor()
+        self.menu_in_system_prompt = menu_in_system_prompt
+        self.fast_path = fast_path
+        self.model = model
+        # Fast path parsers by menu version, following the menus kept loaded by the registry
+        self._fast_path_parsers: OrderedDict[str, FastPathParser] = OrderedDict()
+        self.response_cache = ResponseCache() if response_cache else None
+        if self.response_cache is not None:
+            self.menus.add_reload_listener(self._invalidate_responses)
+
+    async def create_session(self, session_id: Optional[str] = None, store_id: str = DEFAULT_STORE_ID) -> Session:
+        """Creates a new session with an empty cart. Raises MenuNotFoundError if the store has no menu."""
+        menu_index = await self.menus.aget(store_id)
+        session_id = session_id or uuid.uuid4().hex
+        session = Session(
+            session_id=session_id,
+            cart=CompactCart(cart_id=f"cart_{session_id}", store_id=store_id),
+            menu_index=menu_index,
+        )
+        await self.store.put(session)
+        return session
+
+    async def get_session(self, session_id: str) -> Session:
+        """Returns a live session or raises SessionNotFoundError."""
+        session = await self.store.get(session_id)
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        if session.menu_index is None:
+            # Sessions restored from a durable store come back without their menu, move them onto the current one
+            await self._refresh_menu(session)
+        return session
+
+    async def close_session(self, session_id: str) -> None:
+        """Drops a session and its state."""
+        await self.store.delete(session_id)
+
+    async def close(self) -> None:
+        """
+        Stops watching menu files and the stock feed, drains the checkout queue, then flushes and releases the session
+        store.
+        """
+        await self.menus.close()
+        await self.inventory.close()
+        await self.checkout_pipeline.close()
+        await self.store.close()
+
+    async def greet(self, session: Session) -> str:
+        """Asks the agent for the opening message of a conversation."""
+        return await self.send_message(session, GREETING_PROMPT)
+
+    async def send_message(self, session: Session, user_input: str) -> str:
+        """Runs one conversational turn for a session and returns the agent's reply."""
+        async with session.lock:
+            start = time.perf_counter()
+            menu_index = await self._refresh_menu(session)
+            stock = await self.inventory.aget(session.cart.store_id)
+            reply = self._try_fast_path(session, menu_index, stock, user_input)
+            if reply is not None:
+                await self._finish_turn(session, start)
+                return reply
+
+            reply = self._try_response_cache(session, menu_index, stock, user_input)
+            if reply is not None:
+                await self._finish_turn(session, start, path="response_cache")
+                return reply
+
+            result = await order_manager_agent.run(
+                user_prompt=user_input,
+                message_history=session.chat_history,
+                model=self.model,
+                deps=self._agent_deps(session, menu_index),
+            )
+            new_messages = result.new_messages()
+            session.chat_history.extend(new_messages)
+            reply = result.data
+            self._cache_response(session, menu_index, stock, user_input, new_messages, reply)
+            await self._finish_turn(session, start, new_messages, result.usage())
+            return reply
+
+    async def checkout(self, session: Session, customer_name: Optional[str] = None) -> Order:
+        """
+        Places an order for the cart of a session and gives the session a new, empty cart.
+        Raises CheckoutError if the cart is empty or has items that are no longer on the menu or out of stock.
+        """
+        async with session.lock:
+            menu_index = await self._refresh_menu(session)
+            stock = await self.inventory.aget(session.cart.store_id)
+            order = await self.checkout_pipeline.submit(session.cart, menu_index, customer_name, stock)
+
+            session.cart = CompactCart(cart_id=f"cart_{uuid.uuid4().hex}", store_id=session.cart.store_id)
+            # Let the agent know the order is placed, so it doesn't keep referring to the old cart
+            if session.chat_history:
+                self._record_exchange(
+                    session,
+                    "I'd like to check out.",
+                    f"Your order {order.order_id} is placed, the total is ${order.total_price:.2f}. Your cart is now empty.",
+                )
+                self._compact_history(session)
+            session.last_active = time.monotonic()
+            await self.store.put(session)
+            return order
+
+    async def stream_message(self, session: Session, user_input: str) -> AsyncIterator[TurnEvent]:
+        """
+        Runs one conversational turn like send_message(), yielding the reply as text deltas while the model produces
+        it and the cart every time a tool changes it. The last event is always a TurnCompletedEvent.
+        """
+        async with session.lock:
+            start = time.perf_counter()
+            menu_index = await self._refresh_menu(session)
+            stock = await self.inventory.aget(session.cart.store_id)
+            reply = self._try_fast_path(session, menu_index, stock, user_input)
+            cached_reply = self._try_response_cache(session, menu_index, stock, user_input) if reply is None else None
+            if reply is not None:
+                yield CartUpdatedEvent(tool_name="fast_path", cart=session.cart.to_model())
+                yield TextDeltaEvent(text=reply)
+                await self._finish_turn(session, start)
+            elif cached_reply is not None:
+                reply = cached_reply
+                yield TextDeltaEvent(text=reply)
+                await self._finish_turn(session, start, path="response_cache")
+            else:
+                async with order_manager_agent.iter(
+                    user_prompt=user_input,
+                    message_history=session.chat_history,
+                    model=self.model,
+                    deps=self._agent_deps(session, menu_index),
+                ) as agent_run:
+                    async for node in agent_run:
+                        if Agent.is_model_request_node(node):
+                            async with node.stream(agent_run.ctx) as response_stream:
+                                async for event in response_stream:
+                                    if isinstance(event, PartStartEvent) and isinstance(event.part, TextPart):
+                                        text = event.part.content
+                                    elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
+                                        text = event.delta.content_delta
+                                    else:
+                                        continue
+                                    if text:
+                                        yield TextDeltaEvent(text=text)
+                        elif Agent.is_call_tools_node(node):
+                            async with node.stream(agent_run.ctx) as tool_events:
+                                async for event in tool_events:
+                                    if (
+                                        isinstance(event, FunctionToolResultEvent)
+                                        and event.result.tool_name in CART_MUTATING_TOOLS
+                                    ):
+                                        yield CartUpdatedEvent(
+                                            tool_name=event.result.tool_name, cart=session.cart.to_model()
+                                        )
+
+                new_messages = agent_run.result.new_messages()
+                session.chat_history.extend(new_messages)
+                reply = agent_run.result.data
+                self._cache_response(session, menu_index, stock, user_input, new_messages, reply)
+                await self._finish_turn(session, start, new_messages, agent_run.usage())
+
+            yield TurnCompletedEvent(message=reply, cart=session.cart.to_model())
+
+    def _agent_deps(self, session: Session, menu_index: MenuIndex) -> OrderManagerAgentDeps:
+        return OrderManagerAgentDeps(
+            cart=session.cart,
+            menu_index=menu_index,
+            menu_in_system_prompt=self.menu_in_system_prompt,
+            inventory=self.inventory,
+        )
+
+    async def _finish_turn(
+        self,
+        session: Session,
+        start: float,
+        new_messages: Optional[List[ModelMessage]] = None,
+        usage: Optional[Usage] = None,
+        path: Optional[str] = None,
+    ) -> None:
+        """Helper function to record, compact and store a session once its turn is over."""
+        telemetry.record_turn(
+            session.session_id,
+            duration_ms=(time.perf_counter() - start) * 1000,
+            cart_size=len(session.cart),
+            new_messages=new_messages,
+            usage=usage,
+            path=path,
+        )
+        self._compact_history(session)
+        session.last_active = time.monotonic()
+
+        # Stores may defer the write, so this never blocks the turn on disk I/O
+        await self.store.put(session)
+
+    async def _refresh_menu(self, session: Session) -> MenuIndex:
+        """Helper function to move a session onto the current menu of its store, repricing its cart if it changed."""
+        menu_index = await self.menus.aget(session.cart.store_id)
+        if session.menu_index is not None and session.menu_index.version == menu_index.version:
+            return session.menu_index
+
+        try:
+            recompute_cart_total(session.cart, menu_index)
+        except KeyError:
+            # Some item in the cart is no longer on the menu, keep the menu the cart was built with
+            if session.menu_index is not None:
+                logfire.warning(
+                    "Kept menu version {version} for session {session_id}, its cart has items missing from the new menu",
+                    version=session.menu_index.version,
+                    session_id=session.session_id,
+                )
+                return session.menu_index
+
+        session.menu_index = menu_index
+        return menu_index
+
+    def _fast_path_parser(self, menu_index: MenuIndex) -> FastPathParser:
+        """Helper function to build the fast path parser of a menu version once."""
+        parser = self._fast_path_parsers.get(menu_index.version)
+        if parser is None:
+            parser = FastPathParser(menu_index)
+            self._fast_path_parsers[menu_index.version] = parser
+            if len(self._fast_path_parsers) > self.menus.max_loaded_menus:
+                self._fast_path_parsers.popitem(last=False)
+        else:
+            self._fast_path_parsers.move_to_end(menu_index.version)
+        return parser
+
+    def _try_fast_path(
+        self, session: Session, menu_index: MenuIndex, stock: StoreStock, user_input: str
+    ) -> Optional[str]:
+        """Helper function to handle a simple cart command without the agent. Returns None if the agent is needed."""
+        # The first turn always goes through the agent, since it is what puts the system prompt in the history
+        if not self.fast_path or not session.chat_history:
+            return None
+
+        operations = self._fast_path_parser(menu_index).parse(user_input)
+        if not operations:
+            return None
+
+        reply = apply_operations(session.cart, menu_index, operations, stock)
+        if reply is None:
+            # Let the agent explain what's wrong with the request, e.g. an item ID that doesn't exist or is out of stock
+            return None
+
+        self._record_exchange(session, user_input, reply)
+        return reply
+
+    def _try_response_cache(
+        self, session: Session, menu_index: MenuIndex, stock: StoreStock, user_input: str
+    ) -> Optional[str]:
+        """Helper function to answer a repeated menu question from the response cache. Returns None on a miss."""
+        # Like the fast path, the first turn goes through the agent to put the system prompt in the history
+        if self.response_cache is None or not session.chat_history:
+            return None
+
+        # Replies are cached per stock state too, so they never offer items that ran out since
+        reply = self.response_cache.get(stock.menu_version(menu_index), user_input)
+        if reply is not None:
+            self._record_exchange(session, user_input, reply)
+        return reply
+
+    def _cache_response(
+        self,
+        session: Session,
+        menu_index: MenuIndex,
+        stock: StoreStock,
+        user_input: str,
+        new_messages: List[ModelMessage],
+        reply: str,
+    ) -> None:
+        """
+        Helper function to cache the agent's reply to a menu question, unless the turn depended on the cart or the
+        store's stock changed while the agent was answering.
+        """
+        if (
+            self.response_cache is not None
+            and is_cacheable_turn(new_messages)
+            and self.inventory.get(session.cart.store_id) is stock
+        ):
+            self.response_cache.put(stock.menu_version(menu_index), user_input, reply)
+
+    def _invalidate_responses(self, store_id: str, old_menu_index: MenuIndex, menu_index: MenuIndex) -> None:
+        """Helper function dropping the cached replies about a menu version that was just replaced."""
+        self.response_cache.invalidate(old_menu_index.version)
+
+    @staticmethod
+    def _record_exchange(session: Session, user_input: str, reply: str) -> None:
+        """Helper function to record a turn handled without the agent, so the agent sees it as part of the conversation."""
+        session.chat_history.append(ModelRequest(parts=[UserPromptPart(user_input)]))
+        session.chat_history.append(ModelResponse(parts=[TextPart(reply)]))
+
+    def _compact_history(self, session: Session) -> None:
+        """Helper function to bound the chat history of a session before it is stored and sent again."""
+        session.chat_history, stats = self.history_compactor.compact(session.chat_history, session.cart)
+        telemetry.record_history_compaction(session.session_id, stats)
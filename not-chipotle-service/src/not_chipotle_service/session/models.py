@@ -0,0 +1,25 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from not_chipotle_service.order.menu_index import MenuIndex
+from not_chipotle_service.order.compact_cart import CompactCart
+from pydantic_ai.messages import ModelMessage
+
+
+@dataclass
+class Session:
+    """A single customer conversation with its own cart and chat history."""
+
+    session_id: str
+    cart: CompactCart
+    chat_history: list[ModelMessage] = field(default_factory=list)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_active: float = field(default_factory=time.monotonic)
+    # Menu snapshot the cart is priced with, refreshed at the start of every turn and never changed during one
+    menu_index: Optional[MenuIndex] = None
+
+
+class SessionNotFoundError(KeyError):
+    """Raised when a session ID does not refer to a live session."""
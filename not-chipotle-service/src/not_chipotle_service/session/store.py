@@ -0,0 +1,288 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from not_chipotle_service.order.compact_cart import CompactCart
+from not_chipotle_service.order.models import Cart
+from not_chipotle_service.session.models import Session
+from not_chipotle_service.sqlite_db import SQLiteDatabase
+from pydantic_ai.messages import ModelMessagesTypeAdapter
+
+
+class SessionStore(ABC):
+    """
+    Storage backend for conversation sessions (cart and chat history).
+    get() must return the same Session object for as long as a session stays live in the process, since the session's
+    lock is what serializes its turns.
+    """
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[Session]:
+        """Returns the session with the given ID, or None if it doesn't exist or has expired."""
+
+    @abstractmethod
+    async def put(self, session: Session) -> None:
+        """Stores a new session or records that an existing one has changed."""
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> None:
+        """Removes a session from the store."""
+
+    async def close(self) -> None:
+        """Flushes pending writes and releases any resources held by the store."""
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Bounded in-process LRU of sessions, evicting the least recently used ones and those idle for longer than the TTL.
+    Sessions in the middle of a turn (their lock is held) are never evicted, nor are those pinned returns True for, so
+    the store can briefly hold more than max_sessions.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10_000,
+        ttl_seconds: Optional[float] = 30 * 60,
+        pinned: Optional[Callable[[Session], bool]] = None,
+    ):
+        if max_sessions <= 0:
+            raise ValueError(f"max_sessions must be positive, got {max_sessions}.")
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.pinned = pinned
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _is_expired(self, session: Session, now: float) -> bool:
+        return self.ttl_seconds is not None and now - session.last_active > self.ttl_seconds
+
+    def _is_evictable(self, session: Session) -> bool:
+        return not session.lock.locked() and (self.pinned is None or not self.pinned(session))
+
+    def _evict_expired(self, now: float) -> None:
+        """Evicts expired sessions from the cold end of the LRU."""
+        expired = []
+        for session_id, session in self._sessions.items():
+            if not self._is_expired(session, now):
+                break
+            if self._is_evictable(session):
+                expired.append(session_id)
+        for session_id in expired:
+            del self._sessions[session_id]
+
+    def get_nowait(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+
+        if self._is_expired(session, time.monotonic()) and self._is_evictable(session):
+            del self._sessions[session_id]
+            return None
+
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def put_nowait(self, session: Session) -> Optional[Session]:
+        """Stores a session and returns the session evicted to make room for it, if any."""
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+
+        self._evict_expired(time.monotonic())
+        if len(self._sessions) > self.max_sessions:
+            evicted = next(
+                (
+                    candidate
+                    for candidate in self._sessions.values()
+                    if candidate is not session and self._is_evictable(candidate)
+                ),
+                None,
+            )
+            if evicted is not None:
+                del self._sessions[evicted.session_id]
+            return evicted
+        return None
+
+    def delete_nowait(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+    async def get(self, session_id: str) -> Optional[Session]:
+        return self.get_nowait(session_id)
+
+    async def put(self, session: Session) -> None:
+        self.put_nowait(session)
+
+    async def delete(self, session_id: str) -> None:
+        self.delete_nowait(session_id)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Durable session store backed by SQLite with a write-behind queue.
+    put() only marks a session dirty, a background task serializes dirty sessions and upserts them in a single
+    transaction per batch, so conversational turns never wait on disk I/O. Live sessions are kept in an in-process LRU,
+    which makes repeat lookups free and keeps each session's lock unique within the process. Several workers can share
+    the database file as long as the load balancer keeps each session on one worker (sticky sessions).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_cached_sessions: int = 10_000,
+        ttl_seconds: Optional[float] = 24 * 60 * 60,
+        flush_interval: float = 0.05,
+        max_batch_size: int = 512,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        # Sessions waiting to be written stay cached, so get() never loads a second object for them
+        self._cache = InMemorySessionStore(
+            max_sessions=max_cached_sessions,
+            ttl_seconds=ttl_seconds,
+            pinned=lambda session: session.session_id in self._dirty,
+        )
+        self._dirty: Dict[str, Session] = {}
+        self._flush_requested = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closed = False
+        # The flusher and put() can both flush, batches must commit in the order they were serialized
+        self._flush_lock = asyncio.Lock()
+
+        self._db = SQLiteDatabase(
+            path,
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                cart TEXT NOT NULL,
+                chat_history BLOB NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """,
+        )
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop(), name="sqlite-session-store-flusher")
+
+    async def _flush_loop(self) -> None:
+        while not self._closed:
+            await self._flush_requested.wait()
+            # Let more writes pile up so they share a single transaction
+            await asyncio.sleep(self.flush_interval)
+            self._flush_requested.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Writes every dirty session to the database. Concurrent flushes run one after the other, so an older snapshot of
+        a session never commits after a newer one.
+        """
+        async with self._flush_lock:
+            while self._dirty:
+                batch_ids = list(self._dirty)[: self.max_batch_size]
+                batch = [self._dirty.pop(session_id) for session_id in batch_ids]
+
+                # Serialize on the event loop so each row is a consistent snapshot of its session
+                now = time.time()
+                rows = [
+                    (
+                        session.session_id,
+                        session.cart.to_model().model_dump_json(),
+                        ModelMessagesTypeAdapter.dump_json(session.chat_history),
+                        now,
+                    )
+                    for session in batch
+                ]
+                try:
+                    await asyncio.to_thread(self._write_rows, rows)
+                except BaseException:
+                    # Put the batch back unless the sessions were changed again in the meantime
+                    for session in batch:
+                        self._dirty.setdefault(session.session_id, session)
+                    raise
+
+    def _write_rows(self, rows: List[Tuple[str, str, bytes, float]]) -> None:
+        self._db.write_many(
+            """
+            INSERT INTO sessions (session_id, cart, chat_history, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                cart = excluded.cart,
+                chat_history = excluded.chat_history,
+                updated_at = excluded.updated_at
+            """,
+            rows,
+        )
+
+    def _read_row(self, session_id: str) -> Optional[Tuple[str, bytes, float]]:
+        return self._db.fetch_one(
+            "SELECT cart, chat_history, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+        )
+
+    def _delete_row(self, session_id: str) -> None:
+        self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    async def get(self, session_id: str) -> Optional[Session]:
+        session = self._cache.get_nowait(session_id)
+        if session is not None:
+            return session
+
+        # Sessions evicted from the cache may still be waiting to be written
+        session = self._dirty.get(session_id)
+        if session is not None:
+            self._cache.put_nowait(session)
+            return session
+
+        row = await asyncio.to_thread(self._read_row, session_id)
+        if row is None:
+            return None
+
+        cart_json, chat_history_json, updated_at = row
+        if self.ttl_seconds is not None and time.time() - updated_at > self.ttl_seconds:
+            return None
+
+        # Another coroutine may have loaded the same session while we were reading
+        session = self._cache.get_nowait(session_id)
+        if session is None:
+            session = Session(
+                session_id=session_id,
+                cart=CompactCart.from_model(Cart.model_validate_json(cart_json)),
+                chat_history=ModelMessagesTypeAdapter.validate_json(chat_history_json),
+            )
+            self._cache.put_nowait(session)
+        return session
+
+    async def put(self, session: Session) -> None:
+        if self._closed:
+            raise RuntimeError("Cannot store sessions in a closed SQLiteSessionStore.")
+
+        self._cache.put_nowait(session)
+        self._dirty[session.session_id] = session
+
+        self._ensure_flusher()
+        if len(self._dirty) >= self.max_batch_size:
+            await self.flush()
+        else:
+            self._flush_requested.set()
+
+    async def delete(self, session_id: str) -> None:
+        self._cache.delete_nowait(session_id)
+        # Wait for a flush in progress, so it can't write the session back after it is deleted
+        async with self._flush_lock:
+            self._dirty.pop(session_id, None)
+            await asyncio.to_thread(self._delete_row, session_id)
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        self._db.close()
@@ -0,0 +1,44 @@
+import sqlite3
+import threading
+from typing import Any, Iterable, Optional, Sequence, Tuple
+
+
+class SQLiteDatabase:
+    """
+    SQLite connection of a durable store, used from the worker threads doing the store's I/O.
+    The connection is shared by those threads, so access is serialized by a lock. WAL journaling lets readers work
+    alongside the writer, and several processes can share the database file.
+    """
+
+    def __init__(self, path: str, schema: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(schema)
+
+    def execute(self, sql: str, parameters: Sequence[Any] = ()) -> None:
+        """Runs a single statement in its own transaction."""
+        with self._lock:
+            self._connection.execute(sql, parameters)
+
+    def fetch_one(self, sql: str, parameters: Sequence[Any] = ()) -> Optional[Tuple]:
+        """Runs a query and returns its first row, or None if it has no rows."""
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchone()
+
+    def write_many(self, sql: str, rows: Iterable[Sequence[Any]]) -> None:
+        """Runs a statement for every row in a single transaction, writing all of the rows or none of them."""
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.executemany(sql, rows)
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
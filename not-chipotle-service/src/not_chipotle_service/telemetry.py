@@ -0,0 +1,280 @@
+import contextlib
+import contextvars
+import functools
+import os
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable, Iterator, Optional, Sequence, TypeVar
+
+import logfire
+from pydantic_ai.messages import ModelMessage, ModelResponse, RetryPromptPart
+from pydantic_ai.usage import Usage
+
+if TYPE_CHECKING:
+    from not_chipotle_service.agents.history import HistoryCompactionStats
+
+
+# Telemetry is on unless NOT_CHIPOTLE_TELEMETRY is '0' or 'false'. It is read once at import: when off, tools are
+# registered unwrapped and the recording functions return right away, so instrumentation costs nothing.
+TELEMETRY_ENABLED = os.getenv("NOT_CHIPOTLE_TELEMETRY", "1").lower() not in ("0", "false")
+
+# Instruments can be created before logfire is configured, they start exporting once it is
+_tool_duration = logfire.metric_histogram(
+    "not_chipotle.tool.duration", unit="ms", description="Duration of agent tool calls"
+)
+_validation_failures = logfire.metric_counter(
+    "not_chipotle.validation_failures",
+    unit="1",
+    description="Tool calls rejected because of invalid arguments or menu IDs (e.g., unknown topping IDs)",
+)
+_turn_duration = logfire.metric_histogram(
+    "not_chipotle.turn.duration", unit="ms", description="Duration of conversational turns"
+)
+_model_round_trips = logfire.metric_histogram(
+    "not_chipotle.turn.model_round_trips", unit="1", description="Model requests made during a turn"
+)
+_turn_tokens = logfire.metric_histogram(
+    "not_chipotle.turn.tokens", unit="1", description="Tokens used by a turn, by direction (request or response)"
+)
+_cart_size = logfire.metric_histogram(
+    "not_chipotle.cart.size", unit="1", description="Number of items in the cart at the end of a turn"
+)
+_history_tokens_saved = logfire.metric_histogram(
+    "not_chipotle.history.tokens_saved",
+    unit="1",
+    description="Estimated prompt tokens saved by compacting the chat history of a session after a turn",
+)
+_checkout_latency = logfire.metric_histogram(
+    "not_chipotle.checkout.latency",
+    unit="ms",
+    description="Time from checkout until the order is persisted and sent to the kitchen",
+)
+_checkout_batch_size = logfire.metric_histogram(
+    "not_chipotle.checkout.batch_size", unit="1", description="Number of orders persisted together"
+)
+_checkout_retries = logfire.metric_counter(
+    "not_chipotle.checkout.retries", unit="1", description="Failed attempts to persist orders or send kitchen tickets"
+)
+_response_cache_lookups = logfire.metric_counter(
+    "not_chipotle.response_cache.lookups",
+    unit="1",
+    description="Lookups of cacheable prompts in the response cache, by result (hit or miss)",
+)
+_model_latency = logfire.metric_histogram(
+    "not_chipotle.model.latency",
+    unit="ms",
+    description="Latency of the model answering a routed request, by tier and model (to the first chunk if streamed)",
+)
+_model_hedges = logfire.metric_counter(
+    "not_chipotle.model.hedges", unit="1", description="Routed requests hedged to another model for being slow"
+)
+_model_failovers = logfire.metric_counter(
+    "not_chipotle.model.failovers", unit="1", description="Routed requests failed over to another model after an error"
+)
+_voice_response_latency = logfire.metric_histogram(
+    "not_chipotle.voice.response_latency",
+    unit="ms",
+    description="Time from the end of an utterance until the first words of the reply",
+)
+_voice_dropped_frames = logfire.metric_counter(
+    "not_chipotle.voice.dropped_frames", unit="1", description="Audio frames dropped because processing fell behind"
+)
+
+ToolFunction = TypeVar("ToolFunction", bound=Callable[..., Awaitable])
+ToolDurationObserver = Callable[[str, float], None]
+
+# Called with the name and duration in milliseconds of every instrumented tool call made in the current context
+_tool_duration_observer: contextvars.ContextVar[Optional[ToolDurationObserver]] = contextvars.ContextVar(
+    "tool_duration_observer", default=None
+)
+
+
+def configure() -> None:
+    """
+    Configures logfire for the service. Spans and metrics are exported in batches by background threads, and only
+    when a logfire token is present. Console output is off unless NOT_CHIPOTLE_TELEMETRY_CONSOLE is set, since
+    writing every span to stdout would block the event loop.
+    """
+    if not TELEMETRY_ENABLED:
+        logfire.configure(send_to_logfire=False, console=False, metrics=False)
+        return
+
+    console_enabled = os.getenv("NOT_CHIPOTLE_TELEMETRY_CONSOLE", "").lower() in ("1", "true")
+    logfire.configure(send_to_logfire="if-token-present", console=None if console_enabled else False)
+
+
+def instrument_tool(function: ToolFunction) -> ToolFunction:
+    """Wraps an async agent tool in a timing span. Apply it below the agent's tool decorator."""
+    if not TELEMETRY_ENABLED:
+        return function
+
+    tool_name = function.__name__
+    attributes = {"tool_name": tool_name}
+
+    @functools.wraps(function)
+    async def instrumented(ctx, *args, **kwargs):
+        start = time.perf_counter()
+        with logfire.span("tool {tool_name}", tool_name=tool_name):
+            try:
+                return await function(ctx, *args, **kwargs)
+            finally:
+                duration = (time.perf_counter() - start) * 1000
+                _tool_duration.record(duration, attributes)
+                observer = _tool_duration_observer.get()
+                if observer is not None:
+                    observer(tool_name, duration)
+
+    return instrumented
+
+
+@contextlib.contextmanager
+def observe_tool_durations(observer: ToolDurationObserver) -> Iterator[None]:
+    """
+    Calls observer with the name and duration in milliseconds of every instrumented tool call made within the block,
+    including from tasks it starts (e.g. to collect tool latencies in benchmarks). Nothing is observed with telemetry
+    off, since tools aren't instrumented then.
+    """
+    token = _tool_duration_observer.set(observer)
+    try:
+        yield
+    finally:
+        _tool_duration_observer.reset(token)
+
+
+def record_validation_failure(tool_name: str, error: str) -> None:
+    """Counts a tool call rejected by the cart operations, logging why."""
+    if not TELEMETRY_ENABLED:
+        return
+
+    _validation_failures.add(1, {"tool_name": tool_name, "kind": "menu"})
+    logfire.warning("Tool {tool_name} rejected the call: {error}", tool_name=tool_name, error=error)
+
+
+def record_response_cache_lookup(hit: bool) -> None:
+    """Counts a lookup in the response cache, the hit rate is the share of lookups with the 'hit' result."""
+    if not TELEMETRY_ENABLED:
+        return
+
+    _response_cache_lookups.add(1, {"result": "hit" if hit else "miss"})
+
+
+def record_history_compaction(session_id: str, stats: "HistoryCompactionStats") -> None:
+    """Records the tokens saved by compacting the chat history of a session, logging the details of the pass."""
+    if not TELEMETRY_ENABLED:
+        return
+
+    _history_tokens_saved.record(stats.tokens_saved)
+    logfire.info(
+        "Compacted chat history of session {session_id}, saving {tokens_saved} tokens",
+        session_id=session_id,
+        tokens_saved=stats.tokens_saved,
+        tokens_before=stats.tokens_before,
+        tokens_after=stats.tokens_after,
+        superseded_tool_returns=stats.superseded_tool_returns,
+        summarized_turns=stats.summarized_turns,
+    )
+
+
+def record_checkout_batch(latencies_ms: Sequence[float]) -> None:
+    """Records a batch of orders that went through checkout, with the latency of each of them."""
+    if not TELEMETRY_ENABLED:
+        return
+
+    _checkout_batch_size.record(len(latencies_ms))
+    for latency_ms in latencies_ms:
+        _checkout_latency.record(latency_ms)
+
+
+def record_checkout_retry(stage: str) -> None:
+    """Counts a failed attempt of a checkout stage ('save' or 'send_tickets')."""
+    if not TELEMETRY_ENABLED:
+        return
+
+    _checkout_retries.add(1, {"stage": stage})
+
+
+def record_model_request(tier: str, model_name: str, latency_ms: float) -> None:
+    """Records the latency of the model that answered a routed request."""
+    if not TELEMETRY_ENABLED:
+        return
+
+    _model_latency.record(latency_ms, {"tier": tier, "model": model_name})
+
+
+def record_model_hedge(tier: str, model_name: str) -> None:
+    """Counts a routed request hedged because the given model was slower than usual."""
+    if not TELEMETRY_ENABLED:
+        return
+
+    _model_hedges.add(1, {"tier": tier, "model": model_name})
+
+
+def record_model_failover(tier: str, model_name: str) -> None:
+    """Counts a routed request failed over because the given model errored."""
+    if not TELEMETRY_ENABLED:
+        return
+
+    _model_failovers.add(1, {"tier": tier, "model": model_name})
+
+
+def record_voice_response_latency(latency_ms: float) -> None:
+    """Records the time from the end of an utterance until the first words of the reply."""
+    if not TELEMETRY_ENABLED:
+        return
+
+    _voice_response_latency.record(latency_ms)
+
+
+def record_voice_dropped_frames(frames: int) -> None:
+    """Counts audio frames dropped from a full ring buffer."""
+    if not TELEMETRY_ENABLED:
+        return
+
+    _voice_dropped_frames.add(frames)
+    logfire.warning("Dropped {frames} audio frames, voice processing can't keep up", frames=frames)
+
+
+def record_turn(
+    session_id: str,
+    duration_ms: float,
+    cart_size: int,
+    new_messages: Optional[Sequence[ModelMessage]] = None,
+    usage: Optional[Usage] = None,
+    path: Optional[str] = None,
+) -> None:
+    """
+    Records the metrics of a turn. Turns handled without the agent (the fast path or the response cache) have no
+    messages or usage, the path defaults to 'agent' for turns with messages and 'fast_path' for the others.
+    """
+    if not TELEMETRY_ENABLED:
+        return
+
+    if path is None:
+        path = "agent" if new_messages is not None else "fast_path"
+    attributes = {"path": path}
+    _turn_duration.record(duration_ms, attributes)
+    _cart_size.record(cart_size)
+
+    round_trips = 0
+    for message in new_messages or ():
+        if isinstance(message, ModelResponse):
+            round_trips += 1
+            continue
+        # Arguments the model got wrong (e.g., a missing field) come back to it as retry prompts
+        for part in message.parts:
+            if isinstance(part, RetryPromptPart) and part.tool_name:
+                _validation_failures.add(1, {"tool_name": part.tool_name, "kind": "arguments"})
+    _model_round_trips.record(round_trips, attributes)
+
+    if usage is not None:
+        _turn_tokens.record(usage.request_tokens or 0, {"direction": "request"})
+        _turn_tokens.record(usage.response_tokens or 0, {"direction": "response"})
+
+    logfire.info(
+        "Turn of session {session_id} took {duration_ms:.0f} ms",
+        session_id=session_id,
+        duration_ms=duration_ms,
+        path=path,
+        model_round_trips=round_trips,
+        total_tokens=usage.total_tokens if usage is not None else 0,
+        cart_size=cart_size,
+    )
@@ -0,0 +1,74 @@
+import math
+from collections import deque
+from typing import Deque, Optional
+
+
+SPEECH_START = "speech_start"
+SPEECH_END = "speech_end"
+
+
+def frame_rms(frame: memoryview) -> float:
+    """Returns the RMS level of a frame of 16-bit little-endian PCM, read in place."""
+    samples = frame.cast("h")
+    if not samples:
+        return 0.0
+    return math.sqrt(math.fsum(sample * sample for sample in samples) / len(samples))
+
+
+class EndpointDetector:
+    """
+    Energy based voice activity and endpoint detection over fixed-size frames of 16-bit PCM.
+    An utterance starts once min_speech_ms of consecutive frames are louder than threshold (an RMS level out of
+    32768), and ends after end_silence_ms of consecutive quieter frames, or after max_utterance_ms. The frames that
+    started the utterance are kept in preroll, so the recognizer also hears its first syllables.
+    """
+
+    def __init__(
+        self,
+        frame_ms: int = 20,
+        threshold: float = 500.0,
+        min_speech_ms: int = 100,
+        end_silence_ms: int = 400,
+        max_utterance_ms: int = 15_000,
+        preroll_ms: int = 300,
+    ):
+        if frame_ms <= 0:
+            raise ValueError(f"frame_ms must be positive, got {frame_ms}.")
+        self.threshold = threshold
+        self.min_speech_frames = max(min_speech_ms // frame_ms, 1)
+        self.end_silence_frames = max(end_silence_ms // frame_ms, 1)
+        self.max_utterance_frames = max(max_utterance_ms // frame_ms, 1)
+        self.in_speech = False
+        # Latest frames before the utterance was detected, they are views into the audio ring buffer
+        self.preroll: Deque[memoryview] = deque(maxlen=max(preroll_ms // frame_ms, self.min_speech_frames))
+        self._voiced_frames = 0
+        self._silent_frames = 0
+        self._utterance_frames = 0
+
+    def process(self, frame: memoryview) -> Optional[str]:
+        """Processes the next frame, returning SPEECH_START or SPEECH_END when an utterance starts or ends on it."""
+        voiced = frame_rms(frame) >= self.threshold
+        if not self.in_speech:
+            self.preroll.append(frame)
+            self._voiced_frames = self._voiced_frames + 1 if voiced else 0
+            if self._voiced_frames >= self.min_speech_frames:
+                self.in_speech = True
+                self._silent_frames = 0
+                self._utterance_frames = len(self.preroll)
+                return SPEECH_START
+            return None
+
+        self._utterance_frames += 1
+        self._silent_frames = 0 if voiced else self._silent_frames + 1
+        if self._silent_frames >= self.end_silence_frames or self._utterance_frames >= self.max_utterance_frames:
+            self.reset()
+            return SPEECH_END
+        return None
+
+    def reset(self) -> None:
+        """Forgets the current utterance, waiting for the next one."""
+        self.in_speech = False
+        self.preroll.clear()
+        self._voiced_frames = 0
+        self._silent_frames = 0
+        self._utterance_frames = 0
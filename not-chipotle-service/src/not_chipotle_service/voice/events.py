@@ -0,0 +1,25 @@
+from typing import Annotated, Literal, Union
+
+from not_chipotle_service.session.events import CartUpdatedEvent, TextDeltaEvent, TurnCompletedEvent
+from pydantic import BaseModel, Field
+
+
+class TranscriptEvent(BaseModel):
+    """Transcript of the utterance being spoken, partial until the end of the utterance is detected."""
+    type: Literal["transcript"] = "transcript"
+    text: str = Field(description="Transcript of the utterance so far")
+    is_final: bool = Field(description="Whether the utterance ended, final transcripts are sent to the agent")
+
+class MenuHintEvent(BaseModel):
+    """A menu item recognized in the utterance before it ended, e.g. to show it on a drive-thru screen early."""
+    type: Literal["menu_hint"] = "menu_hint"
+    item_type: str = Field(description="Type of the menu item")
+    menu_item_id: str = Field(description="ID of the menu item")
+    name: str = Field(description="Name of the menu item")
+    text: str = Field(description="Words of the utterance that matched the item")
+
+# Any event streamed by a voice conversation: transcripts and menu hints, then the events of each turn
+VoiceEvent = Annotated[
+    Union[TranscriptEvent, MenuHintEvent, TextDeltaEvent, CartUpdatedEvent, TurnCompletedEvent],
+    Field(discriminator="type"),
+]
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from typing import AsyncIterator, Dict, Optional
+
+import not_chipotle_service.telemetry as telemetry
+from not_chipotle_service.session.events import TextDeltaEvent
+from not_chipotle_service.session.manager import SessionManager
+from not_chipotle_service.session.models import Session
+from not_chipotle_service.order.menu_index import MenuIndex
+from not_chipotle_service.voice.endpointing import SPEECH_END, SPEECH_START, EndpointDetector
+from not_chipotle_service.voice.events import TranscriptEvent, VoiceEvent
+from not_chipotle_service.voice.recognizer import StreamingRecognizer
+from not_chipotle_service.voice.ring_buffer import AudioRingBuffer
+from not_chipotle_service.voice.speculative import SpeculativeMatcher
+
+
+# Audio of voice conversations is 16 kHz, 16-bit little-endian, mono PCM
+SAMPLE_RATE = 16_000
+SAMPLE_WIDTH = 2
+
+
+class VoicePipeline:
+    """
+    Turns a stream of PCM audio into conversational turns of a session.
+    Audio chunks are read into a ring buffer by a background task, so audio keeps flowing in real time while the
+    agent replies, and frames are taken out of it one at a time. The endpoint detector finds where utterances start
+    and end, the frames of each utterance are fed to the streaming recognizer, and every partial transcript is matched
+    against the menu right away. Once an utterance ends, its final transcript is sent to the session manager as a
+    turn. The pipeline yields the transcripts, menu hints and turn events in order. Each audio stream needs its own
+    pipeline and recognizer.
+    """
+
+    def __init__(
+        self,
+        session_manager: SessionManager,
+        recognizer: StreamingRecognizer,
+        endpoint_detector: Optional[EndpointDetector] = None,
+        frame_ms: int = 20,
+        buffer_seconds: float = 10.0,
+    ):
+        self.session_manager = session_manager
+        self.recognizer = recognizer
+        self.frame_ms = frame_ms
+        self.endpoint_detector = endpoint_detector if endpoint_detector is not None else EndpointDetector(frame_ms)
+        self.frame_size = SAMPLE_RATE * SAMPLE_WIDTH * frame_ms // 1000
+        self.ring_buffer = AudioRingBuffer(self.frame_size, max(int(buffer_seconds * 1000 / frame_ms), 2))
+        # Matchers hold per-menu lookups, so they're built once per menu version
+        self._matchers: Dict[str, SpeculativeMatcher] = {}
+
+    def _matcher(self, menu_index: MenuIndex) -> SpeculativeMatcher:
+        """Helper function returning a fresh matcher for a new utterance."""
+        matcher = self._matchers.get(menu_index.version)
+        if matcher is None:
+            matcher = SpeculativeMatcher(menu_index)
+            self._matchers = {menu_index.version: matcher}
+        return matcher.reset()
+
+    async def run(self, session: Session, audio: AsyncIterator[bytes]) -> AsyncIterator[VoiceEvent]:
+        """Runs the conversation of a session on an audio stream, until the stream ends."""
+        audio_ended = asyncio.Event()
+        audio_ready = asyncio.Event()
+
+        async def read_audio() -> None:
+            try:
+                async for chunk in audio:
+                    dropped = self.ring_buffer.write(chunk)
+                    if dropped:
+                        telemetry.record_voice_dropped_frames(dropped)
+                    audio_ready.set()
+            finally:
+                audio_ended.set()
+                audio_ready.set()
+
+        reader = asyncio.create_task(read_audio())
+        matcher: Optional[SpeculativeMatcher] = None
+        try:
+            while True:
+                frame = self.ring_buffer.read_frame()
+                if frame is None:
+                    if audio_ended.is_set():
+                        break
+                    audio_ready.clear()
+                    await audio_ready.wait()
+                    continue
+
+                endpoint = self.endpoint_detector.process(frame)
+                if endpoint == SPEECH_START:
+                    # Sessions restored from a store have no menu until their next turn, so take the store's menu
+                    matcher = self._matcher(await self.session_manager.menus.aget(session.cart.store_id))
+                    # The frames that started the utterance, this one included, were held back by the detector
+                    frames = list(self.endpoint_detector.preroll)
+                elif self.endpoint_detector.in_speech or endpoint == SPEECH_END:
+                    frames = [frame]
+                else:
+                    continue
+
+                for utterance_frame in frames:
+                    transcript = await self.recognizer.feed(utterance_frame)
+                    if transcript is not None:
+                        yield TranscriptEvent(text=transcript.text, is_final=False)
+                        for hint in matcher.update(transcript.text):
+                            yield hint
+
+                if endpoint == SPEECH_END:
+                    async for event in self._finish_utterance(session, matcher):
+                        yield event
+                    matcher = None
+
+            # Surface errors of the audio source, e.g. a closed connection, rather than acting on a cut off utterance
+            if reader.exception() is not None:
+                raise reader.exception()
+            if self.endpoint_detector.in_speech:
+                # The audio ended mid-utterance, which ends the utterance too
+                self.endpoint_detector.reset()
+                async for event in self._finish_utterance(session, matcher):
+                    yield event
+        finally:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+
+    async def _finish_utterance(self, session: Session, matcher: SpeculativeMatcher) -> AsyncIterator[VoiceEvent]:
+        """Helper function sending the final transcript of an utterance to the agent, yielding the turn's events."""
+        start = time.perf_counter()
+        transcript = await self.recognizer.finish()
+        yield TranscriptEvent(text=transcript.text, is_final=True)
+        for hint in matcher.update(transcript.text, is_final=True):
+            yield hint
+        if not transcript.text.strip():
+            return
+
+        first_reply = True
+        async for event in self.session_manager.stream_message(session, transcript.text):
+            if first_reply and isinstance(event, TextDeltaEvent):
+                # Time from the end of the utterance until the customer starts hearing back
+                telemetry.record_voice_response_latency((time.perf_counter() - start) * 1000)
+                first_reply = False
+            yield event
@@ -0,0 +1,81 @@
+import importlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence
+
+
+@dataclass(frozen=True)
+class Transcript:
+    """Transcript of the current utterance, partial while the utterance goes on and final once it ended."""
+
+    text: str
+    is_final: bool = False
+
+
+class StreamingRecognizer(ABC):
+    """
+    Speech recognizer fed one frame of 16-bit mono PCM at a time, for a single audio stream.
+    Frames are views into the pipeline's ring buffer, recognizers buffering audio of their own must copy them.
+    """
+
+    @abstractmethod
+    async def feed(self, frame: memoryview) -> Optional[Transcript]:
+        """Feeds the next frame of the current utterance, returning its partial transcript if it changed."""
+
+    @abstractmethod
+    async def finish(self) -> Transcript:
+        """Ends the current utterance and returns its final transcript, ready for the next utterance."""
+
+    async def close(self) -> None:
+        """Releases any resources held by the recognizer."""
+
+
+# Creates the recognizer of a new audio stream
+RecognizerFactory = Callable[[], StreamingRecognizer]
+
+
+class ScriptedRecognizer(StreamingRecognizer):
+    """
+    Deterministic stub recognizer for tests and demos, transcribing the utterances it is given whatever the audio.
+    Every frames_per_word frames of an utterance reveal one more word of its partial transcript, and finishing the
+    utterance returns it in full. Utterances past the end of the script are transcribed as empty.
+    """
+
+    def __init__(self, utterances: Sequence[str], frames_per_word: int = 10):
+        if frames_per_word <= 0:
+            raise ValueError(f"frames_per_word must be positive, got {frames_per_word}.")
+        self.utterances: List[str] = list(utterances)
+        self.frames_per_word = frames_per_word
+        self._utterance = 0
+        self._frames = 0
+        self._revealed = 0
+
+    def _words(self) -> List[str]:
+        return self.utterances[self._utterance].split() if self._utterance < len(self.utterances) else []
+
+    async def feed(self, frame: memoryview) -> Optional[Transcript]:
+        self._frames += 1
+        words = self._words()
+        revealed = min(self._frames // self.frames_per_word, len(words))
+        if revealed == self._revealed:
+            return None
+        self._revealed = revealed
+        return Transcript(" ".join(words[:revealed]))
+
+    async def finish(self) -> Transcript:
+        transcript = Transcript(" ".join(self._words()), is_final=True)
+        self._utterance += 1
+        self._frames = 0
+        self._revealed = 0
+        return transcript
+
+
+def load_recognizer_factory(spec: str) -> RecognizerFactory:
+    """Imports a recognizer factory given as '<module>:<callable>', e.g. 'my_asr.recognizer:create_recognizer'."""
+    module_name, _, attribute = spec.partition(":")
+    if not module_name or not attribute:
+        raise ValueError(f"Recognizer factory must be given as '<module>:<callable>', got '{spec}'.")
+    factory = getattr(importlib.import_module(module_name), attribute)
+    if not callable(factory):
+        raise ValueError(f"Recognizer factory '{spec}' is not callable.")
+    return factory
@@ -0,0 +1,70 @@
+from typing import Optional
+
+
+class AudioRingBuffer:
+    """
+    Fixed-size ring buffer of PCM audio, allocated once and split into frames of frame_size bytes.
+    Incoming chunks of any size are copied in once, and frames are read back as memoryviews into the buffer rather
+    than copies. The capacity is a whole number of frames and frames are always read from frame aligned offsets, so a
+    frame never wraps around the end of the buffer. When the reader falls behind, the oldest whole frames are dropped
+    to keep up with real time.
+    A frame read from the buffer stays valid until a full capacity worth of audio has been written after it, readers
+    keeping audio around for longer must copy it.
+    """
+
+    def __init__(self, frame_size: int, capacity_frames: int):
+        if frame_size <= 0:
+            raise ValueError(f"frame_size must be positive, got {frame_size}.")
+        if capacity_frames < 2:
+            raise ValueError(f"capacity_frames must be at least 2, got {capacity_frames}.")
+        self.frame_size = frame_size
+        self.capacity = frame_size * capacity_frames
+        self.dropped_frames = 0
+        self._buffer = bytearray(self.capacity)
+        self._view = memoryview(self._buffer)
+        # Offset of the oldest unread byte, always frame aligned, and the number of unread bytes
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def frames_available(self) -> int:
+        """Returns the number of complete frames waiting to be read."""
+        return self._size // self.frame_size
+
+    def write(self, data: bytes) -> int:
+        """Copies a chunk of audio into the buffer, returning the number of old frames dropped to make room for it."""
+        chunk = memoryview(data).cast("B")
+        length = len(chunk)
+        if length > self.capacity - self.frame_size:
+            raise ValueError(f"Audio chunk of {length} bytes doesn't fit in a ring buffer of {self.capacity} bytes.")
+
+        dropped = 0
+        overflow = self._size + length - self.capacity
+        if overflow > 0:
+            dropped = -(-overflow // self.frame_size)
+            self._start = (self._start + dropped * self.frame_size) % self.capacity
+            self._size -= dropped * self.frame_size
+            self.dropped_frames += dropped
+
+        end = (self._start + self._size) % self.capacity
+        first = min(length, self.capacity - end)
+        self._view[end : end + first] = chunk[:first]
+        self._view[: length - first] = chunk[first:]
+        self._size += length
+        return dropped
+
+    def read_frame(self) -> Optional[memoryview]:
+        """Returns the oldest complete frame as a view into the buffer, or None if there is no complete frame yet."""
+        if self._size < self.frame_size:
+            return None
+        frame = self._view[self._start : self._start + self.frame_size]
+        self._start = (self._start + self.frame_size) % self.capacity
+        self._size -= self.frame_size
+        return frame
+
+    def clear(self) -> None:
+        """Drops every unread byte."""
+        self._start = 0
+        self._size = 0
@@ -0,0 +1,46 @@
+import asyncio
+import functools
+import wave
+from typing import AsyncIterator
+
+from not_chipotle_service.voice.pipeline import SAMPLE_RATE, SAMPLE_WIDTH
+
+
+def _open_audio_file(path: str) -> wave.Wave_read:
+    """Helper function opening a WAV file, checking it holds audio in the format of voice conversations."""
+    audio_file = wave.open(path, "rb")
+    if (
+        audio_file.getnchannels() != 1
+        or audio_file.getsampwidth() != SAMPLE_WIDTH
+        or audio_file.getframerate() != SAMPLE_RATE
+    ):
+        audio_file.close()
+        raise ValueError(f"{path} must be {SAMPLE_RATE} Hz, {SAMPLE_WIDTH * 8}-bit mono PCM.")
+    return audio_file
+
+
+async def read_audio_file(path: str, chunk_ms: int = 100, realtime: bool = False) -> AsyncIterator[bytes]:
+    """
+    Reads the PCM audio of a local file in chunks of chunk_ms, from a WAV file or, for any other extension, raw 16 kHz
+    16-bit little-endian mono PCM. With realtime set, chunks come no faster than they would from a microphone.
+    """
+    chunk_size = SAMPLE_RATE * SAMPLE_WIDTH * chunk_ms // 1000
+    if path.lower().endswith(".wav"):
+        audio_file = await asyncio.to_thread(_open_audio_file, path)
+        read = functools.partial(audio_file.readframes, chunk_size // SAMPLE_WIDTH)
+    else:
+        audio_file = await asyncio.to_thread(open, path, "rb")
+        read = functools.partial(audio_file.read, chunk_size)
+
+    try:
+        while True:
+            start = asyncio.get_running_loop().time()
+            # File I/O happens in a worker thread, so a slow disk never stalls the event loop
+            chunk = await asyncio.to_thread(read)
+            if not chunk:
+                return
+            yield chunk
+            if realtime:
+                await asyncio.sleep(max(chunk_ms / 1000 - (asyncio.get_running_loop().time() - start), 0))
+    finally:
+        audio_file.close()
@@ -0,0 +1,84 @@
+from typing import List, Optional, Set, Tuple
+
+from not_chipotle_service.agents.fast_path import CATEGORY_PRIORITY
+from not_chipotle_service.order.menu_index import MenuIndex, normalize_term
+from not_chipotle_service.voice.events import MenuHintEvent
+
+
+class SpeculativeMatcher:
+    """
+    Matches the words of an utterance against menu ids, names and synonyms while it is still being spoken.
+    Each partial transcript only scans the words that weren't scanned yet. The last word of a partial transcript may
+    still change, and words that could be the start of a longer menu phrase wait for the next ones, so every item is
+    reported once, as soon as it is certain. A recognizer revising earlier words restarts the scan.
+    """
+
+    def __init__(self, menu_index: MenuIndex):
+        self.menu_index = menu_index
+        self.max_phrase_length = max(
+            (len(term.split()) for category in menu_index.categories.values() for term in category.synonyms),
+            default=1,
+        )
+        # Proper prefixes of multi-word menu phrases, e.g. 'pinto' for 'pinto beans'
+        self._prefixes = frozenset(
+            " ".join(words[:length])
+            for category in menu_index.categories.values()
+            for words in (term.split() for term in category.synonyms)
+            for length in range(1, len(words))
+        )
+        self._words: List[str] = []
+        self._position = 0
+        self._matched: Set[Tuple[str, str]] = set()
+
+    def reset(self) -> "SpeculativeMatcher":
+        """Forgets the current utterance, returning the matcher ready for the next one."""
+        self._words = []
+        self._position = 0
+        self._matched = set()
+        return self
+
+    def _match_phrase(self, phrase: str) -> Optional[Tuple[str, str]]:
+        """Returns the item type and ID a phrase refers to, in the category that wins for the fast path."""
+        for item_type in CATEGORY_PRIORITY:
+            synonyms = self.menu_index.categories[item_type].synonyms
+            # Accept simple plurals such as 'burritos'
+            item_id = synonyms.get(phrase) or (synonyms.get(phrase[:-1]) if phrase.endswith("s") else None)
+            if item_id is not None:
+                return item_type, item_id
+        return None
+
+    def update(self, text: str, is_final: bool = False) -> List[MenuHintEvent]:
+        """Scans a new transcript of the utterance, returning the menu items recognized since the last one."""
+        words = normalize_term(text).split()
+        stable = words if is_final else words[:-1]
+        if stable[: len(self._words)] != self._words[: len(stable)] or len(stable) < self._position:
+            # The recognizer changed its mind about words already scanned, matched items are kept
+            self._position = 0
+        self._words = stable
+
+        hints = []
+        while self._position < len(stable):
+            # Wait for more words while the last ones could still grow into a longer menu phrase
+            window = stable[self._position : self._position + self.max_phrase_length]
+            if not is_final and len(window) < self.max_phrase_length and " ".join(window) in self._prefixes:
+                break
+            for length in range(min(self.max_phrase_length, len(stable) - self._position), 0, -1):
+                phrase = " ".join(stable[self._position : self._position + length])
+                match = self._match_phrase(phrase)
+                if match is not None:
+                    if match not in self._matched:
+                        self._matched.add(match)
+                        item_type, item_id = match
+                        hints.append(
+                            MenuHintEvent(
+                                item_type=item_type,
+                                menu_item_id=item_id,
+                                name=self.menu_index.get(item_type, item_id).name,
+                                text=phrase,
+                            )
+                        )
+                    self._position += length
+                    break
+            else:
+                self._position += 1
+        return hints
@@ -0,0 +1,10 @@
+import pytest
+
+from not_chipotle_service.order.menu_index import MenuIndex
+from not_chipotle_service.order.menu_registry import MenuRegistry
+
+
+@pytest.fixture(scope="session")
+def menu_index() -> MenuIndex:
+    """The default store's menu, loaded once for the whole test run."""
+    return MenuRegistry(poll_interval=None).get()
@@ -0,0 +1,100 @@
+import pytest
+
+import not_chipotle_service.order.cart_operations as cart_ops
+from not_chipotle_service.order.compact_cart import CompactCart
+from not_chipotle_service.order.models import (
+    AddEntreeOperation,
+    AddItemOperation,
+    AddToppingOperation,
+    EntreeSpec,
+    RemoveItemOperation,
+    RemoveToppingOperation,
+    SetProteinOperation,
+)
+
+
+def _chicken_burrito() -> AddEntreeOperation:
+    return AddEntreeOperation(
+        entree=EntreeSpec(menu_item_id="burrito", protein_ids=["chicken"], toppings=["white_rice", "black_beans"])
+    )
+
+
+def test_total_after_each_operation(menu_index):
+    cart = CompactCart(cart_id="test")
+    steps = [
+        (_chicken_burrito(), 8.95),
+        (AddToppingOperation(item_id=1, topping_id="guacamole"), 10.45),
+        (SetProteinOperation(item_id=1, protein_id="steak"), 11.45),
+        (AddItemOperation(item_type="side", menu_item_id="chips"), 13.40),
+        (AddItemOperation(item_type="drink", menu_item_id="fountain_small"), 15.55),
+        (RemoveToppingOperation(item_id=1, topping_id="guacamole"), 14.05),
+        (RemoveItemOperation(item_id=1), 4.10),
+    ]
+    for operation, expected_total in steps:
+        result = cart_ops.apply_cart_operations(cart, menu_index, [operation])
+        assert result.applied, result.errors
+        assert result.total_price == pytest.approx(expected_total)
+        assert cart.total_price == pytest.approx(expected_total)
+
+
+def test_batch_returns_item_ids_and_total(menu_index):
+    cart = CompactCart(cart_id="test")
+    result = cart_ops.apply_cart_operations(
+        cart,
+        menu_index,
+        [
+            _chicken_burrito(),
+            AddItemOperation(item_type="side", menu_item_id="chips"),
+            AddToppingOperation(item_id=1, topping_id="queso"),
+        ],
+    )
+    assert result.applied, result.errors
+    assert result.item_ids == [[1], [2], [1]]
+    assert result.total_price == pytest.approx(8.95 + 1.95 + 1.5)
+    assert len(cart.items) == 2
+
+
+@pytest.mark.parametrize(
+    "failing_operation",
+    [
+        # Rejected by validation against the menu, before anything is applied
+        AddItemOperation(item_type="side", menu_item_id="nachos"),
+        # Only fails once applied, on an item the cart doesn't have
+        AddToppingOperation(item_id=99, topping_id="cheese"),
+        # Only fails once applied, on an item the cart doesn't have
+        RemoveItemOperation(item_id=99),
+    ],
+)
+def test_failing_operation_leaves_cart_untouched(menu_index, failing_operation):
+    cart = CompactCart(cart_id="test")
+    cart_ops.apply_cart_operations(cart, menu_index, [_chicken_burrito()])
+    before = cart.to_model()
+
+    result = cart_ops.apply_cart_operations(
+        cart,
+        menu_index,
+        [
+            AddItemOperation(item_type="side", menu_item_id="chips"),
+            AddToppingOperation(item_id=1, topping_id="cheese"),
+            failing_operation,
+        ],
+    )
+
+    assert not result.applied
+    assert result.errors
+    assert cart.to_model() == before
+    assert cart.total_price == pytest.approx(8.95)
+
+
+
+def test_remove_item_taken_off_the_menu(menu_index):
+    cart = CompactCart(cart_id="test")
+    cart_ops.add_item_to_cart(cart, menu_index, "side", "chips")
+    # Items added under an older menu, neither of them is on the current one
+    removed = cart.add("side", "nachos")
+    cart.add("drink", "horchata")
+
+    cart_ops.remove_item_from_cart(cart, menu_index, removed.item_id)
+
+    assert removed.item_id not in cart.items
+    assert cart.total_price == pytest.approx(1.95)
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+import not_chipotle_service.order.cart_operations as cart_ops
+from not_chipotle_service.order.checkout import CheckoutError, CheckoutPipeline, create_order
+from not_chipotle_service.order.compact_cart import CompactCart
+from not_chipotle_service.order.kitchen import InMemoryTicketSink, TicketSink
+from not_chipotle_service.order.models import AddEntreeOperation, EntreeSpec
+from not_chipotle_service.order.order_store import InMemoryOrderStore, SQLiteOrderStore
+
+
+def _cart(menu_index, cart_id: str = "test") -> CompactCart:
+    cart = CompactCart(cart_id=cart_id)
+    entree = EntreeSpec(menu_item_id="burrito", protein_ids=["chicken"], toppings=["guacamole"])
+    cart_ops.apply_cart_operations(cart, menu_index, [AddEntreeOperation(entree=entree)])
+    cart_ops.add_item_to_cart(cart, menu_index, "side", "chips")
+    return cart
+
+
+class _FlakySink(TicketSink):
+    """Sink failing its first sends, then keeping the tickets."""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.tickets = []
+
+    async def send(self, tickets):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("kitchen display unreachable")
+        self.tickets.extend(tickets)
+
+
+def test_create_order_prices_and_snapshots_the_cart(menu_index):
+    cart = _cart(menu_index)
+    order = create_order(cart, menu_index, customer_name="Sam")
+
+    assert order.total_price == pytest.approx(8.95 + 1.5 + 1.95)
+    assert order.customer_name == "Sam"
+    assert order.menu_version == menu_index.version
+    cart_ops.add_item_to_cart(cart, menu_index, "side", "chips")
+    assert len(order.items) == 2
+
+
+def test_create_order_rejects_invalid_carts(menu_index):
+    with pytest.raises(CheckoutError, match="empty"):
+        create_order(CompactCart(cart_id="empty"), menu_index)
+
+    cart = _cart(menu_index)
+    # Taken off the menu after it was added
+    cart.get(2).menu_item_id = "churros"
+    with pytest.raises(CheckoutError) as error:
+        create_order(cart, menu_index)
+    assert error.value.errors == ["Item 2: Side with ID 'churros' not found in the menu."]
+
+
+def test_submitted_orders_are_saved_and_sent_to_the_kitchen(menu_index):
+    async def run():
+        pipeline = CheckoutPipeline(workers=2, max_batch_size=3)
+        orders = [await pipeline.submit(_cart(menu_index, f"cart-{i}"), menu_index) for i in range(5)]
+        await pipeline.join()
+        saved = [await pipeline.order_store.get(order.order_id) for order in orders]
+        await pipeline.close()
+        return pipeline, orders, saved
+
+    pipeline, orders, saved = asyncio.run(run())
+    assert saved == orders
+    assert sorted(ticket.order_id for ticket in pipeline.ticket_sink.tickets) == sorted(o.order_id for o in orders)
+    assert pipeline.ticket_sink.tickets[0].lines == ["Burrito: Chicken, Guacamole", "Chips"]
+    with pytest.raises(RuntimeError):
+        asyncio.run(pipeline.submit(_cart(menu_index), menu_index))
+
+
+def test_failed_sends_are_retried(menu_index):
+    async def run():
+        sink = _FlakySink(failures=2)
+        pipeline = CheckoutPipeline(ticket_sink=sink, retry_delay=0.01)
+        order = await pipeline.submit(_cart(menu_index), menu_index)
+        await pipeline.close()
+        return sink, order
+
+    sink, order = asyncio.run(run())
+    assert [ticket.order_id for ticket in sink.tickets] == [order.order_id]
+
+
+def test_close_gives_up_on_orders_after_the_drain_timeout(menu_index):
+    async def run():
+        pipeline = CheckoutPipeline(
+            order_store=InMemoryOrderStore(),
+            ticket_sink=_FlakySink(failures=1_000),
+            retry_delay=0.01,
+            drain_timeout=0.1,
+        )
+        order = await pipeline.submit(_cart(menu_index), menu_index)
+        await asyncio.wait_for(pipeline.close(), 5)
+        return pipeline, order
+
+    pipeline, order = asyncio.run(run())
+    # Saved, but never made it to the kitchen
+    assert pipeline.ticket_sink.tickets == []
+    assert pipeline._unsent == {order.order_id: order}
+
+
+def test_sqlite_order_store_round_trip(menu_index, tmp_path):
+    async def run():
+        order = create_order(_cart(menu_index), menu_index)
+        store = SQLiteOrderStore(str(tmp_path / "orders.db"))
+        # Saving an order twice keeps the first copy
+        await store.save([order, order])
+        await store.close()
+
+        store = SQLiteOrderStore(str(tmp_path / "orders.db"))
+        try:
+            return order, await store.get(order.order_id), await store.get("missing")
+        finally:
+            await store.close()
+
+    order, loaded, missing = asyncio.run(run())
+    assert loaded == order
+    assert missing is None
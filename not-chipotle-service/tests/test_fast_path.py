@@ -0,0 +1,84 @@
+import pytest
+
+from not_chipotle_service.agents.fast_path import FastPathParser, apply_operations
+from not_chipotle_service.order.compact_cart import CompactCart
+from not_chipotle_service.order.models import (
+    AddEntreeOperation,
+    AddItemOperation,
+    AddToppingOperation,
+    RemoveItemOperation,
+    RemoveToppingOperation,
+)
+
+
+@pytest.fixture(scope="module")
+def parser(menu_index) -> FastPathParser:
+    return FastPathParser(menu_index)
+
+
+def test_parses_entree_with_protein_toppings_and_sides(parser):
+    operations = parser.parse("add a chicken burrito with white rice and guac and a side of chips")
+
+    assert len(operations) == 2
+    entree, side = operations
+    assert isinstance(entree, AddEntreeOperation)
+    assert entree.entree.menu_item_id == "burrito"
+    assert entree.entree.protein_ids == ["chicken"]
+    assert "guacamole" in entree.entree.toppings
+    assert side == AddItemOperation(item_type="side", menu_item_id="chips")
+
+
+def test_parses_quantities_and_configurations(parser):
+    (operation,) = parser.parse("two steak corn tacos with cheese")
+
+    assert operation.entree.menu_item_id == "tacos"
+    assert operation.entree.quantity == 2
+    assert operation.entree.special_configurations == {"taco_type": "corn"}
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("a side of guac", [AddItemOperation(item_type="side", menu_item_id="guacamole")]),
+        ("add 2 chips", [AddItemOperation(item_type="side", menu_item_id="chips")] * 2),
+        ("remove item 2", [RemoveItemOperation(item_id=2)]),
+        ("remove guac from item 1", [RemoveToppingOperation(item_id=1, topping_id="guacamole")]),
+        (
+            "add cheese and queso to item 1",
+            [AddToppingOperation(item_id=1, topping_id="cheese"), AddToppingOperation(item_id=1, topping_id="queso")],
+        ),
+    ],
+)
+def test_parses_simple_commands(parser, text, expected):
+    assert parser.parse(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        # Questions, chit-chat and unknown words are the agent's job
+        "what proteins do you have",
+        "add a chicken burrito with extra love",
+        # Toppings also sold as sides may be meant for an entree
+        "add guacamole",
+        "queso",
+        # A bare entree needs its protein and toppings asked for
+        "I'd like a burrito",
+        # Two entrees in one utterance are ambiguous
+        "a chicken burrito and a steak bowl",
+        "remove the guac",
+    ],
+)
+def test_backs_off_to_the_agent(parser, text):
+    assert parser.parse(text) is None
+
+
+def test_apply_backs_off_on_removing_an_absent_topping(menu_index, parser):
+    cart = CompactCart(cart_id="test")
+    apply_operations(cart, menu_index, parser.parse("a chicken burrito with white rice and guac"))
+
+    assert apply_operations(cart, menu_index, parser.parse("remove cheese from item 1")) is None
+    reply = apply_operations(cart, menu_index, parser.parse("remove guac from item 1"))
+    assert reply.startswith("Removed Guacamole from item [1].")
+    assert cart.total_price == pytest.approx(8.95)
@@ -0,0 +1,77 @@
+from typing import List
+
+from not_chipotle_service.agents.history import SUMMARY_PREFIX, SUPERSEDED_CONTENT, HistoryCompactor
+from not_chipotle_service.order.compact_cart import CompactCart
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+
+def _turn(number: int) -> List[ModelMessage]:
+    """A turn looking at the cart before answering."""
+    call_id = f"call_{number}"
+    return [
+        ModelRequest(parts=[UserPromptPart(f"What's in my cart? ({number})")]),
+        ModelResponse(parts=[ToolCallPart("view_cart", {}, tool_call_id=call_id)]),
+        ModelRequest(parts=[ToolReturnPart("view_cart", "cart " * 50, tool_call_id=call_id)]),
+        ModelResponse(parts=[TextPart(f"Your cart is empty. ({number})")]),
+    ]
+
+
+def _conversation(turns: int) -> List[ModelMessage]:
+    messages = [message for number in range(turns) for message in _turn(number)]
+    messages[0] = ModelRequest(parts=[SystemPromptPart("You take orders."), *messages[0].parts])
+    return messages
+
+
+def _tool_returns(messages: List[ModelMessage]) -> List[ToolReturnPart]:
+    return [
+        part
+        for message in messages
+        if isinstance(message, ModelRequest)
+        for part in message.parts
+        if isinstance(part, ToolReturnPart)
+    ]
+
+
+def test_superseded_snapshots_are_stubbed_out():
+    compacted, stats = HistoryCompactor(max_window_turns=10).compact(_conversation(3), CompactCart(cart_id="test"))
+
+    contents = [part.content for part in _tool_returns(compacted)]
+    assert contents[:2] == [SUPERSEDED_CONTENT, SUPERSEDED_CONTENT]
+    assert contents[2] != SUPERSEDED_CONTENT
+    assert stats.superseded_tool_returns == 2
+    assert stats.summarized_turns == 0
+    assert stats.tokens_saved > 0
+
+
+def test_old_turns_are_summarized_next_to_the_system_prompt():
+    messages = _conversation(5)
+    compacted, stats = HistoryCompactor(max_window_turns=2).compact(messages, CompactCart(cart_id="test"))
+
+    assert stats.summarized_turns == 3
+    assert stats.messages_after == 8
+    first_parts = compacted[0].parts
+    assert first_parts[0].content == "You take orders."
+    assert first_parts[1].content.startswith(SUMMARY_PREFIX)
+    # The window starts at a turn, so every tool call keeps its return
+    assert first_parts[2].content == "What's in my cart? (3)"
+    assert compacted[-1].parts[0].content == "Your cart is empty. (4)"
+
+
+def test_compacting_twice_keeps_a_single_summary():
+    compactor = HistoryCompactor(max_window_turns=2)
+    cart = CompactCart(cart_id="test")
+    compacted, _ = compactor.compact(_conversation(5), cart)
+    compacted, _ = compactor.compact(compacted + _turn(5), cart)
+
+    system_parts = [part for part in compacted[0].parts if isinstance(part, SystemPromptPart)]
+    assert len(system_parts) == 2
+    assert sum(part.content.startswith(SUMMARY_PREFIX) for part in system_parts) == 1
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+import not_chipotle_service.order.cart_operations as cart_ops
+from not_chipotle_service.order.compact_cart import CompactCart
+from not_chipotle_service.order.inventory import ALL_AVAILABLE, InventoryIndex, StockEvent, StoreStock
+from not_chipotle_service.order.models import AddEntreeOperation, EntreeSpec
+
+
+def _chicken_burrito() -> AddEntreeOperation:
+    return AddEntreeOperation(entree=EntreeSpec(menu_item_id="burrito", protein_ids=["chicken"]))
+
+
+def _event(item_type: str, menu_item_id: str, available: bool, store_id: str = "default") -> StockEvent:
+    return StockEvent(store_id=store_id, item_type=item_type, menu_item_id=menu_item_id, available=available)
+
+
+def test_double_protein_runs_out_with_its_protein():
+    stock = StoreStock.from_unavailable([("protein", "chicken"), ("topping", "guacamole")])
+
+    assert not stock.is_available("protein", "chicken")
+    assert not stock.is_available("topping", "double_protein_chicken")
+    assert not stock.is_available("topping", "guacamole")
+    assert stock.is_available("protein", "steak")
+    assert stock.is_available("topping", "double_protein_steak")
+    # Proteins and toppings are told apart by type
+    assert stock.is_available("topping", "chicken")
+
+
+def test_stock_versions_follow_the_unavailable_items(menu_index):
+    stock = StoreStock.from_unavailable([("protein", "chicken"), ("topping", "guacamole")])
+
+    assert StoreStock.from_unavailable([("topping", "guacamole"), ("protein", "chicken")]).version == stock.version
+    assert StoreStock.from_unavailable([("protein", "chicken")]).version != stock.version
+    assert ALL_AVAILABLE.menu_version(menu_index) == menu_index.version
+    assert stock.menu_version(menu_index) == f"{menu_index.version}-{stock.version}"
+
+
+def test_apply_swaps_in_the_stock_of_one_store():
+    inventory = InventoryIndex()
+    before = inventory.get()
+
+    assert inventory.apply(_event("protein", "chicken", available=False))
+    assert not inventory.apply(_event("protein", "chicken", available=False))
+    assert not inventory.get().is_available("protein", "chicken")
+    assert inventory.get("other").all_available
+    # Earlier snapshots never change
+    assert before.all_available
+
+    assert inventory.apply(_event("protein", "chicken", available=True))
+    assert inventory.get().version == ALL_AVAILABLE.version
+
+
+def test_feed_applies_whole_lines_once(tmp_path):
+    feed_path = tmp_path / "stock.jsonl"
+    feed_path.write_text(_event("topping", "guacamole", available=False).model_dump_json() + "\n")
+    inventory = InventoryIndex(str(feed_path), poll_interval=None)
+    assert not inventory.get().is_available("topping", "guacamole")
+
+    with open(feed_path, "a") as feed:
+        feed.write("not json\n")
+        feed.write(_event("topping", "guacamole", available=True).model_dump_json() + "\n")
+        # Still being written
+        feed.write(_event("side", "chips", available=False, store_id="other").model_dump_json()[:20])
+
+    assert inventory.read_feed() == 1
+    assert inventory.get().all_available
+    assert inventory.read_feed() == 0
+
+    with open(feed_path, "a") as feed:
+        feed.write(_event("side", "chips", available=False, store_id="other").model_dump_json()[20:] + "\n")
+    assert inventory.read_feed() == 1
+    assert not inventory.get("other").is_available("side", "chips")
+
+
+def test_feed_is_tailed_in_the_background(tmp_path):
+    feed_path = tmp_path / "stock.jsonl"
+
+    async def run():
+        inventory = InventoryIndex(str(feed_path), poll_interval=0.01)
+        try:
+            assert (await inventory.aget()).all_available
+            feed_path.write_text(_event("protein", "steak", available=False).model_dump_json() + "\n")
+            for _ in range(100):
+                if not inventory.get().all_available:
+                    break
+                await asyncio.sleep(0.01)
+            return inventory.get()
+        finally:
+            await inventory.close()
+
+    assert not asyncio.run(run()).is_available("protein", "steak")
+
+
+def test_out_of_stock_items_are_rejected(menu_index):
+    cart = CompactCart(cart_id="test")
+    stock = StoreStock.from_unavailable([("protein", "chicken")])
+
+    result = cart_ops.apply_cart_operations(cart, menu_index, [_chicken_burrito()], stock)
+    assert not result.applied
+    assert not cart.items
+
+    cart_ops.apply_cart_operations(cart, menu_index, [_chicken_burrito()])
+    with pytest.raises(ValueError, match="out of stock"):
+        cart_ops.add_topping_to_entree(cart, menu_index, 1, "double_protein_chicken", stock=stock)
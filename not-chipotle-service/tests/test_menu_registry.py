@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+import shutil
+
+import pytest
+
+from not_chipotle_service.order.menu_registry import DEFAULT_STORE_ID, MenuNotFoundError, MenuRegistry
+from not_chipotle_service.order.utils import MENU_CONFIG_DIR
+
+
+def _write_menu(path: str, burrito_price: float) -> None:
+    with open(os.path.join(MENU_CONFIG_DIR, "menu.json")) as file:
+        menu = json.load(file)
+    menu["entrees"][0]["base_price"] = burrito_price
+    with open(path, "w") as file:
+        json.dump(menu, file)
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    shutil.copy(os.path.join(MENU_CONFIG_DIR, "menu.json"), tmp_path / "menu.json")
+    (tmp_path / "menus").mkdir()
+    _write_menu(str(tmp_path / "menus" / "downtown.json"), 9.5)
+    return tmp_path
+
+
+def test_each_store_gets_its_own_menu(config_dir):
+    registry = MenuRegistry(str(config_dir), poll_interval=None)
+
+    assert registry.get().price_of("entree", "burrito") == pytest.approx(8.95)
+    assert registry.get("downtown").price_of("entree", "burrito") == pytest.approx(9.5)
+    with pytest.raises(MenuNotFoundError):
+        registry.get("uptown")
+    with pytest.raises(ValueError):
+        registry.get("../menu")
+
+
+def test_changed_menus_are_reloaded_and_listeners_notified(config_dir):
+    registry = MenuRegistry(str(config_dir), poll_interval=None)
+    reloads = []
+    registry.add_reload_listener(lambda store_id, old, new: reloads.append((store_id, old.version, new.version)))
+    old_menu = registry.get("downtown")
+
+    _write_menu(str(config_dir / "menus" / "downtown.json"), 10.25)
+
+    assert registry.reload_changed() == ["downtown"]
+    new_menu = registry.get("downtown")
+    assert new_menu.price_of("entree", "burrito") == pytest.approx(10.25)
+    assert reloads == [("downtown", old_menu.version, new_menu.version)]
+    # Callers holding the old snapshot keep a consistent menu
+    assert old_menu.price_of("entree", "burrito") == pytest.approx(9.5)
+
+
+def test_invalid_edits_keep_the_last_good_menu(config_dir):
+    registry = MenuRegistry(str(config_dir), poll_interval=None)
+    menu = registry.get(DEFAULT_STORE_ID)
+
+    (config_dir / "menu.json").write_text("{not json")
+
+    assert registry.reload_changed() == []
+    assert registry.get(DEFAULT_STORE_ID) is menu
+
+
+def test_concurrent_callers_share_a_single_load(config_dir):
+    registry = MenuRegistry(str(config_dir), poll_interval=None)
+
+    async def load_concurrently():
+        return await asyncio.gather(*(registry.aget("downtown") for _ in range(10)))
+
+    menus = asyncio.run(load_concurrently())
+    assert all(menu is menus[0] for menu in menus)
+
+
+def test_least_recently_used_menus_are_evicted(config_dir):
+    registry = MenuRegistry(str(config_dir), max_loaded_menus=1, poll_interval=None)
+    first = registry.get()
+    registry.get("downtown")
+
+    assert len(registry) == 1
+    assert registry.get() is not first
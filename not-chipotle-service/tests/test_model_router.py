@@ -0,0 +1,119 @@
+import asyncio
+
+import httpx
+import pytest
+
+from not_chipotle_service.agents.model_router import (
+    FAST_TIER,
+    STRONG_TIER,
+    ModelRouter,
+    classify_turn,
+    is_failover_error,
+)
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, UserPromptPart
+from pydantic_ai.models import ModelRequestParameters
+from pydantic_ai.models.function import FunctionModel
+
+PARAMETERS = ModelRequestParameters(function_tools=[], allow_text_result=True, result_tools=[])
+MESSAGES = [ModelRequest(parts=[UserPromptPart("a burrito please")])]
+
+
+def _failing(status_code: int, calls: list):
+    async def fail(messages, info):
+        calls.append(status_code)
+        raise ModelHTTPError(status_code=status_code, model_name="failing", body="error")
+
+    return fail
+
+
+def _replying(text: str, delay: float = 0):
+    async def reply(messages, info):
+        await asyncio.sleep(delay)
+        return ModelResponse(parts=[TextPart(text)])
+
+    return reply
+
+
+def _reply_text(router: ModelRouter) -> str:
+    response, _ = asyncio.run(router.request(MESSAGES, None, PARAMETERS))
+    return response.parts[0].content
+
+
+@pytest.mark.parametrize(
+    "error, fails_over",
+    [
+        (ModelHTTPError(status_code=400, model_name="m"), False),
+        (ModelHTTPError(status_code=413, model_name="m"), False),
+        (ModelHTTPError(status_code=408, model_name="m"), True),
+        (ModelHTTPError(status_code=429, model_name="m"), True),
+        (ModelHTTPError(status_code=503, model_name="m"), True),
+        (httpx.ConnectError("refused"), True),
+        (TimeoutError(), True),
+        (ValueError("bad arguments"), False),
+    ],
+)
+def test_is_failover_error(error, fails_over):
+    assert is_failover_error(error) is fails_over
+
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_request_fails_over_to_the_next_model_and_skips_the_failing_one(status_code):
+    calls = []
+    router = ModelRouter(
+        fast_models=[
+            FunctionModel(_failing(status_code, calls), model_name="failing"),
+            FunctionModel(_replying("fallback"), model_name="fallback"),
+        ],
+        strong_models=[FunctionModel(_replying("strong"), model_name="strong")],
+    )
+
+    assert _reply_text(router) == "fallback"
+    # The failing model cools down, so the next request goes straight to the healthy one
+    assert _reply_text(router) == "fallback"
+    assert calls == [status_code]
+
+
+@pytest.mark.parametrize("status_code", [400, 413])
+def test_request_errors_are_raised_without_failing_over(status_code):
+    calls = []
+    router = ModelRouter(
+        fast_models=[
+            FunctionModel(_failing(status_code, calls), model_name="failing"),
+            FunctionModel(_replying("fallback"), model_name="fallback"),
+        ],
+        strong_models=[FunctionModel(_replying("strong"), model_name="strong")],
+    )
+
+    for _ in range(2):
+        with pytest.raises(ModelHTTPError):
+            asyncio.run(router.request(MESSAGES, None, PARAMETERS))
+    # The model isn't marked unhealthy for a bad request, so it keeps being tried first
+    assert calls == [status_code, status_code]
+
+
+def test_slow_requests_are_hedged_to_the_next_model():
+    router = ModelRouter(
+        fast_models=[
+            FunctionModel(_replying("slow", delay=1), model_name="slow"),
+            FunctionModel(_replying("fast"), model_name="fast"),
+        ],
+        strong_models=[FunctionModel(_replying("strong"), model_name="strong")],
+        initial_hedge_delay=0.05,
+    )
+
+    assert _reply_text(router) == "fast"
+
+
+def test_complex_turns_go_to_the_strong_tier():
+    router = ModelRouter(
+        fast_models=[FunctionModel(_replying("fast"), model_name="fast")],
+        strong_models=[FunctionModel(_replying("strong"), model_name="strong")],
+    )
+    edit = [ModelRequest(parts=[UserPromptPart("actually swap the rice for beans")])]
+
+    assert classify_turn(MESSAGES) == FAST_TIER
+    assert classify_turn(edit) == STRONG_TIER
+    assert _reply_text(router) == "fast"
+    response, _ = asyncio.run(router.request(edit, None, PARAMETERS))
+    assert response.parts[0].content == "strong"
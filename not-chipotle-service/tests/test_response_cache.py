@@ -0,0 +1,61 @@
+import pytest
+
+from not_chipotle_service.agents.response_cache import ResponseCache, normalize_prompt
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.parametrize(
+    "prompt, cacheable",
+    [
+        ("What proteins do you have?", True),
+        ("how much is guac", True),
+        ("is it vegan", False),
+        ("what's in my cart", False),
+        ("add a burrito", False),
+    ],
+)
+def test_only_standalone_questions_are_cached(prompt, cacheable):
+    assert (normalize_prompt(prompt) is not None) == cacheable
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = ResponseCache(ttl_seconds=10, clock=clock)
+    assert cache.put("v1", "What proteins do you have?", "Chicken and steak.")
+
+    clock.now = 9.9
+    assert cache.get("v1", "what proteins do you have") == "Chicken and steak."
+    clock.now = 10.0
+    assert cache.get("v1", "What proteins do you have?") is None
+    assert len(cache) == 0
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put("v1", "what drinks do you have", "Sodas.")
+    cache.put("v1", "what sides do you have", "Chips.")
+    cache.get("v1", "what drinks do you have")
+    cache.put("v1", "what proteins do you have", "Chicken.")
+
+    assert cache.get("v1", "what drinks do you have") == "Sodas."
+    assert cache.get("v1", "what sides do you have") is None
+
+
+def test_invalidate_drops_menu_version_and_its_filtered_versions():
+    cache = ResponseCache()
+    cache.put("v1", "what sides do you have", "Chips and guac.")
+    cache.put("v1-stock", "what sides do you have", "Chips.")
+    cache.put("v10", "what sides do you have", "Queso.")
+
+    assert cache.invalidate("v1") == 2
+    assert cache.get("v1", "what sides do you have") is None
+    assert cache.get("v1-stock", "what sides do you have") is None
+    assert cache.get("v10", "what sides do you have") == "Queso."
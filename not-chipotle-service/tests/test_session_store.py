@@ -0,0 +1,211 @@
+import asyncio
+import time
+
+import pytest
+
+import not_chipotle_service.order.cart_operations as cart_ops
+from not_chipotle_service.order.compact_cart import CompactCart
+from not_chipotle_service.order.menu_registry import MenuRegistry
+from not_chipotle_service.session.manager import SessionManager
+from not_chipotle_service.session.models import Session
+from not_chipotle_service.session.store import InMemorySessionStore, SQLiteSessionStore
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, UserPromptPart
+
+
+def _session(menu_index, session_id: str) -> Session:
+    cart = CompactCart(cart_id=f"cart_{session_id}")
+    cart_ops.add_item_to_cart(cart, menu_index, "side", "chips")
+    return Session(
+        session_id=session_id,
+        cart=cart,
+        chat_history=[
+            ModelRequest(parts=[UserPromptPart(content="add chips")]),
+            ModelResponse(parts=[TextPart(content="Added chips.")]),
+        ],
+    )
+
+
+def test_in_memory_round_trip(menu_index):
+    store = InMemorySessionStore()
+    session = _session(menu_index, "a")
+    asyncio.run(store.put(session))
+
+    assert asyncio.run(store.get("a")) is session
+    asyncio.run(store.delete("a"))
+    assert asyncio.run(store.get("a")) is None
+
+
+def test_in_memory_evicts_least_recently_used(menu_index):
+    store = InMemorySessionStore(max_sessions=2)
+    store.put_nowait(_session(menu_index, "a"))
+    store.put_nowait(_session(menu_index, "b"))
+    store.get_nowait("a")
+
+    evicted = store.put_nowait(_session(menu_index, "c"))
+
+    assert evicted.session_id == "b"
+    assert store.get_nowait("b") is None
+    assert store.get_nowait("a") is not None
+    assert len(store) == 2
+
+
+def test_in_memory_evicts_idle_sessions(menu_index):
+    store = InMemorySessionStore(ttl_seconds=60)
+    idle = _session(menu_index, "idle")
+    idle.last_active = time.monotonic() - 61
+    store.put_nowait(idle)
+
+    assert store.get_nowait("idle") is None
+    assert len(store) == 0
+
+
+def test_sqlite_round_trip(menu_index, tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    async def write():
+        store = SQLiteSessionStore(path)
+        await store.put(_session(menu_index, "a"))
+        await store.close()
+
+    async def read():
+        store = SQLiteSessionStore(path)
+        try:
+            return await store.get("a")
+        finally:
+            await store.close()
+
+    asyncio.run(write())
+    session = asyncio.run(read())
+
+    assert session is not None
+    assert session.cart.to_model() == _session(menu_index, "a").cart.to_model()
+    assert session.chat_history[1].parts[0].content == "Added chips."
+
+
+def test_sqlite_serves_sessions_evicted_from_its_cache(menu_index, tmp_path):
+    async def run():
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"), max_cached_sessions=1)
+        try:
+            await store.put(_session(menu_index, "a"))
+            await store.put(_session(menu_index, "b"))
+            await store.flush()
+            restored = await store.get("a")
+            # Reloaded sessions stay the same object while they are cached, so their lock stays unique
+            return restored, await store.get("a")
+        finally:
+            await store.close()
+
+    restored, again = asyncio.run(run())
+    assert restored is not None and restored is again
+    assert restored.cart.total_price == pytest.approx(1.95)
+
+
+def test_sqlite_expires_idle_sessions(menu_index, tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    async def run():
+        store = SQLiteSessionStore(path)
+        await store.put(_session(menu_index, "a"))
+        await store.close()
+
+        store = SQLiteSessionStore(path, ttl_seconds=0.01)
+        try:
+            await asyncio.sleep(0.02)
+            return await store.get("a")
+        finally:
+            await store.close()
+
+    assert asyncio.run(run()) is None
+
+
+def test_sqlite_concurrent_flushes_keep_latest_snapshot(menu_index, tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    async def run():
+        store = SQLiteSessionStore(path)
+        session = _session(menu_index, "a")
+        for _ in range(20):
+            cart_ops.add_item_to_cart(session.cart, menu_index, "drink", "water_cup")
+            await store.put(session)
+            asyncio.create_task(store.flush())
+        await store.close()
+
+        store = SQLiteSessionStore(path)
+        try:
+            return await store.get("a")
+        finally:
+            await store.close()
+
+    assert len(asyncio.run(run()).cart.items) == 21
+
+
+def test_restored_sessions_get_their_menu(tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    async def run():
+        manager = SessionManager(MenuRegistry(poll_interval=None), store=SQLiteSessionStore(path))
+        session = await manager.create_session("a")
+        await manager.close()
+
+        manager = SessionManager(MenuRegistry(poll_interval=None), store=SQLiteSessionStore(path))
+        try:
+            return await manager.get_session(session.session_id)
+        finally:
+            await manager.close()
+
+    session = asyncio.run(run())
+    assert session.menu_index is not None
+
+
+def test_in_memory_keeps_sessions_in_the_middle_of_a_turn(menu_index):
+    async def run():
+        store = InMemorySessionStore(max_sessions=1)
+        busy = _session(menu_index, "busy")
+        store.put_nowait(busy)
+        async with busy.lock:
+            evicted = store.put_nowait(_session(menu_index, "other"))
+            return evicted, store.get_nowait("busy")
+
+    evicted, busy = asyncio.run(run())
+    assert evicted is None
+    assert busy is not None
+
+
+def test_sqlite_keeps_unwritten_sessions_cached(menu_index, tmp_path):
+    async def run():
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"), max_cached_sessions=1, flush_interval=60)
+        try:
+            first = _session(menu_index, "a")
+            await store.put(first)
+            await store.put(_session(menu_index, "b"))
+            return first, await store.get("a")
+        finally:
+            await store.close()
+
+    first, cached = asyncio.run(run())
+    assert cached is first
+
+
+def test_sqlite_delete_waits_for_flush_in_progress(menu_index, tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    async def run():
+        store = SQLiteSessionStore(path, flush_interval=60)
+        write_rows = store._write_rows
+        # A slow disk, so the delete arrives while the session is being written
+        store._write_rows = lambda rows: (time.sleep(0.05), write_rows(rows))
+        await store.put(_session(menu_index, "a"))
+        flush = asyncio.create_task(store.flush())
+        # Let the flush take the session and start writing it
+        await asyncio.sleep(0)
+        await store.delete("a")
+        await flush
+        await store.close()
+
+        store = SQLiteSessionStore(path)
+        try:
+            return await store.get("a")
+        finally:
+            await store.close()
+
+    assert asyncio.run(run()) is None
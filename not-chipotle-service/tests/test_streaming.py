@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+import pytest
+
+from not_chipotle_service.agents.order_manager_agent import order_manager_agent
+from not_chipotle_service.order.menu_registry import MenuRegistry
+from not_chipotle_service.session.manager import SessionManager
+from pydantic_ai.messages import ToolReturnPart
+from pydantic_ai.models.function import DeltaToolCall, FunctionModel
+
+
+async def _add_chips(messages, info):
+    """Streams a call of add_item_to_cart, then a reply in chunks once the tool returned."""
+    if isinstance(messages[-1].parts[-1], ToolReturnPart):
+        for chunk in ["Added ", "chips ", "for you!"]:
+            yield chunk
+    else:
+        arguments = json.dumps({"item_type": "side", "menu_item_id": "chips"})
+        yield {0: DeltaToolCall(name="add_item_to_cart", json_args=arguments)}
+
+
+def _stream_turns(fast_path: bool, *user_inputs: str):
+    """Streams turns of a new session, returning the session and the events of the last turn."""
+
+    async def run():
+        session_manager = SessionManager(MenuRegistry(poll_interval=None), fast_path=fast_path)
+        try:
+            session = await session_manager.create_session()
+            with order_manager_agent.override(model=FunctionModel(stream_function=_add_chips)):
+                for user_input in user_inputs:
+                    events = [event async for event in session_manager.stream_message(session, user_input)]
+            return session, events
+        finally:
+            await session_manager.close()
+
+    return asyncio.run(run())
+
+
+def test_agent_turns_stream_cart_updates_then_text():
+    session, events = _stream_turns(False, "chips please")
+
+    types = [event.type for event in events]
+    assert types == ["cart_updated", "text_delta", "text_delta", "text_delta", "turn_completed"]
+    assert events[0].tool_name == "add_item_to_cart"
+    assert events[0].cart.total_price == pytest.approx(1.95)
+    assert "".join(event.text for event in events[1:4]) == "Added chips for you!"
+    assert events[-1].message == "Added chips for you!"
+    assert events[-1].cart.total_price == pytest.approx(1.95)
+    assert session.chat_history
+
+
+def test_fast_path_turns_stream_without_the_model():
+    # The first turn always goes through the agent
+    _, events = _stream_turns(True, "chips please", "a side of chips")
+
+    assert events[0].type == "cart_updated"
+    assert events[0].tool_name == "fast_path"
+    assert events[-1].type == "turn_completed"
+    assert events[-1].cart.total_price == pytest.approx(3.90)
+    assert "".join(event.text for event in events if event.type == "text_delta") == events[-1].message
@@ -0,0 +1,108 @@
+import asyncio
+import math
+import struct
+import wave
+
+from not_chipotle_service.order.menu_registry import MenuRegistry
+from not_chipotle_service.session.manager import SessionManager
+from not_chipotle_service.voice.pipeline import SAMPLE_RATE, SAMPLE_WIDTH, VoicePipeline
+from not_chipotle_service.voice.recognizer import ScriptedRecognizer
+from not_chipotle_service.voice.ring_buffer import AudioRingBuffer
+from not_chipotle_service.voice.sources import read_audio_file
+from not_chipotle_service.voice.speculative import SpeculativeMatcher
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import FunctionModel
+
+
+def _tone(ms: int) -> bytes:
+    samples = SAMPLE_RATE * ms // 1000
+    return b"".join(
+        struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * i / SAMPLE_RATE))) for i in range(samples)
+    )
+
+
+def _silence(ms: int) -> bytes:
+    return b"\0" * (SAMPLE_RATE * SAMPLE_WIDTH * ms // 1000)
+
+
+async def _reply(messages, info):
+    return ModelResponse(parts=[TextPart("Got it!")])
+
+
+async def _stream_reply(messages, info):
+    yield "Got "
+    yield "it!"
+
+
+def _hints(hints):
+    return [(hint.item_type, hint.menu_item_id) for hint in hints]
+
+
+def test_matcher_reports_items_once_as_soon_as_they_are_certain(menu_index):
+    matcher = SpeculativeMatcher(menu_index)
+    partials = [
+        ("can I get a chicken", []),
+        # The last word of a partial transcript may still change
+        ("can I get a chicken burrito", [("protein", "chicken")]),
+        # 'burrito' waits for the next word, it could be the start of 'burrito bowl'
+        ("can I get a chicken burrito with", []),
+        ("can I get a chicken burrito with pinto", [("entree", "burrito")]),
+        # 'pinto' waits for the next word, it could be the start of 'pinto beans'
+        ("can I get a chicken burrito with pinto beans", []),
+        ("can I get a chicken burrito with pinto beans and", [("topping", "pinto_beans")]),
+    ]
+    for text, hints in partials:
+        assert _hints(matcher.update(text)) == hints, text
+
+    final = "can I get a chicken burrito with pinto beans and guac"
+    assert _hints(matcher.update(final, is_final=True)) == [("topping", "guacamole")]
+    assert matcher.update(final, is_final=True) == []
+    assert _hints(matcher.reset().update("guac", is_final=True)) == [("topping", "guacamole")]
+
+
+def test_ring_buffer_drops_the_oldest_frames_when_full():
+    ring_buffer = AudioRingBuffer(frame_size=4, capacity_frames=4)
+    assert ring_buffer.write(b"abcdefg") == 0
+    assert bytes(ring_buffer.read_frame()) == b"abcd"
+    assert ring_buffer.write(b"hijklmnop") == 0
+    assert ring_buffer.write(b"qrstuvwx") == 1
+
+    frames = []
+    while (frame := ring_buffer.read_frame()) is not None:
+        frames.append(bytes(frame))
+    assert frames == [b"ijkl", b"mnop", b"qrst", b"uvwx"]
+
+
+def test_pipeline_turns_utterances_into_turns(tmp_path):
+    path = str(tmp_path / "order.wav")
+    with wave.open(path, "wb") as audio_file:
+        audio_file.setnchannels(1)
+        audio_file.setsampwidth(SAMPLE_WIDTH)
+        audio_file.setframerate(SAMPLE_RATE)
+        audio_file.writeframes(_silence(300) + _tone(1500) + _silence(800) + _tone(1000) + _silence(800))
+
+    async def run():
+        session_manager = SessionManager(
+            MenuRegistry(poll_interval=None),
+            model=FunctionModel(_reply, stream_function=_stream_reply),
+            fast_path=False,
+        )
+        try:
+            session = await session_manager.create_session()
+            recognizer = ScriptedRecognizer(["a chicken burrito with guac please", "that's all"], frames_per_word=5)
+            pipeline = VoicePipeline(session_manager, recognizer)
+            return session, [event async for event in pipeline.run(session, read_audio_file(path))]
+        finally:
+            await session_manager.close()
+
+    session, events = asyncio.run(run())
+    final_transcripts = [event.text for event in events if event.type == "transcript" and event.is_final]
+    assert final_transcripts == ["a chicken burrito with guac please", "that's all"]
+    first_turn = events[: [event.type for event in events].index("turn_completed")]
+    # Menu items are hinted while the utterance is still being spoken, before its final transcript
+    hinted = [(event.menu_item_id, i) for i, event in enumerate(first_turn) if event.type == "menu_hint"]
+    final_index = next(i for i, event in enumerate(first_turn) if event.type == "transcript" and event.is_final)
+    assert [item_id for item_id, _ in hinted] == ["chicken", "burrito", "guacamole"]
+    assert all(i < final_index for _, i in hinted)
+    assert [event.type for event in events].count("turn_completed") == 2
+    assert len(session.chat_history) == 4